@@ -0,0 +1,169 @@
+import asyncio
+import sys
+import time
+from controller import TCPServer, log
+from metrics import setup_logging
+from protocol import read_frame_async, encode_frame, encode_json
+from protocol import MSG_ASSIGN, MSG_ROUTES, MSG_CONFIRM, MSG_ACK, MSG_OK, MSG_NO, MSG_HELLO, MSG_RESYNC
+from protocol import MSG_HEARTBEAT, MSG_TELEMETRY
+
+
+class AsyncTCPServer(TCPServer):
+    # Controlador basado en asyncio: todas las sesiones de router se atienden en
+    # un unico bucle de eventos y los envios a los routers se vacian en paralelo,
+    # de modo que un router lento no retrasa a los demas.
+    def __init__(self, host, port, algorithm_choice, heartbeat_interval=1.0, send_timeout=5.0, headless=None,
+                 topology=None, phi_threshold=8.0, route_workers=1, multipath_tolerance=0.0, reweight_interval=30.0,
+                 metrics_port=None, fast_reroute=True, render_file=None):
+        super().__init__(host, port, algorithm_choice, headless, topology, heartbeat_interval, phi_threshold,
+                         route_workers=route_workers, multipath_tolerance=multipath_tolerance,
+                         reweight_interval=reweight_interval, metrics_port=metrics_port,
+                         fast_reroute=fast_reroute, render_file=render_file)
+        self.send_timeout = send_timeout
+
+    async def handle_router(self, reader, writer):
+        node_name = None
+        confirmed = False  # Solo un router registrado del todo se trata como caido al perderlo
+        try:
+            msg_type, payload = await read_frame_async(reader)
+            if msg_type != MSG_HELLO:
+                print(f"Closing connection that did not start with HELLO (message type {msg_type}).")
+                return
+            node_name, port = self.assign_node(payload.decode(), writer)
+            if node_name is None:
+                print(f"Rejected router registration: {port}")
+                writer.write(encode_frame(MSG_NO, port.encode()))
+                return
+            print(f"Router registered as {node_name}")
+            writer.write(encode_json(MSG_ASSIGN, {"name": node_name, "port": port}))
+            writer.write(encode_json(MSG_ROUTES, self.full_routes(node_name)))
+            print(f"Sent routes to {node_name}")
+
+            msg_type, _ = await read_frame_async(reader)
+            if msg_type != MSG_CONFIRM:
+                print(f"Router {node_name} did not confirm its routes (message type {msg_type}). Dropping session.")
+                return
+            confirmed = True
+            self.detector.heartbeat(node_name)
+
+            while not self.should_stop.is_set():
+                msg_type, payload = await read_frame_async(reader)
+                if msg_type is None:
+                    print(f"Connection with {node_name} closed unexpectedly.")
+                    self.handle_node_failure(node_name)
+                    break
+                self.detector.heartbeat(node_name)
+                if msg_type == MSG_HEARTBEAT:
+                    pass
+                elif msg_type == MSG_TELEMETRY:
+                    self.record_telemetry(node_name, payload)
+                elif msg_type == MSG_OK:
+                    log.debug("Received ACK message from %s.", node_name)
+                elif msg_type == MSG_NO:
+                    print(f"Node {node_name} responded 'NO'. Removing node...")
+                    self.handle_node_failure(node_name)
+                elif msg_type == MSG_RESYNC:
+                    print(f"Node {node_name} requested its full routing table.")
+                    writer.write(encode_json(MSG_ROUTES, self.full_routes(node_name)))
+                else:
+                    print(f"Received unexpected message type {msg_type} from {node_name}")
+        except (ConnectionError, UnicodeDecodeError) as e:
+            if confirmed:
+                print(f"Connection with {node_name} reset by peer.")
+                self.handle_node_failure(node_name)
+            else:
+                print(f"Error registering client: {e!r}")
+        finally:
+            if node_name is not None and self.client_sockets.get(node_name) is writer:
+                del self.client_sockets[node_name]
+            writer.close()
+
+    async def drain(self, client_name, writer):
+        try:
+            await asyncio.wait_for(writer.drain(), self.send_timeout)
+            return None
+        except (OSError, asyncio.TimeoutError) as e:
+            print(f"Error sending to {client_name}: {e!r}")
+            return client_name
+
+    async def drain_all(self, writers, timer=None):
+        start = time.perf_counter()
+        failed = await asyncio.gather(*(self.drain(name, writer) for name, writer in writers))
+        if timer:
+            self.metrics.observe(timer, time.perf_counter() - start)
+        for client_name in failed:
+            if client_name is not None:
+                self.handle_node_failure(client_name)
+
+    def send_updated_paths(self):
+        # Los cambios se escriben en el buffer de cada router y se vacian todos a la vez
+        writers = []
+        for client_name, writer in list(self.client_sockets.items()):
+            if self.route_table.has_source(client_name):
+                msg_type, message = self.route_update(client_name)
+                if msg_type is None:
+                    continue
+                writer.write(encode_json(msg_type, message))
+                writers.append((client_name, writer))
+                log.debug("Sent route update to %s", client_name)
+            else:
+                print(f"Node {client_name} not found in the network.")
+        self.save_snapshot()
+        asyncio.get_running_loop().create_task(self.drain_all(writers, "route_push_seconds"))
+
+    async def heartbeat_loop(self):
+        # Igual que TCPServer.heartbeat_loop: los sondeos se escriben a la vez y se
+        # vacian en una tarea aparte para no retrasar la deteccion
+        loop = asyncio.get_running_loop()
+        while not self.should_stop.is_set():
+            await asyncio.sleep(self.heartbeat_interval)
+            now = time.monotonic()
+            writers = [(name, writer) for name, writer in list(self.client_sockets.items())
+                       if self.detector.silence(name, now) >= self.heartbeat_interval]
+            for _, writer in writers:
+                writer.write(encode_frame(MSG_ACK))
+            loop.create_task(self.drain_all(writers))
+            for client_name in self.detector.suspects(now):
+                print(f"Node {client_name} suspected, phi {self.detector.phi(client_name, now):.1f}")
+                self.handle_node_failure(client_name)
+
+    async def reweight_loop(self):
+        while not self.should_stop.is_set():
+            await asyncio.sleep(self.reweight_interval)
+            try:
+                self.reweight_links()
+            except Exception as e:
+                print(f"Error reweighting links: {e}")
+
+    async def run(self):
+        server = await asyncio.start_server(self.handle_router, self.host, self.port, backlog=4096)
+        print(f"Server listening on {self.host}:{self.port}...")
+        if self.metrics_port is not None:
+            self.metrics.serve(self.metrics_port)
+        loop = asyncio.get_running_loop()
+        tasks = [loop.create_task(self.heartbeat_loop())]
+        if self.reweight_interval:
+            tasks.append(loop.create_task(self.reweight_loop()))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def start(self):
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            pass
+        except Exception as e:
+            print(f"Error starting server: {e}")
+
+
+# Ejemplo de uso
+if __name__ == "__main__":
+    algorithm_choice = input("Choose the algorithm to compute shortest paths (Dijkstra/Bellman-Ford/Sparse): ").strip().lower()
+    topology = sys.argv[1] if len(sys.argv) > 1 else None
+    setup_logging()
+    server = AsyncTCPServer("localhost", 8888, algorithm_choice, topology=topology)
+    server.start()
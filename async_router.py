@@ -0,0 +1,313 @@
+import asyncio
+import json
+import struct
+import sys
+import time
+from router import Router, log
+from metrics import setup_logging
+from protocol import read_frame_async, encode_frame, decode_json
+from protocol import MSG_NO, MSG_ASSIGN, MSG_ROUTES, MSG_CONFIRM, MSG_ACK, MSG_OK, MSG_REGISTER, MSG_DATA, MSG_FORWARD
+from protocol import MSG_DELIVER, MSG_PEER, MSG_HELLO, MSG_ROUTES_DELTA, MSG_RESYNC, MSG_HEARTBEAT
+from protocol import MSG_DATA_BATCH, MSG_DELIVER_BATCH, MSG_PACKET
+
+
+class AsyncNeighborLink:
+    # Version asyncio de link_pool.NeighborLink: cola acotada y una tarea emisora
+    def __init__(self, local_name, neighbor_name, port, host="localhost", queue_size=1024,
+                 max_retries=3, retry_delay=0.1, on_failure=None, recovery_delay=1.0, metrics=None):
+        self.local_name = local_name
+        self.neighbor_name = neighbor_name
+        self.host = host
+        self.port = port
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.writer = None
+        self.on_failure = on_failure
+        self.recovery_delay = recovery_delay
+        self.metrics = metrics  # Cuenta las tramas descartadas con la cola llena
+        self.full = False  # La cola estaba llena en el ultimo envio
+        self.failed_at = None
+        self.sent_bytes = 0
+        self.sent_messages = 0
+        self.task = asyncio.get_running_loop().create_task(self.send_loop())
+
+    def send(self, frame):
+        if self.failed_at is not None and time.monotonic() - self.failed_at < self.recovery_delay:
+            return False
+        try:
+            self.queue.put_nowait(frame)
+            self.full = False
+            return True
+        except asyncio.QueueFull:
+            # Se avisa una vez al llenarse la cola; cada descarte solo se cuenta
+            if self.metrics is not None:
+                self.metrics.increment("frames_dropped")
+            if not self.full:
+                self.full = True
+                log.warning("Send queue to router %s is full. Dropping messages.", self.neighbor_name)
+            return False
+
+    async def connect(self):
+        _, self.writer = await asyncio.open_connection(self.host, int(self.port))
+        self.writer.write(encode_frame(MSG_PEER, self.local_name.encode()))
+        print(f"Opened persistent link to router {self.neighbor_name} on port {self.port}")
+
+    def disconnect(self):
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+
+    async def send_loop(self):
+        try:
+            while True:
+                frames = [await self.queue.get()]
+                while not self.queue.empty():
+                    frames.append(self.queue.get_nowait())
+                # El contenido de los paquetes son bytes propios de cada lectura: se
+                # escriben tal cual junto a su cabecera, sin unirlos
+                parts = []
+                for frame in frames:
+                    if type(frame) is tuple:
+                        parts.extend(frame)
+                    else:
+                        parts.append(frame)
+                if await self.write(parts):
+                    self.sent_bytes += sum(map(len, parts))
+                    self.sent_messages += len(frames)
+                elif self.on_failure:
+                    self.on_failure(self.neighbor_name, frames)
+        finally:
+            self.disconnect()
+
+    async def write(self, parts):
+        retries = 0 if self.on_failure else self.max_retries
+        delay = self.retry_delay
+        for attempt in range(retries + 1):
+            try:
+                if self.writer is None:
+                    await self.connect()
+                self.writer.writelines(parts)
+                await self.writer.drain()
+                self.failed_at = None
+                return True
+            except OSError as e:
+                print(f"Link to router {self.neighbor_name} failed (attempt {attempt + 1}): {e}")
+                self.failed_at = time.monotonic()
+                self.disconnect()
+                if attempt < retries:
+                    await asyncio.sleep(delay)
+                    delay *= 2
+        if not self.on_failure:
+            print(f"Dropping {sum(map(len, parts))} bytes queued for router {self.neighbor_name}")
+        return False
+
+    def take_counters(self):
+        counters = [self.sent_bytes, self.sent_messages]
+        self.sent_bytes = self.sent_messages = 0
+        return counters
+
+    def close(self):
+        self.task.cancel()
+
+
+class AsyncLinkPool:
+    # Misma interfaz que link_pool.LinkPool, usada desde el bucle de eventos
+    def __init__(self, local_name, ports, host="localhost", queue_size=1024, on_failure=None, metrics=None):
+        self.local_name = local_name
+        self.ports = ports
+        self.host = host
+        self.queue_size = queue_size
+        self.on_failure = on_failure
+        self.metrics = metrics
+        self.links = {}
+
+    def send(self, neighbor_name, frame):
+        link = self.links.get(neighbor_name)
+        if link is None:
+            link = AsyncNeighborLink(self.local_name, neighbor_name, self.ports[neighbor_name],
+                                     host=self.host, queue_size=self.queue_size, on_failure=self.on_failure,
+                                     metrics=self.metrics)
+            self.links[neighbor_name] = link
+        return link.send(frame)
+
+    def take_counters(self):
+        return {name: link.take_counters() for name, link in self.links.items()}
+
+    def close_unused(self, active_names):
+        for name in list(self.links):
+            if name not in active_names:
+                self.links.pop(name).close()
+
+    def close(self):
+        for link in self.links.values():
+            link.close()
+        self.links.clear()
+
+
+class AsyncRouter(Router):
+    # Router con un unico bucle asyncio para hosts, enlaces vecinos y la sesion
+    # con el controlador. La logica de encaminamiento es la de Router.
+    def __init__(self, server_host, server_port, router_port, node_name=None, topology=None, queue_size=1024,
+                 heartbeat_interval=1.0, telemetry_interval=5.0, metrics_port=None):
+        super().__init__(server_host, server_port, router_port, node_name, topology, heartbeat_interval,
+                         telemetry_interval, metrics_port)
+        self.link_pool = AsyncLinkPool(self.node_name, self.routers, queue_size=queue_size,
+                                       on_failure=self.reroute_frames, metrics=self.metrics)
+
+    def deliver_to_host(self, dest_host, text):
+        self.hosts[dest_host].write(encode_frame(MSG_DELIVER, text.encode()))
+        self.metrics.increment("messages_delivered")
+
+    def deliver_batch(self, dest_host, payload):
+        self.hosts[dest_host].write(encode_frame(MSG_DELIVER_BATCH, payload))
+        self.metrics.increment("batches_delivered")
+
+    def deliver_packet(self, dest_host, parts):
+        self.hosts[dest_host].writelines(parts)
+        self.metrics.increment("packets_delivered")
+
+    async def connect_to_server(self):
+        tasks = []
+        try:
+            print(f"Connecting to server at {self.server_host}:{self.server_port}...")
+            reader, writer = await asyncio.open_connection(self.server_host, self.server_port)
+            writer.write(encode_frame(MSG_HELLO, (self.requested_name or "").encode()))
+            msg_type, payload = await read_frame_async(reader)
+            if msg_type != MSG_ASSIGN:
+                reason = payload.decode() if msg_type == MSG_NO else f"message type {msg_type}"
+                print(f"Server rejected the registration: {reason}")
+                writer.close()
+                return
+            node_info = decode_json(payload)
+            self.node_name, self.server_port = node_info["name"], node_info["port"]
+            self.link_pool.local_name = self.node_name
+            print(f"Connected to server as {self.node_name} on port {self.server_port}")
+
+            msg_type, payload = await read_frame_async(reader)
+            if msg_type == MSG_ROUTES:
+                self.update_routes(payload)
+            writer.write(encode_frame(MSG_CONFIRM))
+            if self.heartbeat_interval:
+                tasks.append(asyncio.get_running_loop().create_task(self.heartbeat_loop(writer)))
+            if self.telemetry_interval:
+                tasks.append(asyncio.get_running_loop().create_task(self.telemetry_loop(writer)))
+
+            while True:
+                msg_type, payload = await read_frame_async(reader)
+                if msg_type == MSG_ACK:
+                    log.debug("Received ACK message from server. Node is OK.")
+                    writer.write(encode_frame(MSG_OK))
+                elif msg_type == MSG_ROUTES:
+                    print("Received updated routes from server.")
+                    self.update_routes(payload)
+                elif msg_type == MSG_ROUTES_DELTA:
+                    print("Received route changes from server.")
+                    if not self.apply_route_delta(payload):
+                        writer.write(encode_frame(MSG_RESYNC))
+                else:
+                    print(f"Received unexpected message from server: {msg_type}")
+                    break
+            writer.close()
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            # Cubre tanto el rechazo inicial como el cierre del controlador a mitad de sesion
+            print(f"Connection to server lost: {e!r}")
+        except json.JSONDecodeError as e:
+            print(f"JSON decode error: {e}")
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def heartbeat_loop(self, writer):
+        while not writer.is_closing():
+            await asyncio.sleep(self.heartbeat_interval)
+            writer.write(encode_frame(MSG_HEARTBEAT))
+
+    async def telemetry_loop(self, writer):
+        while not writer.is_closing():
+            await asyncio.sleep(self.telemetry_interval)
+            writer.write(self.telemetry_report())
+
+    async def handle_connection(self, reader, writer):
+        address = writer.get_extra_info("peername")
+        print(f"Host connected from {address}")
+        try:
+            msg_type, payload = await read_frame_async(reader)
+            if msg_type == MSG_PEER:
+                await self.peer_session(reader, payload.decode())
+            elif msg_type == MSG_REGISTER:
+                await self.host_session(reader, writer, payload.decode())
+            else:
+                print(f"Unexpected first message type {msg_type} from {address}")
+        except ConnectionError as e:
+            print(f"Connection with {address} lost: {e}")
+        finally:
+            writer.close()
+
+    async def host_session(self, reader, writer, host_name):
+        self.hosts[host_name] = writer
+        print(f"Host registered with name: {host_name}")
+        try:
+            while True:
+                msg_type, payload = await read_frame_async(reader)
+                if msg_type is None:
+                    print(f"Connection with host {host_name} closed.")
+                    break
+                elif msg_type == MSG_DATA:
+                    self.process_host_message(host_name, payload)
+                elif msg_type == MSG_FORWARD:
+                    self.process_forward_message(decode_json(payload))
+                elif msg_type == MSG_DATA_BATCH:
+                    self.process_batch(payload)
+                elif msg_type == MSG_PACKET:
+                    self.process_packet(payload)
+                else:
+                    print(f"Received unexpected message type {msg_type} from {host_name}")
+        finally:
+            if self.hosts.get(host_name) is writer:
+                del self.hosts[host_name]
+
+    async def peer_session(self, reader, peer_name):
+        print(f"Persistent link opened by router {peer_name}")
+        while True:
+            msg_type, payload = await read_frame_async(reader)
+            if msg_type is None:
+                break
+            try:
+                self.process_peer_frame(peer_name, msg_type, payload)
+            except (ValueError, KeyError, IndexError, struct.error) as e:
+                self.metrics.increment("peer_frames_dropped")
+                log.warning("Dropping malformed frame from router %s: %r", peer_name, e)
+        print(f"Persistent link from router {peer_name} closed.")
+
+    async def run(self):
+        server = await asyncio.start_server(self.handle_connection, 'localhost', self.router_port,
+                                            backlog=4096)
+        print(f"Router {self.node_name} listening for hosts on port {self.router_port}...")
+        async with server:
+            # Los hosts se atienden desde antes del saludo con el controlador
+            await server.start_serving()
+            await self.connect_to_server()
+            # Igual que Router: se sigue atendiendo a los hosts sin controlador
+            await server.serve_forever()
+
+    def start(self):
+        try:
+            print(f"Router port: {self.router_port}")
+            if self.metrics_port is not None:
+                self.metrics.serve(self.metrics_port)
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            pass
+
+
+# Ejemplo de uso
+if __name__ == "__main__":
+    node_name = input("Nombre Router: ")
+    server_port = 8888
+    router_port = input("Puerto Host (vacio para usar el de la topologia): ").strip()
+    router_port = int(router_port) if router_port else None
+    topology = sys.argv[1] if len(sys.argv) > 1 else None
+    setup_logging()
+    router = AsyncRouter("localhost", server_port, router_port, node_name or None, topology)
+    router.start()
@@ -0,0 +1,241 @@
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import networkx as nx
+from host import Host
+from routing import ALGORITHMS
+from topology import load_topology, router_ports, host_routers
+
+CONTROLLER_CODE = (
+    "from {module} import {cls}; "
+    "{cls}('localhost', {port}, {algorithm!r}, headless=True, topology={topology!r}).start()"
+)
+ROUTER_CODE = (
+    "from {module} import {cls}; "
+    "{cls}('localhost', {port}, None, node_name={name!r}, topology={topology!r}).start()"
+)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def wait_for_port(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with contextlib.suppress(OSError), socket.create_connection(("localhost", port), timeout=0.2):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class Harness:
+    # Arranca el controlador y un proceso por router, conecta un Host a cada
+    # router y mide mensajes por segundo y latencia extremo a extremo
+    def __init__(self, args):
+        self.args = args
+        self.network = load_topology(args.topology, headless=True)
+        self.ports = router_ports(self.network)
+        self.host_routers = host_routers(self.network)
+        self.processes = []
+        self.workdir = tempfile.mkdtemp(prefix="nsfnet-bench-")
+        self.sent = 0
+        self.received = []  # (saltos, latencia)
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        # Saltos entre routers por el camino de menor peso, el mismo que calcula el controlador
+        self.hops = {source: {target: len(path) - 1 for target, path in paths.items()}
+                     for source, paths in nx.all_pairs_dijkstra_path(self.network.graph, weight="weight")}
+
+    def spawn(self, code):
+        env = dict(os.environ)
+        env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+        process = subprocess.Popen([sys.executable, "-u", "-c", code], cwd=self.workdir, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, text=True)
+        self.processes.append(process)
+        return process
+
+    def start_network(self):
+        args = self.args
+        module, cls = ("async_controller", "AsyncTCPServer") if args.async_controller else ("controller", "TCPServer")
+        self.spawn(CONTROLLER_CODE.format(module=module, cls=cls, port=args.port, algorithm=args.algorithm,
+                                          topology=args.topology))
+        # Una conexion sin HELLO no ocupa ningun nodo, asi que basta con sondear el puerto
+        if not wait_for_port(args.port, args.startup_timeout):
+            raise RuntimeError("Controller did not start")
+        module, cls = ("async_router", "AsyncRouter") if args.async_routers else ("router", "Router")
+        for name in self.ports:
+            self.spawn(ROUTER_CODE.format(module=module, cls=cls, port=args.port, name=name, topology=args.topology))
+        for name, port in self.ports.items():
+            if not wait_for_port(port, args.startup_timeout):
+                raise RuntimeError(f"Router {name} did not start on port {port}")
+        time.sleep(args.warmup)  # Tiempo para que los routers reciban sus tablas
+
+    def connect_hosts(self):
+        hosts = {}
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for host_name, router_name in self.host_routers.items():
+                host = Host(host_name, self.ports[router_name], topology=self.args.topology)
+                host.connect()
+                hosts[host_name] = host
+        return hosts
+
+    def receive(self, host_name, host):
+        router_name = self.host_routers[host_name]
+        try:
+            for _, content in host.messages():
+                now = time.perf_counter()
+                if isinstance(content, bytes):
+                    content = content.decode()
+                # "<origen>|<instante>|<relleno>"
+                source, sent_at, _ = content.split("|", 2)
+                hops = self.hops[self.host_routers[source]][router_name]
+                with self.lock:
+                    self.received.append((hops, now - float(sent_at)))
+        except OSError:
+            pass
+
+    def send(self, host_name, host, destinations):
+        args = self.args
+        rng = random.Random(f"{args.seed}-{host_name}")
+        padding = "x" * args.size
+        interval = 1 / args.rate if args.rate else 0
+        next_send = time.perf_counter()
+        sent = 0
+        while not self.stop.is_set():
+            if interval:
+                delay = next_send - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_send += interval
+            message = f"{host_name}|{time.perf_counter()!r}|{padding}"
+            sent += 1
+            if args.packets:
+                host.send_packet(rng.choice(destinations), message)
+            elif args.batch > 1:
+                host.queue_message(rng.choice(destinations), message)
+                if sent % args.batch == 0:
+                    host.flush()
+            else:
+                host.send_message(rng.choice(destinations), message)
+        host.flush()
+        with self.lock:
+            self.sent += sent
+
+    def run(self):
+        args = self.args
+        try:
+            self.start_network()
+            hosts = self.connect_hosts()
+            time.sleep(0.2)
+            names = list(hosts)
+            threads = [threading.Thread(target=self.receive, args=(name, host), daemon=True)
+                       for name, host in hosts.items()]
+            threads += [threading.Thread(target=self.send, args=(name, host, [n for n in names if n != name]))
+                        for name, host in hosts.items()]
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                for thread in threads:
+                    thread.start()
+                time.sleep(args.duration)
+                self.stop.set()
+                for thread in threads:
+                    if not thread.daemon:
+                        thread.join()
+                time.sleep(args.drain)  # Mensajes en vuelo
+            for host in hosts.values():
+                host.client_socket.close()
+            return self.report()
+        finally:
+            self.shutdown()
+
+    def report(self):
+        args = self.args
+        with self.lock:
+            received = list(self.received)
+        by_hops = {}
+        for hops, latency in received:
+            by_hops.setdefault(hops, []).append(latency)
+        return {
+            "topology": args.topology or "nsfnet",
+            "routers": len(self.ports),
+            "async_routers": args.async_routers,
+            "async_controller": args.async_controller,
+            "rate_per_host": args.rate,
+            "message_size": args.size,
+            "batch": args.batch,
+            "packets": args.packets,
+            "duration_s": args.duration,
+            "sent": self.sent,
+            "received": len(received),
+            "messages_per_s": len(received) / args.duration,
+            "latency_p50_s": percentile([latency for _, latency in received], 0.50),
+            "latency_p99_s": percentile([latency for _, latency in received], 0.99),
+            "by_hops": {
+                str(hops): {
+                    "received": len(latencies),
+                    "latency_p50_s": percentile(latencies, 0.50),
+                    "latency_p99_s": percentile(latencies, 0.99),
+                }
+                for hops, latencies in sorted(by_hops.items())
+            },
+        }
+
+    def shutdown(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure end-to-end forwarding over loopback.")
+    parser.add_argument("--topology", default=None, help="topology file (default: NSFNET)")
+    parser.add_argument("--algorithm", default="dijkstra", choices=ALGORITHMS)
+    parser.add_argument("--port", type=int, default=8888, help="controller port")
+    parser.add_argument("--rate", type=float, default=100, help="messages per second per host (0 = unthrottled)")
+    parser.add_argument("--size", type=int, default=64, help="payload padding in bytes")
+    parser.add_argument("--batch", type=int, default=1, help="messages per host write (1 = one frame per message)")
+    parser.add_argument("--packets", action="store_true", help="send binary packets instead of JSON messages")
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--warmup", type=float, default=1, help="seconds to wait for route pushes")
+    parser.add_argument("--drain", type=float, default=1, help="seconds to wait for in-flight messages")
+    parser.add_argument("--startup-timeout", type=float, default=30)
+    parser.add_argument("--async-routers", action="store_true")
+    parser.add_argument("--async-controller", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-o", "--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    result = Harness(args).run()
+    print(f"{result['received']}/{result['sent']} messages delivered, {result['messages_per_s']:.1f} msg/s")
+    for hops, stats in result["by_hops"].items():
+        print(f"  {hops} hops: {stats['received']:>7} msgs  p50 {stats['latency_p50_s'] * 1000:8.3f} ms  "
+              f"p99 {stats['latency_p99_s'] * 1000:8.3f} ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
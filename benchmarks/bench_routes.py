@@ -0,0 +1,184 @@
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from controller import compute_all_shortest_paths_dijkstra, compute_all_shortest_paths_bellman_ford
+from routing import RouteTable
+from topology import random_geometric_topology, waxman_topology, fat_tree_topology
+
+
+def paths_size(all_paths):
+    # Bytes de los diccionarios y listas de caminos mas los nombres de nodo, contados una vez
+    names = {name for destinations in all_paths.values() for path in destinations.values() for name in path}
+    return (sys.getsizeof(all_paths)
+            + sum(sys.getsizeof(destinations) for destinations in all_paths.values())
+            + sum(sys.getsizeof(path) for destinations in all_paths.values() for path in destinations.values())
+            + sum(sys.getsizeof(name) for name in names))
+
+
+def table_size(table):
+    # Bytes de las filas compactas, de las listas que las contienen y de los nombres
+    rows = table.pred + table.next_hop + table.dist
+    return (sum(sys.getsizeof(row) for row in rows)
+            + sum(sys.getsizeof(column) for column in (table.pred, table.next_hop, table.dist, table.names))
+            + sum(sys.getsizeof(name) for name in table.names))
+
+
+def parallel_table(network):
+    # Fuerza el pool de procesos: compute solo lo usa a partir de PARALLEL_MIN_SOURCES
+    # fuentes, y sin esto las filas de redes pequenas medirian el calculo en serie
+    table = RouteTable(network.graph.nodes)
+    table.workers = os.cpu_count()
+    table.version += 1
+    table.compute_parallel(network.graph, "dijkstra", list(range(len(table.names))))
+    return table
+
+
+# Motor -> (funcion que calcula todas las rutas, funcion que mide el resultado en bytes).
+# Las funciones compute_all_shortest_paths_* registran cada camino con log.debug,
+# que queda desactivado porque el benchmark no configura logging.
+ENGINES = {
+    "paths-dijkstra": (compute_all_shortest_paths_dijkstra, paths_size),
+    "paths-bellman-ford": (compute_all_shortest_paths_bellman_ford, paths_size),
+    "table-dijkstra": (lambda network: RouteTable.from_network(network, "dijkstra"), table_size),
+    "table-bellman-ford": (lambda network: RouteTable.from_network(network, "bellman-ford"), table_size),
+    "table-sparse": (lambda network: RouteTable.from_network(network, "sparse"), table_size),
+    "table-dijkstra-parallel": (parallel_table, table_size),
+}
+
+
+def waxman_beta(size, degree, seed, alpha=0.1, samples=20000):
+    # Estima beta para que el grado medio esperado sea `degree`: el grado medio es
+    # (n - 1) * beta * E[exp(-d / (alpha * L))] para puntos uniformes en el cuadrado
+    rng = random.Random(seed)
+    scale = alpha * math.sqrt(2)
+    mean = sum(
+        math.exp(-math.dist((rng.random(), rng.random()), (rng.random(), rng.random())) / scale)
+        for _ in range(samples)
+    ) / samples
+    return min(1.0, degree / ((size - 1) * mean))
+
+
+def generate(kind, size, density, seed):
+    if kind == "geometric":
+        radius = math.sqrt(density / (math.pi * size))  # grado medio aproximado = density
+        return random_geometric_topology(size, radius=radius, seed=seed, headless=True)
+    if kind == "waxman":
+        return waxman_topology(size, beta=waxman_beta(size, density, seed), seed=seed, headless=True)
+    if kind == "fat-tree":
+        return fat_tree_topology(size, seed=seed, headless=True)
+    raise ValueError(f"Unknown topology kind: {kind}")
+
+
+def measure(engine, network, repeat):
+    compute, size_of = ENGINES[engine]
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = compute(network)
+        timings.append(time.perf_counter() - start)
+        del result
+    # La memoria se mide en una ejecucion aparte: tracemalloc ralentiza el calculo
+    gc.collect()
+    tracemalloc.start()
+    result = compute(network)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "wall_time_s": min(timings),
+        "wall_times_s": timings,
+        "peak_memory_bytes": peak,
+        "route_table_bytes": size_of(result),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    # Marca los casos que son mas lentos que la linea base en mas de `threshold`
+    with open(baseline_path) as f:
+        baseline = {(r["engine"], r["kind"], r["size"], r["density"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        key = (result["engine"], result["kind"], result["size"], result["density"])
+        if key in baseline:
+            ratio = result["wall_time_s"] / baseline[key]["wall_time_s"]
+            print(f"{result['engine']:>20} {result['kind']:>10} n={result['size']:<6} d={result['density']:<5} "
+                  f"time x{ratio:.2f}")
+            if ratio > 1 + threshold:
+                regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark all-pairs route computation.")
+    parser.add_argument("--engines", nargs="+", default=sorted(ENGINES), choices=sorted(ENGINES))
+    parser.add_argument("--kinds", nargs="+", default=["geometric", "waxman"], choices=["geometric", "waxman", "fat-tree"])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[50, 100, 200, 400],
+                        help="node counts; for fat-tree this is the arity k, so run it separately")
+    parser.add_argument("--densities", nargs="+", type=float, default=[4, 8],
+                        help="target mean degree; ignored for fat-tree")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-o", "--output", help="write JSON results to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before failing --compare")
+    args = parser.parse_args()
+
+    results = []
+    for kind in args.kinds:
+        densities = [0] if kind == "fat-tree" else args.densities
+        for size in args.sizes:
+            for density in densities:
+                network = generate(kind, size, density, args.seed)
+                for engine in args.engines:
+                    result = measure(engine, network, args.repeat)
+                    result.update({
+                        "engine": engine,
+                        "kind": kind,
+                        "size": size,
+                        "density": density,
+                        "nodes": network.graph.number_of_nodes(),
+                        "links": network.graph.number_of_edges(),
+                    })
+                    results.append(result)
+                    print(f"{engine:>20} {kind:>10} n={result['nodes']:<6} m={result['links']:<7} "
+                          f"{result['wall_time_s']:9.4f}s {result['peak_memory_bytes'] / 2**20:9.2f} MiB "
+                          f"table={result['route_table_bytes'] / 2**20:.2f} MiB")
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved results to {args.output}")
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions above {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
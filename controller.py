@@ -1,243 +1,540 @@
-import json
+import logging
 import socket
+import sys
 import threading
-from network import Network
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from topology import load_topology
+from routing import RouteTable, ALGORITHMS
+from snapshot import load_snapshot, topology_arrays
+from heartbeat import PhiAccrualDetector
+from telemetry import LinkReweighter
+from metrics import Metrics, get_logger, setup_logging
+from protocol import FrameReader, send_frame, encode_frame, encode_json, decode_json
+from protocol import MSG_ASSIGN, MSG_ROUTES, MSG_CONFIRM, MSG_ACK, MSG_OK, MSG_NO, MSG_HELLO
+from protocol import MSG_ROUTES_DELTA, MSG_RESYNC, MSG_HEARTBEAT, MSG_TELEMETRY
 import networkx as nx
 import time
 
+log = get_logger("controller")
+
 def compute_all_shortest_paths_dijkstra(network):
     all_paths = dict(nx.all_pairs_dijkstra_path(network.graph))
     for source, destinations in all_paths.items():
         for destination, path in destinations.items():
-            print(f"Shortest path from {source} to {destination}: {path}")
+            log.debug("Shortest path from %s to %s: %s", source, destination, path)
     return all_paths
 
 def compute_all_shortest_paths_bellman_ford(network):
     all_paths = dict(nx.all_pairs_bellman_ford_path(network.graph))
     for source, destinations in all_paths.items():
         for destination, path in destinations.items():
-            print(f"Shortest path from {source} to {destination}: {path}")
+            log.debug("Shortest path from %s to %s: %s", source, destination, path)
     return all_paths
 
 class TCPServer:
-    def __init__(self, host, port, algorithm_choice):
+    def __init__(self, host, port, algorithm_choice, headless=None, topology=None, heartbeat_interval=1.0,
+                 phi_threshold=8.0, heartbeat_workers=16, route_workers=1, multipath_tolerance=0.0,
+                 reweight_interval=30.0, metrics_port=None, fast_reroute=True, render_file=None):
         self.host = host
         self.port = port
         self.server_socket = None
         self.client_count = 0
         self.network = None
-        self.node_paths = None
+        self.route_table = None
         self.client_sockets = {}
+        self.send_locks = {}  # Router -> bloqueo de escritura en su socket, como Router.server_lock
+        self.pushed_rows = {}  # Ultima fila de siguientes saltos enviada a cada router
+        self.pushed_versions = {}  # Version de la tabla que tiene cada router
+        self.pushed_multipath = {}  # Ultimos conjuntos de saltos de igual coste enviados a cada router
+        self.multipath_tolerance = multipath_tolerance  # None desactiva los caminos multiples
+        self.pushed_backups = {}  # Ultimos saltos alternativos enviados a cada router
+        self.alternatives = {}  # Router -> caminos multiples y saltos alternativos calculados, ver alternatives_for
+        self.fast_reroute = fast_reroute  # Enviar saltos alternativos sin bucles para cada destino
         self.node_names_to_ids = {}  # Diccionario para mapear nombres de nodo a identificadores de nodo
         self.should_stop = threading.Event()  # Evento para indicar si se debe detener el servidor
-        self.ack_thread = None  # Hilo para enviar ACK cada 20 segundos
-        self.lock = threading.Lock()  # Bloqueo para evitar llamadas simultáneas a send_updated_paths
+        self.heartbeat_thread = None  # Hilo que sondea a los routers y detecta fallos
+        self.heartbeat_interval = heartbeat_interval  # Segundos entre sondeos
+        self.heartbeat_workers = heartbeat_workers  # Sondeos enviados en paralelo
+        self.detector = PhiAccrualDetector(threshold=phi_threshold, first_interval=heartbeat_interval)
+        self.reweighter = None  # Pesos de los enlaces segun el trafico informado por los routers
+        self.reweight_interval = reweight_interval  # Segundos entre recalculos de pesos; None los desactiva
+        self.metrics = Metrics()
+        self.metrics_port = metrics_port  # Puerto HTTP de las metricas; None no las publica
+        self.lock = threading.Lock()  # Bloqueo para evitar llamadas simultáneas a handle_node_failure
+        self.registration_lock = threading.Lock()  # Bloqueo para asignar nodos a los routers
         self.algorithm_choice = algorithm_choice  # Algoritmo elegido
+        self.route_workers = route_workers  # Procesos para calcular las rutas; 0 usa todos los nucleos
+        self.headless = headless  # None: se detecta si hay pantalla
+        self.render_file = render_file  # Imagen de la topologia tras cada cambio, p. ej. "network.png"; None no la dibuja
+        self.snapshot_file = "routes.snap"  # Instantanea binaria de las rutas para arrancar en caliente; None no la usa
+        self.snapshot_delay = 5.0  # Segundos que se agrupan los cambios antes de reescribir la instantanea
+        self.snapshot_lock = threading.Lock()
+        self.snapshot_pending = False
+        self.snapshot_thread = None
+        self.topology = topology  # Archivo de topologia; None para NSFNET
 
         self.create_network()
 
     def start(self):
         try:
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.server_socket.bind((self.host, self.port))
             self.server_socket.listen(5)
             print(f"Server listening on {self.host}:{self.port}...")
-            self.ack_thread = threading.Thread(target=self.send_ack_loop)
-            self.ack_thread.start()  # Iniciar hilo para enviar ACK cada 20 segundos
+            if self.metrics_port is not None:
+                self.metrics.serve(self.metrics_port)
+            self.heartbeat_thread = threading.Thread(target=self.heartbeat_loop)
+            self.heartbeat_thread.start()  # Iniciar hilo de sondeos y deteccion de fallos
+            if self.reweight_interval:
+                threading.Thread(target=self.reweight_loop, daemon=True).start()
             while not self.should_stop.is_set():
                 client_socket, client_address = self.server_socket.accept()
                 print(f"Connection established with {client_address}")
                 self.client_count += 1
-                if self.client_count > len(self.node_names_to_ids):
-                    print("No more available nodes.")
-                    continue
-                node_name = f"{list(self.node_names_to_ids.keys())[self.client_count - 1]}"
-                port = 12000 + self.client_count
-                client_socket.send(f"{node_name}:{port}".encode())
-                self.client_sockets[node_name] = client_socket
                 client_handler_thread = threading.Thread(
-                    target=self.handle_client, args=(client_socket, node_name)
+                    target=self.register_client, args=(client_socket,)
                 )
                 client_handler_thread.start()
         except Exception as e:
             print(f"Error starting server: {e}")
 
+    def assign_node(self, requested_name, client_socket):
+        # Registra al router por el nombre que anuncia. Solo un router sin nombre
+        # recibe el primer nodo libre; un nombre ocupado o desconocido se rechaza,
+        # porque el router ya escucha en el puerto de ese nodo. Devuelve
+        # (nodo, puerto) o (None, motivo del rechazo).
+        with self.registration_lock:
+            if not requested_name:
+                node_name = next((name for name in self.node_names_to_ids
+                                  if name not in self.client_sockets and self.route_table.has_source(name)), None)
+                if node_name is None:
+                    return None, "No more available nodes."
+            elif requested_name in self.client_sockets:
+                return None, f"Router {requested_name} is already registered."
+            else:
+                self.restore_node(requested_name)
+                if requested_name not in self.node_names_to_ids or not self.route_table.has_source(requested_name):
+                    return None, f"Unknown router {requested_name}."
+                node_name = requested_name
+            self.client_sockets[node_name] = client_socket
+        return node_name, 12000 + self.node_names_to_ids[node_name]
+
+    def register_client(self, client_socket):
+        reader = FrameReader(client_socket)
+        try:
+            msg_type, payload = reader.read_frame()
+            requested_name = bytes(payload).decode() if msg_type == MSG_HELLO else None
+        except (ConnectionError, UnicodeDecodeError) as e:
+            print(f"Error registering client: {e}")
+            client_socket.close()
+            return
+        if requested_name is None:
+            # Sin HELLO no es un router: no se le asigna ningun nodo
+            print(f"Closing connection that did not start with HELLO (message type {msg_type}).")
+            client_socket.close()
+            return
+        node_name, port = self.assign_node(requested_name, client_socket)
+        if node_name is None:
+            print(f"Rejected router registration: {port}")
+            try:
+                send_frame(client_socket, MSG_NO, port.encode())
+            except OSError:
+                pass
+            client_socket.close()
+            return
+        self.send_to_client(node_name, client_socket, encode_json(MSG_ASSIGN, {"name": node_name, "port": port}))
+        self.handle_client(client_socket, node_name, reader)
+
 
     def create_network(self):
-        self.network = Network()
-        self.network.add_node(1, 'Node WA')
-        self.node_names_to_ids['Node WA'] = 1  # Guardar la correspondencia de nombre a ID
-        self.network.add_node(2, 'Node CA1')
-        self.node_names_to_ids['Node CA1'] = 2
-        self.network.add_node(3, 'Node CA2')
-        self.node_names_to_ids['Node CA2'] = 3
-        self.network.add_node(4, 'Node UT')
-        self.node_names_to_ids['Node UT'] = 4
-        self.network.add_node(5, 'Node CO')
-        self.node_names_to_ids['Node CO'] = 5
-        self.network.add_node(6, 'Node TX')
-        self.node_names_to_ids['Node TX'] = 6
-        self.network.add_node(7, 'Node NE')
-        self.node_names_to_ids['Node NE'] = 7
-        self.network.add_node(8, 'Node IL')
-        self.node_names_to_ids['Node IL'] = 8
-        self.network.add_node(9, 'Node PA')
-        self.node_names_to_ids['Node PA'] = 9
-        self.network.add_node(10, 'Node GA')
-        self.node_names_to_ids['Node GA'] = 10
-        self.network.add_node(11, 'Node MI')
-        self.node_names_to_ids['Node MI'] = 11
-        self.network.add_node(12, 'Node NY')
-        self.node_names_to_ids['Node NY'] = 12
-        self.network.add_node(13, 'Node NJ')
-        self.node_names_to_ids['Node NJ'] = 13
-        self.network.add_node(14, 'Node DC')
-        self.node_names_to_ids['Node DC'] = 14
-        self.network.add_link(1, 2, 1/2100)
-        self.network.add_link(2, 3, 1/1200)
-        self.network.add_link(1, 3, 1/3000)
-        self.network.add_link(2, 4, 1/1500)
-        self.network.add_link(3, 6, 1/3600)
-        self.network.add_link(1, 8, 1/4800)
-        self.network.add_link(4, 5, 1/1200)
-        self.network.add_link(4, 11, 1/3900)
-        self.network.add_link(5, 6, 1/2400)
-        self.network.add_link(5, 7, 1/1200)
-        self.network.add_link(7, 8, 1/1500)
-        self.network.add_link(7, 10, 1/2700)
-        self.network.add_link(6, 14, 1/3600)
-        self.network.add_link(6, 10, 1/2100)
-        self.network.add_link(8, 9, 1/1500)
-        self.network.add_link(10, 9, 1/1500)
-        self.network.add_link(9, 13, 1/600)
-        self.network.add_link(9, 12, 1/600)
-        self.network.add_link(11, 12, 1/1200)
-        self.network.add_link(11, 13, 1/1500)
-        self.network.add_link(14, 13, 1/300)
-        self.network.add_link(14, 12, 1/600)
-        
-
-        self.network.visualize_network()
-        if self.algorithm_choice == "dijkstra":
-            self.node_paths = compute_all_shortest_paths_dijkstra(self.network)
-        elif self.algorithm_choice == "bellman-ford":
-            self.node_paths = compute_all_shortest_paths_bellman_ford(self.network)
-        else:
+        # La topologia se carga de un archivo (por defecto topologies/nsfnet.json)
+        self.network = load_topology(self.topology, headless=self.headless)
+        for node_id, node in self.network.nodes.items():
+            self.node_names_to_ids[node.name] = node_id  # Guardar la correspondencia de nombre a ID
+
+        self.network.visualize_network(self.render_file)
+        if self.algorithm_choice not in ALGORITHMS:
             print("Invalid choice. Using Dijkstra by default.")
-            self.node_paths = compute_all_shortest_paths_dijkstra(self.network)
-        self.save_paths_to_json()  # Llama al método para guardar las rutas
+            self.algorithm_choice = "dijkstra"
+        # Si hay una instantanea de la misma topologia se sirven sus rutas sin recalcular
+        snapshot = None
+        if self.snapshot_file:
+            snapshot = load_snapshot(self.snapshot_file, self.network.graph.nodes, self.network.graph)
+        self.route_table = RouteTable.from_snapshot(snapshot, self.route_workers) if snapshot else None
+        if self.route_table is not None:
+            print(f"Loaded routes version {self.route_table.version} from {self.snapshot_file}")
+        else:
+            with self.metrics.timer("route_compute_seconds"):
+                self.route_table = RouteTable.from_network(self.network, self.algorithm_choice, self.route_workers)
+            if self.snapshot_file:
+                self.write_snapshot()
+        self.reweighter = LinkReweighter(self.network.graph)
 
-    def save_paths_to_json(self):
-        for node, node_paths in self.node_paths.items():
-            filename = f"{node}_paths.json"
-            with open(filename, "w") as f:
-                json.dump(node_paths, f, indent=4)
-            print(f"Saved paths for {node} to {filename}")
+    def multipath_for(self, node_name):
+        if self.multipath_tolerance is None:
+            return {}
+        return self.route_table.multipath_for(self.network.graph, node_name, self.multipath_tolerance)
 
-    def send_ack_loop(self):
+    def backups_for(self, node_name):
+        if not self.fast_reroute:
+            return {}
+        return self.route_table.backups_for(self.network.graph, node_name)
+
+    def alternatives_for(self, node_name):
+        # Caminos multiples y saltos alternativos del router. Recorrer todos los
+        # destinos en Python cuesta O(n * grado) por router, asi que solo se
+        # recalculan si cambiaron sus enlaces o las filas de las que dependen: la
+        # suya, las de sus vecinos (entre ellos los saltos principales) y las de
+        # los extremos de sus tuneles. Si no, se reutiliza el resultado anterior.
+        route_table = self.route_table
+        ids, row_versions = route_table.ids, route_table.row_versions
+        adjacency = sorted((neighbor, data.get("weight", 1))
+                           for neighbor, data in self.network.graph[node_name].items())
+        cached = self.alternatives.get(node_name)
+        if cached is not None:
+            table, links, rows, multipath, backups = cached
+            if table is route_table and links == adjacency and \
+                    all(row_versions[node_id] == version for node_id, version in rows):
+                self.metrics.increment("alternatives_reused")
+                return multipath, backups
+        multipath = self.multipath_for(node_name)
+        backups = self.backups_for(node_name)
+        depends = {ids[node_name]} | {ids[neighbor] for neighbor, _ in adjacency}
+        depends.update(ids[hop[1]] for hop in backups.values() if isinstance(hop, list))
+        rows = [(node_id, row_versions[node_id]) for node_id in depends]
+        self.alternatives[node_name] = (route_table, adjacency, rows, multipath, backups)
+        return multipath, backups
+
+    def forget_removed_nodes(self, removed_nodes):
+        # Quitar un nodo no reescribe filas (solo vacia su columna): en los
+        # resultados guardados se retiran los destinos caidos, y los que usan un
+        # tunel que termina en uno de ellos se recalcularan
+        for node_name, (table, links, rows, multipath, backups) in list(self.alternatives.items()):
+            if node_name in removed_nodes or any(isinstance(hop, list) and hop[1] in removed_nodes
+                                                 for hop in backups.values()):
+                del self.alternatives[node_name]
+                continue
+            # Diccionarios nuevos: los anteriores pueden ser los ya enviados al router
+            multipath = {destination: hops for destination, hops in multipath.items()
+                         if destination not in removed_nodes}
+            backups = {destination: hop for destination, hop in backups.items() if destination not in removed_nodes}
+            self.alternatives[node_name] = (table, links, rows, multipath, backups)
+
+    def full_routes(self, node_name):
+        self.metrics.increment("full_tables_sent")
+        self.pushed_rows[node_name] = self.route_table.row_snapshot(node_name)
+        self.pushed_versions[node_name] = self.route_table.version
+        multipath, backups = self.alternatives_for(node_name)
+        self.pushed_multipath[node_name] = multipath
+        self.pushed_backups[node_name] = backups
+        return {"version": self.route_table.version, "routes": self.route_table.routes_for(node_name),
+                "multipath": multipath, "backups": backups}
+
+    def route_update(self, node_name):
+        # Devuelve solo los destinos que cambiaron desde el ultimo envio al router
+        old_row = self.pushed_rows.get(node_name)
+        if old_row is None:
+            return MSG_ROUTES, self.full_routes(node_name)
+        added, changed, withdrawn = self.route_table.diff_row(node_name, old_row)
+        # Conjuntos de caminos multiples que cambiaron; una lista vacia los retira
+        new_multipath, new_backups = self.alternatives_for(node_name)
+        old_multipath = self.pushed_multipath.get(node_name, {})
+        multipath = {destination: hops for destination, hops in new_multipath.items()
+                     if old_multipath.get(destination) != hops}
+        multipath.update({destination: [] for destination in old_multipath if destination not in new_multipath})
+        # Saltos alternativos que cambiaron; None los retira
+        old_backups = self.pushed_backups.get(node_name, {})
+        backups = {destination: hop for destination, hop in new_backups.items() if old_backups.get(destination) != hop}
+        backups.update({destination: None for destination in old_backups if destination not in new_backups})
+        if not (added or changed or withdrawn or multipath or backups):
+            return None, None
+        delta = {
+            "base_version": self.pushed_versions[node_name],
+            "version": self.route_table.version,
+            "added": added,
+            "changed": changed,
+            "withdrawn": withdrawn,
+            "multipath": multipath,
+            "backups": backups,
+        }
+        self.pushed_rows[node_name] = self.route_table.row_snapshot(node_name)
+        self.pushed_versions[node_name] = self.route_table.version
+        self.pushed_multipath[node_name] = new_multipath
+        self.pushed_backups[node_name] = new_backups
+        self.metrics.increment("route_deltas_sent")
+        return MSG_ROUTES_DELTA, delta
+
+    def save_snapshot(self):
+        # Programa la escritura de la instantanea en un hilo aparte: con miles de
+        # nodos son cientos de MB que no deben retrasar la recuperacion de un fallo.
+        # Los cambios que lleguen durante snapshot_delay segundos se guardan juntos.
+        if not self.snapshot_file:
+            return
+        with self.snapshot_lock:
+            self.snapshot_pending = True
+            if self.snapshot_thread is None:
+                self.snapshot_thread = threading.Thread(target=self.snapshot_worker, daemon=True)
+                self.snapshot_thread.start()
+
+    def snapshot_worker(self):
+        while True:
+            time.sleep(self.snapshot_delay)
+            with self.snapshot_lock:
+                if not self.snapshot_pending:
+                    self.snapshot_thread = None
+                    return
+                self.snapshot_pending = False
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                print(f"Error saving route snapshot to {self.snapshot_file}: {e}")
+
+    def write_snapshot(self):
+        # Un unico archivo binario con la topologia y todas las filas de rutas. Las
+        # filas se escriben sin copiarlas y sin self.lock; si mientras tanto cambia
+        # la tabla el archivo no se publica y se vuelve a programar.
+        with self.lock:
+            route_table, version = self.route_table, self.route_table.version
+            edges = topology_arrays(route_table.names, self.network.graph)
+
+        def unchanged():
+            with self.lock:
+                return self.route_table is route_table and route_table.version == version
+
+        if route_table.save_snapshot(self.snapshot_file, None, edges, unchanged):
+            print(f"Saved routes version {version} to {self.snapshot_file}")
+        else:
+            self.save_snapshot()
+
+    def heartbeat_loop(self):
+        # Cada intervalo se sondea en paralelo a los routers que llevan un intervalo
+        # sin dar senales de vida (los que envian latidos propios no se sondean) y
+        # se eliminan los que el detector phi accrual considera caidos
         try:
-            while not self.should_stop.is_set():
-                time.sleep(20)  # Cambiar a 20 segundos
-                for client_name, client_socket in self.client_sockets.items():
-                    try:
-                        client_socket.send("ACK".encode())
-                        print(f"Sent ACK message to {client_name}")
-                    except Exception as e:
-                        print(f"Error sending ACK message to {client_name}: {e}")
-                        # Manejar cualquier excepción al enviar el ACK
-                        # Esto podría deberse a que el nodo ya no está disponible
+            with ThreadPoolExecutor(max_workers=self.heartbeat_workers) as executor:
+                while not self.should_stop.wait(self.heartbeat_interval):
+                    now = time.monotonic()
+                    for client_name, client_socket in list(self.client_sockets.items()):
+                        if self.detector.silence(client_name, now) >= self.heartbeat_interval:
+                            executor.submit(self.probe, client_name, client_socket)
+                    for client_name in self.detector.suspects(now):
+                        print(f"Node {client_name} suspected, phi {self.detector.phi(client_name, now):.1f}")
                         self.handle_node_failure(client_name)
         except Exception as e:
-            print(f"Error sending ACK message: {e}")
+            print(f"Error in heartbeat loop: {e}")
+
+    def reweight_loop(self):
+        while not self.should_stop.wait(self.reweight_interval):
+            try:
+                self.reweight_links()
+            except Exception as e:
+                print(f"Error reweighting links: {e}")
 
-    def handle_client(self, client_socket, node_name):
+    def reweight_links(self, now=None):
+        # Con los pesos nuevos cambian arboles de cualquier fuente, asi que se
+        # recalculan todos; los routers solo reciben las filas que cambien
+        with self.lock:
+            changed = self.reweighter.reweight(self.network.graph, now)
+            if not changed:
+                return
+            with self.network.transaction():
+                for (u, v), weight in changed.items():
+                    self.network.add_link(self.node_names_to_ids[u], self.node_names_to_ids[v], weight)
+            print(f"Traffic changed the weight of {len(changed)} links. Computing new paths...")
+            self.metrics.increment("links_reweighted", len(changed))
+            with self.metrics.timer("route_compute_seconds"):
+                self.route_table.compute(self.network.graph, self.algorithm_choice)
+            self.send_updated_paths()
+
+    def probe(self, client_name, client_socket):
         try:
-            paths_json = self.node_paths[node_name]
-            client_socket.send(json.dumps(paths_json).encode())
-            print(f"Sent paths JSON to {node_name}")
+            self.send_to_client(client_name, client_socket, encode_frame(MSG_ACK))
+        except OSError as e:
+            print(f"Error sending ACK message to {client_name}: {e}")
+            # Esto podría deberse a que el nodo ya no está disponible
+            self.handle_node_failure(client_name)
+
+    def send_to_client(self, node_name, client_socket, data):
+        # Sondeos, cambios de rutas y respuestas a RESYNC salen de hilos distintos:
+        # el bloqueo de cada router evita que dos tramas se mezclen en su socket
+        with self.send_locks.setdefault(node_name, threading.Lock()):
+            client_socket.sendall(data)
 
-            filename = f"{node_name}_paths.json"
-            self.send_file(client_socket, filename)
+    def handle_client(self, client_socket, node_name, reader):
+        try:
+            self.send_to_client(node_name, client_socket, encode_json(MSG_ROUTES, self.full_routes(node_name)))
+            print(f"Sent routes to {node_name}")
 
             # Wait for confirmation from client
-            confirmation = client_socket.recv(1024).decode()
+            msg_type, _ = reader.read_frame()
+            if msg_type != MSG_CONFIRM:
+                # El registro no se completo: se libera el nodo sin tratarlo como un fallo
+                print(f"Router {node_name} did not confirm its routes (message type {msg_type}). Dropping session.")
+                return
+            self.detector.heartbeat(node_name)  # A partir de aqui se vigila al router
 
             while not self.should_stop.is_set():
                 try:
-                    data = client_socket.recv(1024).decode()
-                    if not data:
+                    msg_type, payload = reader.read_frame()
+                    if msg_type is None:
                         print(f"Connection with {node_name} closed unexpectedly.")
-                        client_socket.send("NO".encode())  # Enviar respuesta "NO" al cliente
                         self.handle_node_failure(node_name)
                         break
-                    print(
-                        f"Received data from {node_name} ({client_socket.getpeername()}): {data}"
-                    )
-
-                    print(f"Received ACK message from {node_name}.")
-                    if data == "NO":  # Si la respuesta es "NO"
-                        print(f"Node {node_name} responded 'NO'. Removing node...")
-                        self.handle_node_failure(node_name)
-                except ConnectionResetError:
+                    self.process_client_message(client_socket, node_name, msg_type, payload)
+                except ConnectionError:
                     print(f"Connection with {node_name} reset by peer.")
-                    client_socket.send("NO".encode())  # Enviar respuesta "NO" al cliente
                     self.handle_node_failure(node_name)
                     break
         except Exception as e:
             print(f"Error handling client: {e}")
         finally:
             client_socket.close()
-            del self.client_sockets[node_name]
+            # Si el router ya se registro de nuevo, su sesion nueva no se toca
+            if self.client_sockets.get(node_name) is client_socket:
+                del self.client_sockets[node_name]
 
-    def send_file(self, client_socket, filename):
-        with open(filename, 'rb') as f:
-            while True:
-                data = f.read(1024)
-                if not data:
-                    break
-                client_socket.send(data)
-            client_socket.send(b'EOF')
-            print(f"Sent file {filename} to client")
-        f.close()
+    def process_client_message(self, client_socket, node_name, msg_type, payload):
+        self.detector.heartbeat(node_name)  # Cualquier trama cuenta como latido
+        if msg_type == MSG_HEARTBEAT:
+            pass
+        elif msg_type == MSG_TELEMETRY:
+            self.record_telemetry(node_name, payload)
+        elif msg_type == MSG_OK:
+            log.debug("Received ACK message from %s.", node_name)
+        elif msg_type == MSG_NO:  # Si la respuesta es "NO"
+            print(f"Node {node_name} responded 'NO'. Removing node...")
+            self.handle_node_failure(node_name)
+        elif msg_type == MSG_RESYNC:
+            print(f"Node {node_name} requested its full routing table.")
+            self.send_to_client(node_name, client_socket, encode_json(MSG_ROUTES, self.full_routes(node_name)))
+        else:
+            print(f"Received unexpected message type {msg_type} from {node_name}")
+
+    def record_telemetry(self, node_name, payload):
+        # Un informe mal formado se descarta sin cerrar la sesion del router
+        try:
+            links = {neighbor: (int(sent_bytes), int(messages))
+                     for neighbor, (sent_bytes, messages) in decode_json(payload)["links"].items()}
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self.metrics.increment("router_frames_dropped")
+            log.warning("Dropping malformed telemetry from router %s: %r", node_name, e)
+            return
+        self.metrics.increment("telemetry_reports")
+        self.reweighter.record(node_name, links)
 
     def handle_node_failure(self, node_name):
+        # Se puede llamar a la vez desde el hilo de sondeos y desde el del router
+        with self.lock:
+            self.remove_failed_node(node_name)
+
+    def remove_failed_node(self, node_name):
         print(f"Node {node_name} did not respond to ACK. Removing node...")
+        self.detector.remove(node_name)
         node_id = self.node_names_to_ids.get(node_name)
-        if node_id is not None:
-            self.network.remove_node(node_id)  # Eliminar el nodo de la red
-            self.network.visualize_network()
+        if node_id is not None and node_id in self.network.nodes:
+            with self.network.transaction() as change:
+                self.network.remove_node(node_id)  # Eliminar el nodo de la red
+            client_socket = self.client_sockets.pop(node_name, None)  # Eliminar el socket del diccionario
             try:
-                self.client_sockets[node_name].close()  # Cerrar el socket del cliente
+                if client_socket:
+                    client_socket.close()  # Cerrar el socket del cliente
             except Exception as e:
                 print(f"Error closing socket for {node_name}: {e}")
-            del self.client_sockets[node_name]  # Eliminar el socket del diccionario
-            print("Computing new paths...")
-            self.node_paths = compute_all_shortest_paths_dijkstra(self.network)  # Recalcular rutas
-            print("New paths computed.")
-            self.send_updated_paths()  # Llama a la función para enviar las nuevas rutas
+            self.metrics.increment("node_failures")
+            self.recompute_routes(change)
             self.print_updated_paths()  # Imprimir las nuevas rutas después de eliminar el nodo
         else:
             print(f"Node {node_name} not found in the network.")
 
+    @contextmanager
+    def topology_update(self):
+        # Aplica varios cambios a la red y recalcula las rutas una sola vez al salir:
+        #     with server.topology_update() as network:
+        #         network.remove_link(1, 2)
+        #         network.add_link(1, 3, 1 / 1500)
+        with self.lock:
+            with self.network.transaction() as change:
+                yield self.network
+            self.recompute_routes(change)
+
+    def recompute_routes(self, change):
+        # Llamar con self.lock tomado. Si solo se quitaron elementos basta con
+        # reparar los arboles que los usaban; si se anadieron hay que recalcular
+        # todo, y con nodos nuevos la tabla se reconstruye con mas filas.
+        if not change:
+            return
+        if change.removed_nodes:
+            self.forget_removed_nodes(change.removed_nodes)
+        for name in change.removed_nodes:
+            self.pushed_rows.pop(name, None)
+            self.pushed_versions.pop(name, None)
+            self.pushed_multipath.pop(name, None)
+            self.pushed_backups.pop(name, None)
+        if self.render_file:
+            self.network.render_async(self.render_file)  # Sin bloquear la recuperacion del fallo
+        print("Computing new paths...")
+        with self.metrics.timer("route_compute_seconds"):
+            if any(name not in self.route_table.ids for name in change.added_nodes):
+                version = self.route_table.version
+                self.route_table = RouteTable.from_network(self.network, self.algorithm_choice, self.route_workers)
+                self.route_table.version = version + 1
+                # Las filas enviadas tienen otro tamano: cada router recibira su tabla completa
+                self.pushed_rows.clear()
+                for node_id, node in self.network.nodes.items():
+                    self.node_names_to_ids[node.name] = node_id
+            elif change.added_nodes or change.added_links:
+                self.route_table.compute(self.network.graph, self.algorithm_choice)
+            else:
+                # Solo se recalculan los arboles que pasaban por lo eliminado
+                affected = self.route_table.repair(self.network.graph, self.algorithm_choice,
+                                                   removed_links=change.removed_links,
+                                                   removed_nodes=change.removed_nodes)
+                print(f"Recomputed shortest-path trees for {len(affected)} sources.")
+        print("New paths computed.")
+        self.send_updated_paths()  # Llama a la función para enviar las nuevas rutas
+
+    def restore_node(self, node_name):
+        # Un router que vuelve tras un fallo recupera su nodo y sus enlaces
+        node_id = self.node_names_to_ids.get(node_name)
+        if node_id is None or node_id not in self.network.removed:
+            return False
+        with self.topology_update() as network:
+            network.restore_node(node_id)
+        return True
+
     def print_updated_paths(self):
-        print("Updated paths after removing node:")
-        for source, destinations in self.node_paths.items():
-            for destination, path in destinations.items():
-                print(f"Shortest path from {source} to {destination}: {path}")
+        # n^2 caminos: solo se reconstruyen si el nivel DEBUG esta activo
+        if not log.isEnabledFor(logging.DEBUG):
+            return
+        log.debug("Updated paths after removing node:")
+        for source in self.route_table.sources():
+            for destination in self.route_table.routes_for(source):
+                log.debug("Shortest path from %s to %s: %s", source, destination,
+                          self.route_table.path(source, destination))
 
     def send_updated_paths(self):
-        # Enviar las nuevas rutas actualizadas
-        for client_name, client_socket in self.client_sockets.items():
-            if client_name in self.node_paths:
-                paths_json = self.node_paths[client_name]
-                client_socket.send(json.dumps(paths_json).encode())
-                print(f"Sent updated paths JSON to {client_name}")
-                self.save_paths_to_json()  # Actualiza el archivo JSON después de enviar las rutas
-            else:
-                print(f"Node {client_name} not found in the network.")
+        # Enviar a cada router solo los cambios de su tabla
+        with self.metrics.timer("route_push_seconds"):
+            for client_name, client_socket in list(self.client_sockets.items()):
+                if self.route_table.has_source(client_name):
+                    msg_type, message = self.route_update(client_name)
+                    if msg_type is None:
+                        continue
+                    try:
+                        self.send_to_client(client_name, client_socket, encode_json(msg_type, message))
+                        log.debug("Sent route update to %s", client_name)
+                    except OSError as e:
+                        print(f"Error sending route update to {client_name}: {e}")
+                else:
+                    print(f"Node {client_name} not found in the network.")
+        self.save_snapshot()  # Se guarda en segundo plano, fuera de self.lock
 
 # Ejemplo de uso
 if __name__ == "__main__":
-    algorithm_choice = input("Choose the algorithm to compute shortest paths (Dijkstra/Bellman-Ford): ").strip().lower()
-    server = TCPServer("localhost", 8888, algorithm_choice)
+    setup_logging()
+    algorithm_choice = input("Choose the algorithm to compute shortest paths (Dijkstra/Bellman-Ford/Sparse): ").strip().lower()
+    topology = sys.argv[1] if len(sys.argv) > 1 else None
+    server = TCPServer("localhost", 8888, algorithm_choice, topology=topology)
     server.start()
@@ -0,0 +1,173 @@
+import sys
+import threading
+import time
+from router import Router, log
+from metrics import setup_logging
+from protocol import encode_json, decode_json, MSG_DISTANCE_VECTOR
+
+
+class DistanceVector:
+    # Bellman-Ford distribuido: cada router conoce el coste de sus enlaces y el
+    # ultimo vector anunciado por cada vecino, y elige para cada destino el vecino
+    # con menor coste de enlace + coste anunciado. Con poison reverse los destinos
+    # que se alcanzan a traves de un vecino se le anuncian como inalcanzables;
+    # sin el (split horizon) simplemente no se le anuncian.
+    def __init__(self, name, link_costs, infinity, poison_reverse=True):
+        self.name = name
+        self.link_costs = dict(link_costs)  # Vecino -> coste del enlace
+        self.infinity = infinity  # Un coste igual o mayor cuenta como inalcanzable
+        self.poison_reverse = poison_reverse
+        self.vectors = {}  # Vecino -> {destino: coste} que anuncio por ultima vez
+        self.routes = {}  # Destino -> (coste, siguiente salto)
+
+    def recompute(self):
+        # Devuelve True si cambio algun siguiente salto o coste
+        routes = {}
+        for neighbor, vector in self.vectors.items():
+            link_cost = self.link_costs[neighbor]
+            for destination, cost in vector.items():
+                if destination == self.name:
+                    continue
+                total = link_cost + cost
+                if total >= self.infinity:
+                    continue
+                best = routes.get(destination)
+                if best is None or (total, neighbor) < best:
+                    routes[destination] = (total, neighbor)
+        changed = routes != self.routes
+        self.routes = routes
+        return changed
+
+    def update(self, neighbor, vector):
+        # vector: destino -> coste, o None si el vecino lo anuncia inalcanzable
+        if neighbor not in self.link_costs:
+            return False
+        self.vectors[neighbor] = {destination: cost for destination, cost in vector.items() if cost is not None}
+        return self.recompute()
+
+    def neighbor_down(self, neighbor):
+        if self.vectors.pop(neighbor, None) is None:
+            return False
+        return self.recompute()
+
+    def advertisement(self, neighbor):
+        vector = {self.name: 0.0}
+        for destination, (cost, next_hop) in self.routes.items():
+            if next_hop != neighbor:
+                vector[destination] = cost
+            elif self.poison_reverse:
+                vector[destination] = None
+        return vector
+
+    def next_hops(self):
+        return {destination: next_hop for destination, (_, next_hop) in self.routes.items()}
+
+    def backups(self):
+        # Mejor vecino alternativo para cada destino. Un vecino que llega al
+        # destino a traves de este router lo anuncia como inalcanzable (o no lo
+        # anuncia), asi que ningun alternativo devuelve el trafico por aqui.
+        backups = {}
+        for destination, (_, next_hop) in self.routes.items():
+            best = None
+            for neighbor, vector in self.vectors.items():
+                cost = vector.get(destination)
+                if neighbor == next_hop or cost is None:
+                    continue
+                total = self.link_costs[neighbor] + cost
+                if total < self.infinity and (best is None or (total, neighbor) < best):
+                    best = (total, neighbor)
+            if best is not None:
+                backups[destination] = best[1]
+        return backups
+
+
+class DistanceVectorRouter(Router):
+    # Router que calcula sus propias rutas intercambiando vectores de distancias
+    # con sus vecinos por los enlaces persistentes. El controlador es opcional:
+    # con server_port None no se conecta a el, y si se conecta solo lo usa para
+    # latidos y telemetria, ignorando las rutas que le envie.
+    def __init__(self, server_host, server_port, router_port, node_name, topology=None, update_interval=1.0,
+                 neighbor_timeout=3.5, poison_reverse=True, heartbeat_interval=1.0, telemetry_interval=5.0,
+                 metrics_port=None):
+        super().__init__(server_host, server_port, router_port, node_name, topology, heartbeat_interval,
+                         telemetry_interval, metrics_port)
+        self.update_interval = update_interval  # Segundos entre anuncios periodicos
+        self.neighbor_timeout = neighbor_timeout  # Intervalos sin anuncios para dar un vecino por caido
+        link_costs = {neighbor: data.get("weight", 1) for neighbor, data in self.graph[node_name].items()}
+        # Ningun camino simple cuesta mas que la suma de todos los enlaces: cota para la cuenta a infinito
+        infinity = sum(weight for _, _, weight in self.graph.edges(data="weight", default=1)) * 1.01
+        self.vector = DistanceVector(node_name, link_costs, infinity, poison_reverse)
+        self.last_heard = {}  # Vecino -> instante de su ultimo anuncio
+        self.vector_lock = threading.Lock()
+
+    def load_routes(self):
+        # Las rutas guardadas vienen del controlador; aqui se aprenden de los vecinos
+        pass
+
+    def update_routes(self, payload):
+        log.debug("Ignoring routes from the controller in distance-vector mode.")
+
+    def apply_route_delta(self, payload):
+        return True
+
+    def process_distance_vector(self, neighbor, payload):
+        with self.vector_lock:
+            self.last_heard[neighbor] = time.monotonic()
+            changed = self.vector.update(neighbor, decode_json(payload)["vector"])
+            if changed:
+                self.apply_vector_routes()
+        if changed:
+            self.advertise()  # Anuncio inmediato para converger sin esperar al periodo
+
+    def apply_vector_routes(self):
+        self.metrics.increment("vector_route_changes")
+        self.next_hops = self.vector.next_hops()
+        self.backups = self.vector.backups()
+        self.routes_version = (self.routes_version or 0) + 1
+        self.populate_routing_table()
+
+    def advertise(self):
+        with self.vector_lock:
+            advertisements = {neighbor: self.vector.advertisement(neighbor) for neighbor in self.vector.link_costs}
+        for neighbor, vector in advertisements.items():
+            self.link_pool.send(neighbor, encode_json(MSG_DISTANCE_VECTOR, {"vector": vector}))
+        self.metrics.increment("vectors_sent", len(advertisements))
+
+    def vector_loop(self):
+        while True:
+            time.sleep(self.update_interval)
+            deadline = time.monotonic() - self.neighbor_timeout * self.update_interval
+            with self.vector_lock:
+                changed = False
+                for neighbor, heard in list(self.last_heard.items()):
+                    if heard < deadline:
+                        print(f"No distance vector from router {neighbor}; removing its routes.")
+                        del self.last_heard[neighbor]
+                        changed = self.vector.neighbor_down(neighbor) or changed
+                if changed:
+                    self.apply_vector_routes()
+            self.advertise()
+
+    def start(self):
+        try:
+            print(f"Router port: {self.router_port} (distance-vector mode)")
+            if self.metrics_port is not None:
+                self.metrics.serve(self.metrics_port)
+            threading.Thread(target=self.start_router_socket).start()
+            threading.Thread(target=self.vector_loop, daemon=True).start()
+            if self.server_port is not None:
+                self.connect_to_server()
+        except Exception as e:
+            print(f"Error occurred: {e}")
+        finally:
+            if self.server_socket:
+                self.server_socket.close()
+
+
+# Ejemplo de uso: python distance_vector.py [topologia]; sin controlador
+if __name__ == "__main__":
+    node_name = input("Nombre Router: ")
+    topology = sys.argv[1] if len(sys.argv) > 1 else None
+    setup_logging()
+    router = DistanceVectorRouter("localhost", None, None, node_name, topology)
+    router.start()
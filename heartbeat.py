@@ -0,0 +1,88 @@
+import math
+import threading
+import time
+from collections import deque
+
+
+class HeartbeatHistory:
+    # Ventana de intervalos entre latidos con sumas acumuladas para la media y la varianza
+    def __init__(self, first_interval, window_size, now):
+        self.intervals = deque()
+        self.window_size = window_size
+        self.total = 0.0
+        self.squares = 0.0
+        self.last_arrival = now
+        self.add(first_interval)
+
+    def add(self, interval):
+        if len(self.intervals) == self.window_size:
+            dropped = self.intervals.popleft()
+            self.total -= dropped
+            self.squares -= dropped * dropped
+        self.intervals.append(interval)
+        self.total += interval
+        self.squares += interval * interval
+
+    def mean(self):
+        return self.total / len(self.intervals)
+
+    def std(self):
+        mean = self.mean()
+        return math.sqrt(max(self.squares / len(self.intervals) - mean * mean, 0.0))
+
+
+class PhiAccrualDetector:
+    # Detector de fallos phi accrual: en lugar de un plazo fijo calcula, a partir
+    # de los intervalos observados entre latidos de cada router, la sospecha
+    # phi = -log10(P(el siguiente latido llegue aun mas tarde)). Con phi 8 la
+    # probabilidad de equivocarse es de 1 entre 10^8.
+    def __init__(self, threshold=8.0, first_interval=1.0, window_size=100, min_std=0.1, acceptable_pause=0.5,
+                 clock=time.monotonic):
+        self.clock = clock  # Reloj de los latidos; la simulacion usa su reloj virtual
+        self.threshold = threshold
+        self.first_interval = first_interval  # Intervalo supuesto hasta tener muestras
+        self.window_size = window_size
+        self.min_std = min_std  # Evita sospechas por un retraso minimo si los latidos son muy regulares
+        self.acceptable_pause = acceptable_pause  # Margen para pausas breves (GC, carga)
+        self.histories = {}
+        self.lock = threading.Lock()
+
+    def heartbeat(self, name, now=None):
+        now = self.clock() if now is None else now
+        with self.lock:
+            history = self.histories.get(name)
+            if history is None:
+                self.histories[name] = HeartbeatHistory(self.first_interval, self.window_size, now)
+            else:
+                history.add(now - history.last_arrival)
+                history.last_arrival = now
+
+    def remove(self, name):
+        with self.lock:
+            self.histories.pop(name, None)
+
+    def silence(self, name, now=None):
+        # Tiempo desde el ultimo latido; 0 si el router no esta vigilado
+        now = self.clock() if now is None else now
+        history = self.histories.get(name)
+        return now - history.last_arrival if history else 0.0
+
+    def phi(self, name, now=None):
+        now = self.clock() if now is None else now
+        with self.lock:
+            history = self.histories.get(name)
+            if history is None:
+                return 0.0
+            elapsed = now - history.last_arrival
+            mean = history.mean() + self.acceptable_pause
+            std = max(history.std(), self.min_std)
+        # Aproximacion logistica de la normal acumulada, acotada para no desbordar exp
+        y = min(max((elapsed - mean) / std, -10.0), 10.0)
+        e = math.exp(-y * (1.5976 + 0.070566 * y * y))
+        if elapsed > mean:
+            return -math.log10(e / (1.0 + e))
+        return -math.log10(1.0 - 1.0 / (1.0 + e))
+
+    def suspects(self, now=None):
+        now = self.clock() if now is None else now
+        return [name for name in list(self.histories) if self.phi(name, now) > self.threshold]
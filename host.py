@@ -1,13 +1,45 @@
+import asyncio
 import socket
+import sys
 import threading
-import json
+from protocol import FrameReader, send_frame, send_json, encode_frame, encode_json, encode_batch, decode_batch
+from protocol import read_frame_async, MSG_REGISTER, MSG_DATA, MSG_DELIVER, MSG_DATA_BATCH, MSG_DELIVER_BATCH
+from protocol import MSG_PACKET, DEFAULT_TTL, packet_frame, decode_packet
+from topology import load_topology, host_ids
+from metrics import get_logger
+
+log = get_logger("host")
+
+
+def delivered_messages(msg_type, payload, host_names=()):
+    # Convierte una trama recibida en una lista de (origen, mensaje). Los
+    # paquetes binarios se entregan como bytes, sin decodificar; los lotes pueden
+    # llevar bytes encolados con queue_message, asi que se decodifican sin fallar
+    if msg_type == MSG_PACKET:
+        _, source_id, _, data = decode_packet(payload)
+        source = host_names[source_id] if source_id < len(host_names) else str(source_id)
+        return [(source, bytes(data))]
+    if msg_type == MSG_DELIVER:
+        source, _, message = bytes(payload).decode().removeprefix("Message from ").partition(": ")
+        return [(source, message)]
+    if msg_type == MSG_DELIVER_BATCH:
+        source, _, messages = decode_batch(payload)
+        return [(source, message.decode(errors="replace")) for message in messages]
+    return []
+
 
 class Host:
 
-    def __init__(self, host_name, router_port):
+    def __init__(self, host_name, router_port, batch_bytes=65536, topology=None):
         self.host_name = host_name
         self.router_port = router_port
+        self.topology = topology  # Para traducir nombres de host a los ids de los paquetes binarios
+        self.host_ids = None
+        self.host_names = ()
         self.client_socket = None
+        self.pending = {}  # Destino -> mensajes en cola para el siguiente lote
+        self.pending_bytes = 0
+        self.batch_bytes = batch_bytes  # Al llegar a este tamano el lote se envia sin esperar a flush()
 
     def connect(self):
         try:
@@ -16,41 +48,127 @@ class Host:
             self.client_socket.connect(("localhost", self.router_port))
             print(f"Connected to router at port {self.router_port}")
             # Send the host name to the router
-            self.client_socket.send(self.host_name.encode())
+            send_frame(self.client_socket, MSG_REGISTER, self.host_name.encode())
         except ConnectionRefusedError as e:
             print(f"Connection refused: {e}")
 
     def send_message(self, dest_host, message):
         try:
-            print(f"Sending message to {dest_host}...")
             # Create a JSON formatted message
-            msg = json.dumps({"dest_host": dest_host, "message": message})
-            self.client_socket.send(msg.encode())
-            print("Message sent successfully.")
+            send_json(self.client_socket, MSG_DATA, {"dest_host": dest_host, "message": message})
+            log.debug("Message sent to %s.", dest_host)
         except AttributeError:
             print("Please connect to the router first.")
         except Exception as e:
             print(f"Failed to send message: {e}")
 
+    def load_host_ids(self):
+        # La topologia solo se carga si se usan paquetes binarios
+        if self.host_ids is None:
+            self.host_ids = host_ids(load_topology(self.topology, headless=True))
+            self.host_names = list(self.host_ids)
+        return self.host_ids
+
+    def encode_packet(self, dest_host, data, ttl=DEFAULT_TTL):
+        ids = self.load_host_ids()
+        data = data.encode() if isinstance(data, str) else data
+        return packet_frame(ids[dest_host], ids[self.host_name], ttl, data)
+
+    def send_packet(self, dest_host, data, ttl=DEFAULT_TTL):
+        # Paquete binario: los routers solo leen la cabecera, asi que el contenido
+        # puede llevar cualquier byte
+        self.client_socket.sendall(self.encode_packet(dest_host, data, ttl))
+
+    def queue_message(self, dest_host, message):
+        # Los mensajes se agrupan por destino y se envian todos juntos con flush()
+        data = message.encode() if isinstance(message, str) else bytes(message)
+        self.pending.setdefault(dest_host, []).append(data)
+        self.pending_bytes += len(data)
+        if self.pending_bytes >= self.batch_bytes:
+            self.flush()
+
+    def send_batch(self, dest_host, messages):
+        for message in messages:
+            self.queue_message(dest_host, message)
+        self.flush()
+
+    def encode_pending(self):
+        frames = b"".join(encode_frame(MSG_DATA_BATCH, encode_batch(self.host_name, dest_host, messages))
+                          for dest_host, messages in self.pending.items())
+        self.pending = {}
+        self.pending_bytes = 0
+        return frames
+
+    def flush(self):
+        # Una sola escritura para todos los lotes pendientes
+        if self.pending:
+            self.client_socket.sendall(self.encode_pending())
+
+    def messages(self):
+        # Iterador de (origen, mensaje) recibidos, tanto sueltos como en lotes
+        reader = FrameReader(self.client_socket)
+        while True:
+            msg_type, payload = reader.read_frame()
+            if msg_type is None:
+                return
+            if msg_type == MSG_PACKET:
+                self.load_host_ids()
+            yield from delivered_messages(msg_type, payload, self.host_names)
+
     def receive_messages(self):
+        try:
+            for source, message in self.messages():
+                if isinstance(message, bytes):
+                    message = message.decode(errors="replace")
+                print(f"\nReceived message: Message from {source}: {message}")
+            print("Connection closed by the router.")
+        except Exception as e:
+            print(f"Error receiving message: {e}")
+
+
+class AsyncHost(Host):
+    # Misma API de lotes sobre asyncio; los mensajes recibidos se consumen con
+    # "async for source, message in host.stream()"
+    def __init__(self, host_name, router_port, batch_bytes=65536, topology=None):
+        super().__init__(host_name, router_port, batch_bytes, topology)
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection("localhost", self.router_port)
+        self.writer.write(encode_frame(MSG_REGISTER, self.host_name.encode()))
+
+    def send_message(self, dest_host, message):
+        self.writer.write(encode_json(MSG_DATA, {"dest_host": dest_host, "message": message}))
+
+    def send_packet(self, dest_host, data, ttl=DEFAULT_TTL):
+        self.writer.write(self.encode_packet(dest_host, data, ttl))
+
+    def flush(self):
+        if self.pending:
+            self.writer.write(self.encode_pending())
+
+    async def drain(self):
+        self.flush()
+        await self.writer.drain()
+
+    async def stream(self):
         while True:
-            try:
-                message = self.client_socket.recv(1024).decode()
-                if message:
-                    print(f"\nReceived message: {message}")
-                else:
-                    print("Connection closed by the router.")
-                    break
-            except Exception as e:
-                print(f"Error receiving message: {e}")
-                break
+            msg_type, payload = await read_frame_async(self.reader)
+            if msg_type is None:
+                return
+            if msg_type == MSG_PACKET:
+                self.load_host_ids()
+            for item in delivered_messages(msg_type, payload, self.host_names):
+                yield item
 
 # Ejemplo de uso
 if __name__ == "__main__":
     host_name = input("Nombre host: ")
     router_port = int(input("Puerto Router: "))
     
-    host = Host(host_name, router_port)
+    topology = sys.argv[1] if len(sys.argv) > 1 else None
+    host = Host(host_name, router_port, topology=topology)
     host.connect()  # Conectarse al router antes de ingresar el mensaje
     
     # Iniciar un hilo para recibir mensajes
@@ -61,7 +179,10 @@ if __name__ == "__main__":
     while True:
         dest_host = input("Enter destination host: ")  # Ingresar el nombre del host de destino
         message = input("Enter message: ")  # Ingresar el mensaje
-        host.send_message(dest_host, message)
+        try:
+            host.send_packet(dest_host, message)
+        except KeyError:
+            print(f"Unknown host {dest_host}")
         
         continue_sending = input("Do you want to send another message? (yes/no): ")
         if continue_sending.lower() != 'yes':
@@ -0,0 +1,26 @@
+class Link:
+    # Enlace no dirigido entre dos nodos. bandwidth guarda el valor que recibe
+    # Network.add_link, que es el peso del enlace en el grafo (1/ancho de banda).
+    __slots__ = ("source", "destination", "bandwidth")
+
+    def __init__(self, source, destination, bandwidth):
+        self.source = source
+        self.destination = destination
+        self.bandwidth = bandwidth
+
+    def key(self):
+        return link_key(self.source.node_id, self.destination.node_id)
+
+    def other(self, node_id):
+        return self.destination if self.source.node_id == node_id else self.source
+
+    def __repr__(self):
+        return f"Link({self.source.node_id!r}, {self.destination.node_id!r}, {self.bandwidth!r})"
+
+    def __str__(self):
+        return f"Link {self.source.name} <-> {self.destination.name} (weight {self.bandwidth})"
+
+
+def link_key(source_id, destination_id):
+    # Los enlaces se indexan por el par de ids ordenado
+    return (source_id, destination_id) if source_id <= destination_id else (destination_id, source_id)
@@ -0,0 +1,184 @@
+import queue
+import socket
+import threading
+import time
+from metrics import get_logger
+from protocol import encode_frame, send_parts, MSG_PEER
+
+log = get_logger("link_pool")
+
+
+class NeighborLink:
+    # Conexion persistente con un router vecino. Los mensajes se encolan en una
+    # cola acotada y un hilo emisor los envia agrupados por la misma conexion,
+    # reconectando si se pierde. Con on_failure el enlace no reintenta: las tramas
+    # que no se pudieron enviar se devuelven al router y durante recovery_delay
+    # segundos send() las rechaza para que use el salto alternativo.
+    def __init__(self, local_name, neighbor_name, port, host="localhost", queue_size=1024,
+                 max_retries=3, retry_delay=0.1, on_failure=None, recovery_delay=1.0, metrics=None):
+        self.local_name = local_name
+        self.neighbor_name = neighbor_name
+        self.host = host
+        self.port = port
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.sock = None
+        self.on_failure = on_failure
+        self.recovery_delay = recovery_delay
+        self.metrics = metrics  # Cuenta las tramas descartadas con la cola llena
+        self.full = False  # La cola estaba llena en el ultimo envio
+        self.failed_at = None  # Instante del ultimo fallo; None si el enlace funciona
+        self.sent_bytes = 0  # Contadores desde el ultimo informe de telemetria
+        self.sent_messages = 0
+        self.counter_lock = threading.Lock()
+        self.closed = threading.Event()
+        self.sender_thread = threading.Thread(target=self.send_loop, daemon=True)
+        self.sender_thread.start()
+
+    def send(self, frame):
+        if self.failed_at is not None and time.monotonic() - self.failed_at < self.recovery_delay:
+            return False
+        if type(frame) is tuple:
+            # El contenido de un paquete apunta al buffer del FrameReader, que se
+            # reutiliza en la siguiente lectura: esta es su unica copia en el router
+            frame = frame[:-1] + (bytes(frame[-1]),)
+        try:
+            self.queue.put_nowait(frame)
+            self.full = False
+            return True
+        except queue.Full:
+            # Se avisa una vez al llenarse la cola; cada descarte solo se cuenta
+            if self.metrics is not None:
+                self.metrics.increment("frames_dropped")
+            if not self.full:
+                self.full = True
+                log.warning("Send queue to router %s is full. Dropping messages.", self.neighbor_name)
+            return False
+
+    def connect(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.connect((self.host, int(self.port)))
+        sock.sendall(encode_frame(MSG_PEER, self.local_name.encode()))
+        self.sock = sock
+        print(f"Opened persistent link to router {self.neighbor_name} on port {self.port}")
+
+    def disconnect(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def send_loop(self):
+        while not self.closed.is_set():
+            frame = self.queue.get()
+            if frame is None:
+                break
+            # Agrupar todo lo pendiente en una sola escritura
+            frames = [frame]
+            while True:
+                try:
+                    pending = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if pending is None:
+                    self.closed.set()
+                    break
+                frames.append(pending)
+            # Las partes de todas las tramas salen en una escritura dispersa, sin unirlas
+            parts = []
+            for frame in frames:
+                if type(frame) is tuple:
+                    parts.extend(frame)
+                else:
+                    parts.append(frame)
+            if self.write(parts):
+                with self.counter_lock:
+                    self.sent_bytes += sum(map(len, parts))
+                    self.sent_messages += len(frames)
+            elif self.on_failure:
+                self.on_failure(self.neighbor_name, frames)
+        self.disconnect()
+
+    def write(self, parts):
+        retries = 0 if self.on_failure else self.max_retries
+        delay = self.retry_delay
+        for attempt in range(retries + 1):
+            try:
+                if self.sock is None:
+                    self.connect()
+                send_parts(self.sock, parts)
+                self.failed_at = None
+                return True
+            except OSError as e:
+                print(f"Link to router {self.neighbor_name} failed (attempt {attempt + 1}): {e}")
+                self.failed_at = time.monotonic()
+                self.disconnect()
+                if attempt < retries:
+                    time.sleep(delay)
+                    delay *= 2
+        if not self.on_failure:
+            print(f"Dropping {sum(map(len, parts))} bytes queued for router {self.neighbor_name}")
+        return False
+
+    def take_counters(self):
+        with self.counter_lock:
+            counters = [self.sent_bytes, self.sent_messages]
+            self.sent_bytes = self.sent_messages = 0
+        return counters
+
+    def close(self):
+        self.closed.set()
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            self.disconnect()
+
+
+class LinkPool:
+    # Un enlace persistente por router vecino, creado en el primer envio
+    def __init__(self, local_name, ports, host="localhost", queue_size=1024, on_failure=None, metrics=None):
+        self.local_name = local_name
+        self.ports = ports
+        self.host = host
+        self.queue_size = queue_size
+        self.on_failure = on_failure  # Recibe (vecino, tramas) cuando un enlace falla
+        self.metrics = metrics
+        self.links = {}
+        self.lock = threading.Lock()
+
+    def get(self, neighbor_name):
+        link = self.links.get(neighbor_name)
+        if link is None:
+            with self.lock:
+                link = self.links.get(neighbor_name)
+                if link is None:
+                    link = NeighborLink(self.local_name, neighbor_name, self.ports[neighbor_name],
+                                        host=self.host, queue_size=self.queue_size, on_failure=self.on_failure,
+                                        metrics=self.metrics)
+                    self.links[neighbor_name] = link
+        return link
+
+    def send(self, neighbor_name, frame):
+        return self.get(neighbor_name).send(frame)
+
+    def take_counters(self):
+        # Vecino -> [bytes, mensajes] enviados desde la llamada anterior
+        with self.lock:
+            links = list(self.links.items())
+        return {name: link.take_counters() for name, link in links}
+
+    def close_unused(self, active_names):
+        with self.lock:
+            for name in list(self.links):
+                if name not in active_names:
+                    self.links.pop(name).close()
+
+    def close(self):
+        with self.lock:
+            for link in self.links.values():
+                link.close()
+            self.links.clear()
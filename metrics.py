@@ -0,0 +1,139 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Limites superiores de las cubetas de los histogramas de latencia, en segundos
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def get_logger(name):
+    # Las trazas por mensaje van a DEBUG: con el nivel por defecto (WARNING)
+    # logger.debug() sale en cuanto comprueba el nivel, sin formatear nada
+    return logging.getLogger(f"nsfnet.{name}")
+
+
+def setup_logging(level=None):
+    # Nivel desde el argumento o la variable NSFNET_LOG_LEVEL (DEBUG, INFO, WARNING...)
+    level = level or os.environ.get("NSFNET_LOG_LEVEL", "WARNING")
+    logging.basicConfig(level=level.upper(), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # La ultima cubeta es +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q):
+        # Limite superior de la cubeta que contiene el cuantil q
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    # Contadores e histogramas de un proceso (router o controlador). Se leen por
+    # HTTP en formato de texto de Prometheus (/metrics) o en JSON (/metrics.json).
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, name):
+        return Timer(self, name)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {
+                    name: {"count": h.count, "sum": h.total, "p50": h.quantile(0.5), "p99": h.quantile(0.99)}
+                    for name, h in self.histograms.items()
+                },
+            }
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE nsfnet_{name} counter")
+                lines.append(f"nsfnet_{name} {value}")
+            for name, histogram in sorted(self.histograms.items()):
+                lines.append(f"# TYPE nsfnet_{name} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'nsfnet_{name}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f'nsfnet_{name}_bucket{{le="+Inf"}} {histogram.count}')
+                lines.append(f"nsfnet_{name}_sum {histogram.total}")
+                lines.append(f"nsfnet_{name}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="localhost"):
+        # Servidor HTTP en un hilo aparte; devuelve el servidor para poder cerrarlo
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = metrics.render().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(metrics.snapshot()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Metrics available at http://{host}:{server.server_port}/metrics")
+        return server
+
+
+class Timer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
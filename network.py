@@ -1,50 +1,202 @@
+import os
+import threading
+from contextlib import contextmanager
 import networkx as nx
-import matplotlib.pyplot as plt
 from node import Node
-from link import Link
+from link import Link, link_key
+
+
+def has_display():
+    return os.name == "nt" or bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+def render_graph_to_file(graph, filename):
+    # Se usa la API de Figure con el backend Agg, sin pyplot ni ventana
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    figure = Figure(figsize=(16, 12))
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    pos = nx.spring_layout(graph)  # positions for all nodes
+    nx.draw(graph, pos, ax=axes, with_labels=True, node_size=7000, node_color="skyblue", font_size=15, font_weight="bold")
+    labels = nx.get_edge_attributes(graph, 'weight')
+    nx.draw_networkx_edge_labels(graph, pos, edge_labels=labels, ax=axes)
+    figure.savefig(filename)
+
+
+class TopologyChange:
+    # Cambios acumulados en una transaccion, por nombre de nodo, para recalcular
+    # las rutas una sola vez al terminar
+    __slots__ = ("added_nodes", "removed_nodes", "added_links", "removed_links")
 
-class Network:
     def __init__(self):
+        self.added_nodes = set()
+        self.removed_nodes = set()
+        self.added_links = set()  # Pares de nombres; incluye enlaces cuyo peso cambio
+        self.removed_links = set()
+
+    def __bool__(self):
+        return bool(self.added_nodes or self.removed_nodes or self.added_links or self.removed_links)
+
+    def merge(self, other):
+        self.added_nodes |= other.added_nodes
+        self.removed_nodes |= other.removed_nodes
+        self.added_links |= other.added_links
+        self.removed_links |= other.removed_links
+
+
+class Network:
+    # Los nodos se indexan por id y cada uno guarda sus enlaces por id del vecino,
+    # asi anadir o quitar un nodo cuesta O(grado). El grafo de networkx se mantiene
+    # a la par porque lo usan los motores de rutas y el dibujo.
+    def __init__(self, headless=None):
         self.nodes = {}
-        self.links = []
+        self.links = {}  # (id menor, id mayor) -> Link
         self.graph = nx.Graph()
+        self.removed = {}  # Id -> (nodo, enlaces) de los nodos caidos, para restaurarlos
+        self.change = None  # TopologyChange de la transaccion abierta
+        # Sin pantalla la red se dibuja en un archivo desde un hilo aparte
+        self.headless = not has_display() if headless is None else headless
+        self.render_lock = threading.Lock()
+        self.pending_render = None
+        self.render_thread = None
+
+    @contextmanager
+    def transaction(self):
+        # Agrupa varios cambios: devuelve un TopologyChange con todos ellos. Las
+        # transacciones anidadas se suman a la exterior.
+        outer = self.change
+        self.change = change = TopologyChange()
+        try:
+            yield change
+        finally:
+            self.change = outer
+            if outer is not None:
+                outer.merge(change)
 
     def add_node(self, node_id, name, node_type='router'):
         if node_id not in self.nodes:
             self.nodes[node_id] = Node(node_id, name, node_type)
             self.graph.add_node(name, node_type=node_type)
+            if self.change is not None:
+                self.change.added_nodes.add(name)
 
     def add_link(self, source_id, destination_id, bandwidth):
-        if source_id in self.nodes and destination_id in self.nodes:
-            self.links.append(Link(self.nodes[source_id], self.nodes[destination_id], bandwidth))
-            self.graph.add_edge(self.nodes[source_id].name, self.nodes[destination_id].name, weight=bandwidth)
-        else:
+        source, destination = self.nodes.get(source_id), self.nodes.get(destination_id)
+        if source is None or destination is None:
             print("Error: One or both nodes not found in the network.")
-            
-    def remove_node(self, node_id):
-        if node_id in self.nodes:
-            node_name = self.nodes[node_id].name
-            self.graph.remove_node(node_name)
-            del self.nodes[node_id]
-            # Remove any links associated with this node
-            self.links = [link for link in self.links if
-                          link.source.node_id != node_id and link.destination.node_id != node_id]
-            print(f"Node {node_name} and its associated links have been removed from the network.")
+            return
+        key = link_key(source_id, destination_id)
+        link = self.links.get(key)
+        if link is None:
+            link = self.links[key] = Link(source, destination, bandwidth)
+            source.links[destination_id] = link
+            destination.links[source_id] = link
         else:
+            link.bandwidth = bandwidth  # Un enlace repetido solo actualiza su peso
+        self.graph.add_edge(source.name, destination.name, weight=bandwidth)
+        if self.change is not None:
+            self.change.added_links.add((source.name, destination.name))
+
+    def remove_link(self, source_id, destination_id):
+        link = self.links.pop(link_key(source_id, destination_id), None)
+        if link is None:
+            print(f"Link {source_id} - {destination_id} not found in the network.")
+            return None
+        del link.source.links[link.destination.node_id]
+        del link.destination.links[link.source.node_id]
+        self.graph.remove_edge(link.source.name, link.destination.name)
+        if self.change is not None:
+            self.change.removed_links.add((link.source.name, link.destination.name))
+        return link
+
+    def remove_node(self, node_id):
+        node = self.nodes.pop(node_id, None)
+        if node is None:
             print(f"Node ID {node_id} not found in the network.")
-    
-    
+            return
+        links = list(node.links.values())
+        for neighbor_id, link in node.links.items():
+            del self.links[link_key(node_id, neighbor_id)]
+            neighbor = self.nodes.get(neighbor_id)
+            if neighbor is not None:
+                del neighbor.links[node_id]
+        node.links = {}
+        self.graph.remove_node(node.name)
+        self.removed[node_id] = (node, links)
+        if self.change is not None:
+            self.change.removed_nodes.add(node.name)
+        print(f"Node {node.name} and its associated links have been removed from the network.")
+
+    def restore_node(self, node_id):
+        # Vuelve a anadir un nodo caido con los enlaces que tenia hacia nodos
+        # presentes. Los enlaces hacia vecinos que siguen caidos pasan a estos,
+        # y se recuperaran cuando vuelvan.
+        entry = self.removed.pop(node_id, None)
+        if entry is None:
+            return False
+        node, links = entry
+        self.add_node(node_id, node.name, node.node_type)
+        for link in links:
+            other = link.other(node_id)
+            if other.node_id in self.nodes:
+                self.add_link(node_id, other.node_id, link.bandwidth)
+            elif other.node_id in self.removed:
+                self.removed[other.node_id][1].append(link)
+        print(f"Node {node.name} has been restored to the network.")
+        return True
+
+    def copy(self, headless=True):
+        # Red independiente con los mismos nodos y enlaces presentes
+        network = Network(headless=headless)
+        for node_id, node in self.nodes.items():
+            network.add_node(node_id, node.name, node.node_type)
+        for link in self.links.values():
+            network.add_link(link.source.node_id, link.destination.node_id, link.bandwidth)
+        return network
+
     def display_network(self):
         print("Nodes in the network:")
         for node in self.nodes.values():
             print(node)
         print("\nLinks in the network:")
-        for link in self.links:
+        for link in self.links.values():
             print(link)
 
-    def visualize_network(self):
+    def visualize_network(self, filename=None):
+        # Sin pantalla solo se dibuja si se pide un archivo
+        if self.headless:
+            if filename:
+                self.render_async(filename)
+            return
+        import matplotlib.pyplot as plt  # Solo se importa cuando se pide dibujar
         pos = nx.spring_layout(self.graph)  # positions for all nodes
         nx.draw(self.graph, pos, with_labels=True, node_size=7000, node_color="skyblue", font_size=15, font_weight="bold")
         labels = nx.get_edge_attributes(self.graph, 'weight')
         nx.draw_networkx_edge_labels(self.graph, pos, edge_labels=labels)
         plt.show()
+
+    def render_async(self, filename="network.png"):
+        # Copia la topologia y la dibuja fuera del camino de control. Si llegan
+        # varias peticiones mientras se dibuja, solo se atiende la ultima.
+        graph = self.graph.copy()
+        with self.render_lock:
+            self.pending_render = (graph, filename)
+            if self.render_thread is None:
+                self.render_thread = threading.Thread(target=self.render_worker, daemon=True)
+                self.render_thread.start()
+
+    def render_worker(self):
+        while True:
+            with self.render_lock:
+                job = self.pending_render
+                self.pending_render = None
+                if job is None:
+                    self.render_thread = None
+                    return
+            graph, filename = job
+            try:
+                render_graph_to_file(graph, filename)
+                print(f"Network topology rendered to {filename}")
+            except Exception as e:
+                print(f"Error rendering network to {filename}: {e}")
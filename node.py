@@ -0,0 +1,22 @@
+class Node:
+    # Router de la topologia. Con __slots__ no hay un dict por instancia, lo que
+    # importa en redes de miles de nodos. links indexa los enlaces por id del vecino.
+    __slots__ = ("node_id", "name", "node_type", "links")
+
+    def __init__(self, node_id, name, node_type='router'):
+        self.node_id = node_id
+        self.name = name
+        self.node_type = node_type
+        self.links = {}  # Id del vecino -> Link
+
+    def degree(self):
+        return len(self.links)
+
+    def neighbors(self):
+        return self.links.keys()
+
+    def __repr__(self):
+        return f"Node({self.node_id!r}, {self.name!r}, {self.node_type!r})"
+
+    def __str__(self):
+        return f"Node {self.node_id}: {self.name} ({self.node_type}, {len(self.links)} links)"
@@ -0,0 +1,229 @@
+import asyncio
+import json
+import struct
+
+# Cabecera de cada trama: tipo de mensaje (1 byte) y longitud del contenido (4 bytes)
+HEADER = struct.Struct('!BI')
+# Cabecera de un lote: longitud del origen, longitud del destino y numero de mensajes
+BATCH_HEADER = struct.Struct('!HHI')
+MESSAGE_LENGTH = struct.Struct('!I')
+# Cabecera de un paquete binario: id del host destino, id del host origen, TTL y longitud del contenido
+PACKET_HEADER = struct.Struct('!IIBI')
+DEFAULT_TTL = 64
+# Cabecera de un tunel de reparacion: longitud del nombre del router donde termina
+TUNNEL_HEADER = struct.Struct('!H')
+# Buffers por llamada a sendmsg (IOV_MAX en Linux)
+IOV_MAX = 1024
+
+MSG_ASSIGN = 1    # controlador -> router: nombre y puerto asignados
+MSG_ROUTES = 2    # controlador -> router: tabla destino -> siguiente salto
+MSG_CONFIRM = 3   # router -> controlador: tabla recibida
+MSG_ACK = 4       # controlador -> router: comprobacion de estado
+MSG_OK = 5        # router -> controlador: respuesta al ACK
+MSG_NO = 6        # nodo no disponible
+MSG_REGISTER = 7  # host -> router: nombre del host
+MSG_DATA = 8      # host -> router: mensaje para otro host
+MSG_FORWARD = 9   # router -> router: mensaje en transito
+MSG_DELIVER = 10  # router -> host: mensaje entregado
+MSG_PEER = 11     # router -> router: apertura de un enlace persistente
+MSG_HELLO = 12    # router -> controlador: nombre con el que se anuncia el router
+MSG_ROUTES_DELTA = 13  # controlador -> router: cambios respecto a la version anterior
+MSG_RESYNC = 14   # router -> controlador: pide la tabla completa
+MSG_HEARTBEAT = 15  # router -> controlador: latido enviado por iniciativa del router
+MSG_DATA_BATCH = 16     # host -> router: lote de mensajes para un mismo host
+MSG_FORWARD_BATCH = 17  # router -> router: lote en transito, reenviado sin desempaquetar
+MSG_DELIVER_BATCH = 18  # router -> host: lote entregado
+MSG_TELEMETRY = 19      # router -> controlador: bytes y mensajes enviados a cada vecino
+MSG_PACKET = 20         # host -> router -> router -> host: paquete binario con cabecera fija
+MSG_DISTANCE_VECTOR = 21  # router -> router: vector de distancias en modo distribuido
+MSG_TUNNEL = 22         # router -> router: trama encapsulada hasta otro router (LFA remoto)
+
+
+def encode_frame(msg_type, payload=b''):
+    return HEADER.pack(msg_type, len(payload)) + payload
+
+
+def encode_json(msg_type, obj):
+    return encode_frame(msg_type, json.dumps(obj).encode())
+
+
+def decode_json(payload):
+    return json.loads(bytes(payload))
+
+
+def encode_batch(source, dest, messages):
+    # Lote binario: cabecera, origen, destino y cada mensaje precedido de su longitud
+    source, dest = source.encode(), dest.encode()
+    parts = [BATCH_HEADER.pack(len(source), len(dest), len(messages)), source, dest]
+    for message in messages:
+        parts.append(MESSAGE_LENGTH.pack(len(message)))
+        parts.append(message)
+    return b"".join(parts)
+
+
+def batch_header(payload):
+    # Origen y destino de un lote sin leer sus mensajes; devuelve tambien donde empiezan
+    source_length, dest_length, count = BATCH_HEADER.unpack_from(payload)
+    offset = BATCH_HEADER.size
+    source = bytes(payload[offset:offset + source_length]).decode()
+    offset += source_length
+    dest = bytes(payload[offset:offset + dest_length]).decode()
+    return source, dest, count, offset + dest_length
+
+
+def decode_batch(payload):
+    source, dest, count, offset = batch_header(payload)
+    view = memoryview(payload)
+    messages = []
+    for _ in range(count):
+        (length,) = MESSAGE_LENGTH.unpack_from(view, offset)
+        offset += MESSAGE_LENGTH.size
+        messages.append(bytes(view[offset:offset + length]))
+        offset += length
+    return source, dest, messages
+
+
+def packet_parts(dest_id, source_id, ttl, data):
+    # Trama MSG_PACKET como (cabeceras, contenido) sin unir: solo se construyen
+    # los 18 bytes de cabecera con el TTL nuevo y data, que puede ser una
+    # memoryview del paquete recibido, no se copia. Los enlaces escriben las
+    # partes por separado con send_parts() o writelines().
+    header = HEADER.pack(MSG_PACKET, PACKET_HEADER.size + len(data))
+    return header + PACKET_HEADER.pack(dest_id, source_id, ttl, len(data)), data
+
+
+def packet_frame(dest_id, source_id, ttl, data):
+    # Trama MSG_PACKET completa en un solo bloque de bytes, para quien la envia una vez (los hosts)
+    return b"".join(packet_parts(dest_id, source_id, ttl, data))
+
+
+def frame_length(frame):
+    # Las tramas encoladas son bytes o, las de paquetes, una tupla de partes
+    return sum(map(len, frame)) if type(frame) is tuple else len(frame)
+
+
+def decode_packet(payload):
+    # Devuelve (destino, origen, TTL, contenido como memoryview)
+    dest_id, source_id, ttl, length = PACKET_HEADER.unpack_from(payload)
+    if PACKET_HEADER.size + length > len(payload):
+        raise ValueError("Packet shorter than its header says")
+    return dest_id, source_id, ttl, memoryview(payload)[PACKET_HEADER.size:PACKET_HEADER.size + length]
+
+
+def encode_tunnel(endpoint, frame):
+    # Una trama en partes sigue en partes: solo se antepone la cabecera del tunel
+    endpoint = endpoint.encode()
+    prefix = TUNNEL_HEADER.pack(len(endpoint)) + endpoint
+    header = HEADER.pack(MSG_TUNNEL, len(prefix) + frame_length(frame)) + prefix
+    if type(frame) is tuple:
+        return (header + frame[0],) + frame[1:]
+    return header + frame
+
+
+def decode_tunnel(payload):
+    # Devuelve el router donde termina el tunel y la trama encapsulada
+    (length,) = TUNNEL_HEADER.unpack_from(payload)
+    view = memoryview(payload)
+    endpoint = bytes(view[TUNNEL_HEADER.size:TUNNEL_HEADER.size + length]).decode()
+    return endpoint, view[TUNNEL_HEADER.size + length:]
+
+
+def iter_frames(data):
+    # Tramas completas seguidas en un mismo buffer; el contenido es una memoryview
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        msg_type, length = HEADER.unpack_from(view, offset)
+        offset += HEADER.size
+        yield msg_type, view[offset:offset + length]
+        offset += length
+
+
+def send_frame(sock, msg_type, payload=b''):
+    sock.sendall(encode_frame(msg_type, payload))
+
+
+def send_parts(sock, parts):
+    # Escritura dispersa: las partes salen en una llamada a sendmsg sin unirlas
+    # antes. sendmsg puede escribir solo una parte y admite como mucho IOV_MAX
+    # buffers, asi que se repite con lo que falte. Sin sendmsg (Windows) se unen.
+    if not hasattr(sock, "sendmsg"):
+        sock.sendall(b"".join(parts))
+        return
+    parts = [memoryview(part) for part in parts if len(part)]
+    index = 0
+    while index < len(parts):
+        sent = sock.sendmsg(parts[index:index + IOV_MAX])
+        while sent and index < len(parts):
+            size = len(parts[index])
+            if sent < size:
+                parts[index] = parts[index][sent:]
+                break
+            sent -= size
+            index += 1
+
+
+def send_json(sock, msg_type, obj):
+    sock.sendall(encode_json(msg_type, obj))
+
+
+async def read_frame_async(stream):
+    # Equivalente a FrameReader.read_frame() para un asyncio.StreamReader
+    try:
+        header = await stream.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None, None
+        raise ConnectionError("Connection closed in the middle of a frame header")
+    msg_type, length = HEADER.unpack(header)
+    try:
+        payload = await stream.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise ConnectionError("Connection closed in the middle of a frame")
+    return msg_type, payload
+
+
+class FrameReader:
+    # Lee tramas de un socket sobre un buffer reservado de antemano. Los datos se
+    # reciben con recv_into en bloques grandes y el contenido se devuelve como
+    # memoryview, valido solo hasta la siguiente llamada a read_frame().
+    def __init__(self, sock, buffer_size=65536):
+        self.sock = sock
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def _fill(self, needed):
+        if self.start + needed > len(self.buffer):
+            pending = self.end - self.start
+            if needed > len(self.buffer):
+                # Trama mayor que el buffer: se reserva una vez con el tamano exacto
+                buffer = bytearray(max(needed, 2 * len(self.buffer)))
+                buffer[:pending] = self.view[self.start:self.end]
+                self.buffer = buffer
+                self.view = memoryview(buffer)
+            else:
+                self.buffer[:pending] = bytes(self.view[self.start:self.end])
+            self.start = 0
+            self.end = pending
+        while self.end - self.start < needed:
+            received = self.sock.recv_into(self.view[self.end:])
+            if not received:
+                return False
+            self.end += received
+        return True
+
+    def read_frame(self):
+        # Devuelve (tipo, contenido) o (None, None) si el otro extremo cerro la conexion
+        if not self._fill(HEADER.size):
+            if self.end == self.start:
+                return None, None
+            raise ConnectionError("Connection closed in the middle of a frame header")
+        msg_type, length = HEADER.unpack_from(self.buffer, self.start)
+        self.start += HEADER.size
+        if not self._fill(length):
+            raise ConnectionError("Connection closed in the middle of a frame")
+        payload = self.view[self.start:self.start + length]
+        self.start += length
+        return msg_type, payload
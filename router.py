@@ -1,232 +1,557 @@
 import socket
+import struct
 import threading
 import json
+import logging
+import sys
+import time
+import zlib
+from array import array
+from topology import load_topology, router_ports, host_routers, host_ids
+from routing import NO_ROUTE
+from snapshot import load_snapshot, write_snapshot
+from link_pool import LinkPool
+from metrics import Metrics, get_logger, setup_logging
+from protocol import FrameReader, send_frame, encode_frame, encode_json, decode_json, batch_header
+from protocol import HEADER, packet_parts, decode_packet, encode_tunnel, decode_tunnel, send_parts
+from protocol import MSG_ROUTES, MSG_CONFIRM, MSG_ACK, MSG_OK, MSG_REGISTER, MSG_DATA, MSG_FORWARD, MSG_DELIVER, MSG_PEER, MSG_HELLO
+from protocol import MSG_ROUTES_DELTA, MSG_RESYNC, MSG_HEARTBEAT, MSG_DATA_BATCH, MSG_FORWARD_BATCH, MSG_DELIVER_BATCH
+from protocol import MSG_TELEMETRY, MSG_PACKET, MSG_DISTANCE_VECTOR, MSG_TUNNEL, MSG_ASSIGN, MSG_NO
+
+log = get_logger("router")
 
 class Router:
-    def __init__(self, server_host, server_port, router_port):
+    def __init__(self, server_host, server_port, router_port, node_name=None, topology=None, heartbeat_interval=1.0,
+                 telemetry_interval=5.0, metrics_port=None):
         self.server_host = server_host
         self.server_port = server_port
         self.router_port = router_port
         self.server_socket = None
-        self.node_name = "RouterNode"
+        self.server_lock = threading.Lock()  # Los latidos y las respuestas se envian desde hilos distintos
+        self.heartbeat_interval = heartbeat_interval  # None: solo se responde a los sondeos del controlador
+        self.telemetry_interval = telemetry_interval  # None: no se informa del trafico de los enlaces
+        self.metrics = Metrics()
+        self.metrics_port = metrics_port  # Puerto HTTP de las metricas; None no las publica
+        self.requested_name = node_name  # Nombre con el que el router se anuncia al controlador
+        self.node_name = node_name or "RouterNode"
         self.hosts = {}
-        self.paths = {}
+        self.host_locks = {}  # Host -> bloqueo de escritura en su socket
+        self.next_hops = {}  # Router destino -> siguiente salto, enviado por el controlador
         self.routing_table = {}
-        self.routers = {
-            "Node WA": 15000,
-            "Node CA1": 15001,
-            "Node CA2": 15002,
-            "Node UT": 15003,
-            "Node CO": 15004,
-            "Node TX": 15005,
-            "Node NE": 15006,
-            "Node IL": 15007,
-            "Node PA": 15008,
-            "Node GA": 15009,
-            "Node MI": 15010,
-            "Node NY": 15011,
-            "Node NJ": 15012,
-            "Node DC": 15013
-        }
-        self.node_to_router = {
-            "Host WA" : "Node WA",
-            "Host CA1" : "Node CA1",
-            "Host CA2" : "Node CA2",
-            "Host UT" : "Node UT",
-            "Host CO" : "Node CO",
-            "Host TX" : "Node TX",
-            "Host NE" : "Node NE",
-            "Host IL" : "Node IL",
-            "Host PA" : "Node PA",
-            "Host GA" : "Node GA",
-            "Host MI" : "Node MI",
-            "Host NY" : "Node NY",
-            "Host NJ" : "Node NJ",
-            "Host DC" : "Node DC"
-            
-        }
+        self.multipath = {}  # Router destino -> saltos de igual coste, si hay mas de uno
+        self.multipath_table = {}  # Host destino -> saltos de igual coste
+        self.backups = {}  # Router destino -> salto alternativo, o [vecino, fin del tunel], si falla el principal
+        self.backup_table = {}  # Host destino -> salto alternativo
+        self.read_topology(topology)
+        self.packet_routes = [None] * len(self.host_names)  # Id de host -> siguiente salto o saltos
+        self.flow_seed = 0
+        if self.router_port is None:
+            if node_name not in self.routers:
+                print(f"Unknown router {node_name}: give its host port or a name from the topology")
+                sys.exit(1)
+            self.router_port = self.routers[node_name]  # Puerto del router segun la topologia
+        self.routes_version = None  # Version de la tabla recibida del controlador
+        # Enlaces persistentes con los routers vecinos; lo que no llega a un vecino caido se reencamina
+        self.link_pool = LinkPool(self.node_name, self.routers, on_failure=self.reroute_frames, metrics=self.metrics)
+        if node_name:
+            self.load_routes()  # Rutas de la ultima ejecucion, hasta que lleguen las del controlador
+
+    def read_topology(self, topology):
+        # Nombres y puertos de los routers y hosts salen del archivo de topologia
+        network = load_topology(topology, headless=True)
+        self.graph = network.graph
+        self.names = list(network.graph.nodes)  # Ids enteros de los routers, como en el controlador
+        self.routers = router_ports(network)
+        self.node_to_router = host_routers(network)
+        self.host_names = list(host_ids(network))  # Id de host de los paquetes binarios -> nombre
+        self.router_hosts = {}  # Router -> hosts conectados a el
+        for host_name, router_name in self.node_to_router.items():
+            self.router_hosts.setdefault(router_name, []).append(host_name)
 
     def connect_to_server(self):
         try:
             print(f"Connecting to server at {self.server_host}:{self.server_port}...")
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server_socket.connect((self.server_host, self.server_port))
-            node_info = self.server_socket.recv(1024).decode()
-            self.node_name, port = node_info.split(':')
-            self.server_port = int(port)
+            send_frame(self.server_socket, MSG_HELLO, (self.requested_name or "").encode())
+            reader = FrameReader(self.server_socket)
+            msg_type, payload = reader.read_frame()
+            if msg_type != MSG_ASSIGN:
+                # MSG_NO trae el motivo: nombre ocupado o que no esta en la topologia
+                reason = bytes(payload).decode() if msg_type == MSG_NO else f"message type {msg_type}"
+                print(f"Server rejected the registration: {reason}")
+                self.server_socket.close()
+                return
+            node_info = decode_json(payload)
+            self.node_name, self.server_port = node_info["name"], node_info["port"]
+            self.link_pool.local_name = self.node_name
             print(f"Connected to server as {self.node_name} on port {self.server_port}")
 
-            # Receive paths JSON from server
-            print("Waiting to receive paths JSON from server...")
-            paths_json = b""
+            # Receive routes from server
+            print("Waiting to receive routes from server...")
+            msg_type, payload = reader.read_frame()
+            if msg_type == MSG_ROUTES:
+                self.update_routes(payload)
+
+            # Send confirmation to server
+            send_frame(self.server_socket, MSG_CONFIRM)
+            if self.heartbeat_interval:
+                threading.Thread(target=self.heartbeat_loop, daemon=True).start()
+            if self.telemetry_interval:
+                threading.Thread(target=self.telemetry_loop, daemon=True).start()
+
+            # Listen for ACK messages and route updates from server
             while True:
-                data = self.server_socket.recv(1024)
-                if b'EOF' in data:
-                    paths_json += data.split(b'EOF')[0]
+                msg_type, payload = reader.read_frame()
+                if not self.process_server_message(msg_type, payload):
                     break
-                paths_json += data
+        except ConnectionRefusedError as e:
+            print(f"Connection refused: {e}")
+        except json.JSONDecodeError as e:
+            print(f"JSON decode error: {e}")
+
+    def process_server_message(self, msg_type, payload):
+        # Devuelve False si el mensaje no es de la sesion y hay que cerrarla
+        if msg_type == MSG_ACK:
+            log.debug("Received ACK message from server. Node is OK.")
+            self.send_to_server(MSG_OK)
+        elif msg_type == MSG_ROUTES:
+            print("Received updated routes from server.")
+            self.update_routes(payload)
+        elif msg_type == MSG_ROUTES_DELTA:
+            print("Received route changes from server.")
+            if not self.apply_route_delta(payload):
+                self.send_to_server(MSG_RESYNC)
+        else:
+            print(f"Received unexpected message from server: {msg_type}")
+            return False
+        return True
 
-            paths_json_str = paths_json.decode().strip()
+    def send_to_server(self, msg_type, payload=b''):
+        with self.server_lock:
+            send_frame(self.server_socket, msg_type, payload)
 
-            # Debugging output for received JSON string
-            print(f"Received paths JSON string: {paths_json_str}")
+    def heartbeat_loop(self):
+        # Latidos propios: el controlador detecta la caida sin tener que sondear
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                self.send_to_server(MSG_HEARTBEAT)
+            except OSError:
+                break
+
+    def telemetry_report(self):
+        # Trafico enviado a cada vecino desde el informe anterior
+        return encode_json(MSG_TELEMETRY, {"links": self.link_pool.take_counters()})
 
+    def telemetry_loop(self):
+        while True:
+            time.sleep(self.telemetry_interval)
             try:
-                # Split the concatenated JSON strings
-                json_objects = paths_json_str.split('}{')
-                if len(json_objects) == 2:
-                    json_objects[0] += '}'
-                    json_objects[1] = '{' + json_objects[1]
+                with self.server_lock:
+                    self.server_socket.sendall(self.telemetry_report())
+            except OSError:
+                break
 
-                    # Load each JSON object
-                    paths1 = json.loads(json_objects[0])
-                    paths2 = json.loads(json_objects[1])
+    def update_routes(self, payload):
+        message = decode_json(payload)
+        self.routes_version = message["version"]
+        self.next_hops = message["routes"]
+        self.multipath = message.get("multipath", {})
+        self.backups = message.get("backups", {})
+        self.save_routes()
 
-                    # Combine the paths (assuming we need to merge them)
-                    self.paths = {**paths1, **paths2}
+        # Debugging output for routes
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Next hops received from server: %s", json.dumps(self.next_hops, indent=2))
 
+        # Populate routing table
+        self.populate_routing_table()
+        self.link_pool.close_unused(self.active_next_hops())
+
+    def apply_route_delta(self, payload):
+        # Aplica en el sitio los destinos anadidos, cambiados y retirados. Si la
+        # version base no coincide se devuelve False para pedir la tabla completa.
+        delta = decode_json(payload)
+        if delta["base_version"] != self.routes_version:
+            print(f"Route delta for version {delta['base_version']} does not match local version {self.routes_version}")
+            return False
+        for router_name in delta["withdrawn"]:
+            self.next_hops.pop(router_name, None)
+            self.multipath.pop(router_name, None)
+            self.backups.pop(router_name, None)
+            for host_name in self.router_hosts.get(router_name, ()):
+                self.routing_table.pop(host_name, None)
+                self.multipath_table.pop(host_name, None)
+                self.backup_table.pop(host_name, None)
+        for changes in (delta["added"], delta["changed"]):
+            for router_name, next_hop in changes.items():
+                self.next_hops[router_name] = next_hop
+                for host_name in self.router_hosts.get(router_name, ()):
+                    self.routing_table[host_name] = next_hop
+        for router_name, hops in delta.get("multipath", {}).items():
+            if hops:
+                self.multipath[router_name] = hops
+            else:
+                self.multipath.pop(router_name, None)
+            for host_name in self.router_hosts.get(router_name, ()):
+                if hops:
+                    self.multipath_table[host_name] = hops
                 else:
-                    self.paths = json.loads(paths_json_str)
+                    self.multipath_table.pop(host_name, None)
+        for router_name, hop in delta.get("backups", {}).items():
+            if hop:
+                self.backups[router_name] = hop
+            else:
+                self.backups.pop(router_name, None)
+            for host_name in self.router_hosts.get(router_name, ()):
+                if hop:
+                    self.backup_table[host_name] = hop
+                else:
+                    self.backup_table.pop(host_name, None)
+        self.build_packet_routes()
+        self.routes_version = delta["version"]
+        print(f"Applied route changes, now at version {self.routes_version}")
+        self.save_routes()
+        self.link_pool.close_unused(self.active_next_hops())
+        return True
 
-                # Save paths JSON to file
-                filename = f"received_{self.node_name}_paths.json"
-                with open(filename, "w") as f:
-                    f.write(paths_json_str)
-                print(f"Saved paths JSON to {filename}")
+    def active_next_hops(self):
+        hops = set(self.routing_table.values())
+        for alternatives in self.multipath_table.values():
+            hops.update(alternatives)
+        hops.update(backup[0] if isinstance(backup, list) else backup for backup in self.backup_table.values())
+        return hops
 
-                # Debugging output for paths
-                print("Paths received from server:")
-                print(json.dumps(self.paths, indent=2))
+    def build_packet_routes(self):
+        # Tabla por id de host para los paquetes binarios: el siguiente salto, una
+        # tupla de saltos de igual coste o None. Se reconstruye con cada cambio de
+        # rutas para que reenviar un paquete sea una sola consulta.
+        routes = []
+        for host_name in self.host_names:
+            hops = self.multipath_table.get(host_name)
+            routes.append(tuple(hops) if hops else self.routing_table.get(host_name))
+        self.packet_routes = routes
+        self.flow_seed = zlib.crc32(self.node_name.encode())
 
-                # Populate routing table
-                self.populate_routing_table()
+    def next_hop_for(self, dest_host, source=""):
+        # Con varios saltos de igual coste se elige uno por hash del flujo
+        # (origen, destino): una conversacion sigue siempre el mismo camino. El
+        # nombre del router entra en el hash para que cada salto reparta por su cuenta.
+        hops = self.multipath_table.get(dest_host)
+        if hops:
+            key = f"{self.node_name}|{source}|{dest_host}".encode()
+            return hops[zlib.crc32(key) % len(hops)]
+        return self.routing_table.get(dest_host)
 
-            except json.JSONDecodeError as e:
-                print(f"Error decoding JSON: {e}")
+    def snapshot_file(self):
+        return f"received_{self.node_name}.snap"
 
-            # Send confirmation to server
-            self.server_socket.send("File received".encode())
+    def save_routes(self):
+        # Instantanea binaria con una sola fila: destino -> siguiente salto por id
+        ids = {name: node_id for node_id, name in enumerate(self.names)}
+        row = array('i', [NO_ROUTE]) * len(self.names)
+        for router_name, next_hop in self.next_hops.items():
+            if router_name in ids and next_hop in ids:
+                row[ids[router_name]] = ids[next_hop]
+        write_snapshot(self.snapshot_file(), self.names, self.graph, self.routes_version or 0,
+                       [ids[self.node_name]], [row])
+        print(f"Saved routes to {self.snapshot_file()}")
 
-            # Listen for ACK messages from server
-            while True:
-                data = self.server_socket.recv(1024).decode()
-                if data == "ACK":
-                    print("Received ACK message from server. Node is OK.")
-                    response = "OK"
-                    self.server_socket.send(response.encode())
-                else:
-                    print(f"Received unexpected message from server: {data}")
-                    break
-        except ConnectionRefusedError as e:
-            print(f"Connection refused: {e}")
-        except json.JSONDecodeError as e:
-            print(f"JSON decode error: {e}")
+    def load_routes(self):
+        if self.node_name not in self.names:
+            return
+        snapshot = load_snapshot(self.snapshot_file(), self.names, self.graph)
+        if snapshot is None or list(snapshot.sources) != [self.names.index(self.node_name)]:
+            return
+        names = self.names
+        self.next_hops = {names[destination_id]: names[hop]
+                          for destination_id, hop in enumerate(snapshot.next_hop[0]) if hop != NO_ROUTE}
+        self.routes_version = snapshot.version
+        self.populate_routing_table()
+        print(f"Loaded routes version {self.routes_version} from {self.snapshot_file()}")
 
     def populate_routing_table(self):
+        # La tabla se construye aparte y se sustituye de una vez, asi los destinos
+        # retirados por el controlador desaparecen
+        routing_table = {}
+        multipath_table = {}
+        backup_table = {}
         for host_name, router_name in self.node_to_router.items():
-            if router_name in self.paths:
-                path = self.paths[router_name]
-                print(f"Adding path for host {host_name} via router {router_name}: {path}")
-                if len(path) == 1:
-                    # Directly connected or it's the current node
-                    next_hop = router_name
-                else:
-                    # Next hop is the second node in the path
-                    next_hop = path[1]
-                self.routing_table[host_name] = next_hop
-        
-        print("Routing table populated:")
-        print(json.dumps(self.routing_table, indent=2))
+            if router_name in self.next_hops:
+                # El controlador envia directamente el siguiente salto hacia cada router
+                next_hop = self.next_hops[router_name]
+                log.debug("Adding route for host %s via router %s: next hop %s", host_name, router_name, next_hop)
+                routing_table[host_name] = next_hop
+                if router_name in self.multipath:
+                    multipath_table[host_name] = self.multipath[router_name]
+                if router_name in self.backups:
+                    backup_table[host_name] = self.backups[router_name]
+        self.routing_table = routing_table
+        self.multipath_table = multipath_table
+        self.backup_table = backup_table
+        self.build_packet_routes()
+
+        print(f"Routing table populated with {len(routing_table)} hosts.")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Routing table: %s", json.dumps(self.routing_table, indent=2))
+
+    def send_via(self, next_router, dest_host, frame):
+        # Si el enlace con el salto principal ha fallado se usa el alternativo que
+        # envio el controlador, sin esperar a las rutas nuevas. Si el alternativo
+        # es [vecino, P], la trama va encapsulada hasta el router P.
+        if self.link_pool.send(next_router, frame):
+            return True
+        backup = self.backup_table.get(dest_host)
+        if isinstance(backup, list):
+            backup, endpoint = backup
+            frame = encode_tunnel(endpoint, frame)
+        if backup is None or backup == next_router:
+            return False
+        self.metrics.increment("fast_reroutes")
+        return self.link_pool.send(backup, frame)
+
+    def reroute_frames(self, neighbor, frames):
+        # Tramas que no llegaron a un vecino caido: se encaminan de nuevo y, como
+        # su enlace consta como caido, salen por el salto alternativo
+        print(f"Link to router {neighbor} is down; rerouting {len(frames)} frames.")
+        self.metrics.increment("frames_rerouted", len(frames))
+        for frame in frames:
+            self.process_relayed_frame(frame)
+
+    def process_relayed_frame(self, frame):
+        if type(frame) is tuple:
+            frame = b"".join(frame)  # Solo al reencaminar tras un fallo se unen las partes de un paquete
+        msg_type, length = HEADER.unpack_from(frame)
+        payload = memoryview(frame)[HEADER.size:HEADER.size + length]
+        if msg_type == MSG_FORWARD:
+            self.process_forward_message(decode_json(payload))
+        elif msg_type == MSG_FORWARD_BATCH:
+            self.process_batch(payload)
+        elif msg_type == MSG_PACKET:
+            self.process_packet(payload)
+        elif msg_type == MSG_TUNNEL:
+            self.process_tunnel(payload)
+
+    def process_tunnel(self, payload):
+        # En el router final se desencapsula; en los intermedios se reenvia hacia
+        # el final por la ruta normal, que por construccion evita el nodo caido
+        endpoint, frame = decode_tunnel(payload)
+        if endpoint == self.node_name:
+            self.process_relayed_frame(frame)
+            return
+        next_router = self.next_hops.get(endpoint)
+        if next_router is None or not self.link_pool.send(next_router, encode_frame(MSG_TUNNEL, payload)):
+            self.metrics.increment("tunnels_dropped")
 
     def forward_message(self, next_router, message):
         try:
-            next_router_port = self.routers[next_router]
-            print(f"Connecting to next router {next_router} on port {next_router_port}")
-            forward_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            forward_socket.connect(("localhost", int(next_router_port)))
-            forward_socket.send(message.encode())
-            forward_socket.close()
-            print(f"Message forwarded to router {next_router}")
+            # El mensaje se encola en el enlace persistente hacia el vecino
+            if self.send_via(next_router, message["dest_host"], encode_json(MSG_FORWARD, message)):
+                self.metrics.increment("messages_forwarded")
+                log.debug("Message forwarded to router %s", next_router)
+            else:
+                self.metrics.increment("messages_dropped")
         except Exception as e:
-            print(f"Failed to forward message to router {next_router}: {e}")
+            self.metrics.increment("messages_dropped")
+            log.warning("Failed to forward message to router %s: %s", next_router, e)
 
     def process_forward_message(self, message):
-        parts = message.split(':', 2)
-        if len(parts) == 3 and parts[0] == "forward":
-            dest_host = parts[1]
-            msg_content = parts[2]
-            print(f"Processing forward message to {dest_host} with content: {msg_content}")
-            if dest_host in self.hosts:
-                print(f"Host {dest_host} is directly connected.")
-                self.hosts[dest_host].send(f"Message from {self.node_name}: {msg_content}".encode())
+        start = time.perf_counter()
+        dest_host = message.get("dest_host")
+        msg_content = message.get("message")
+        if dest_host is None or msg_content is None:
+            log.warning("Invalid forward message format: %s", message)
+            return
+        log.debug("Processing forward message to %s with content: %s", dest_host, msg_content)
+        if dest_host in self.hosts:
+            self.deliver_to_host(dest_host, f"Message from {self.node_name}: {msg_content}")
+        else:
+            next_router_name = self.next_hop_for(dest_host, message.get("source_host", ""))
+            if next_router_name:
+                log.debug("Forwarding message to next router %s for host %s", next_router_name, dest_host)
+                self.forward_message(next_router_name, message)
             else:
-                next_router_name = self.routing_table.get(dest_host)
-                print(f"Next router for host {dest_host}: {next_router_name}")
-                if next_router_name:
-                    forward_message = f"forward:{dest_host}:{msg_content}"
-                    print(f"Forwarding message to next router {next_router_name} for host {dest_host}")
-                    self.forward_message(next_router_name, forward_message)
-                else:
-                    print(f"Host {dest_host} not found in routing paths.")
+                self.metrics.increment("messages_unroutable")
+                log.info("Host %s not found in routing paths.", dest_host)
+        self.metrics.observe("forward_seconds", time.perf_counter() - start)
+
+    def process_host_message(self, host_name, payload):
+        start = time.perf_counter()
+        try:
+            message = decode_json(payload)
+        except json.JSONDecodeError as e:
+            log.warning("Failed to decode message from %s: %s, error: %s", host_name, bytes(payload), e)
+            return
+        dest_host = message.get("dest_host")
+        msg_content = message.get("message")
+        self.metrics.increment("messages_received")
+        log.debug("Message to %s with content: %s", dest_host, msg_content)
+        if dest_host in self.hosts:
+            self.deliver_to_host(dest_host, f"Message from {host_name}: {msg_content}")
+        else:
+            next_router = self.next_hop_for(dest_host, host_name)
+            if next_router:
+                message["source_host"] = host_name  # Clave del flujo en los siguientes saltos
+                log.debug("Forwarding message to router %s for host %s", next_router, dest_host)
+                self.forward_message(next_router, message)
+            else:
+                self.metrics.increment("messages_unroutable")
+                log.info("Host %s not found in routing paths.", dest_host)
+        self.metrics.observe("forward_seconds", time.perf_counter() - start)
+
+    def process_batch(self, payload):
+        # Un lote se encamina como una unidad: solo se lee su cabecera y se
+        # reenvia o entrega tal cual, sin decodificar cada mensaje
+        start = time.perf_counter()
+        source_host, dest_host, _, _ = batch_header(payload)
+        if dest_host in self.hosts:
+            self.deliver_batch(dest_host, payload)
         else:
-            print(f"Invalid forward message format: {message}")
+            next_router = self.next_hop_for(dest_host, source_host)
+            if next_router and self.send_via(next_router, dest_host, encode_frame(MSG_FORWARD_BATCH, payload)):
+                self.metrics.increment("batches_forwarded")
+            elif next_router:
+                self.metrics.increment("batches_dropped")
+            else:
+                self.metrics.increment("batches_unroutable")
+                log.info("Host %s not found in routing paths.", dest_host)
+        self.metrics.observe("batch_forward_seconds", time.perf_counter() - start)
+
+    def process_packet(self, payload):
+        # Solo se lee la cabecera: el contenido no se decodifica y pasa como
+        # memoryview, sin unirlo a la cabecera nueva, a la trama del siguiente salto
+        start = time.perf_counter()
+        try:
+            dest_id, source_id, ttl, data = decode_packet(payload)
+            route = self.packet_routes[dest_id]
+        except (struct.error, ValueError, IndexError) as e:
+            self.metrics.increment("packets_malformed")
+            log.info("Dropping malformed packet: %s", e)
+            return
+        dest_host = self.host_names[dest_id]
+        if dest_host in self.hosts:
+            self.deliver_packet(dest_host, packet_parts(dest_id, source_id, ttl, data))
+        elif route is None:
+            self.metrics.increment("packets_unroutable")
+            log.info("Host %s not found in routing paths.", dest_host)
+        elif ttl <= 1:
+            self.metrics.increment("packets_expired")
+            log.info("Dropping packet to %s: TTL expired", dest_host)
+        else:
+            if type(route) is tuple:
+                # Hash del flujo sobre los ids de destino y origen de la cabecera
+                route = route[zlib.crc32(payload[:8], self.flow_seed) % len(route)]
+            if self.send_via(route, dest_host, packet_parts(dest_id, source_id, ttl - 1, data)):
+                self.metrics.increment("packets_forwarded")
+            else:
+                self.metrics.increment("packets_dropped")
+        self.metrics.observe("packet_forward_seconds", time.perf_counter() - start)
+
+    def process_distance_vector(self, neighbor, payload):
+        # Solo DistanceVectorRouter calcula rutas a partir de los vecinos
+        log.debug("Ignoring distance vector from router %s", neighbor)
+
+    def deliver_packet(self, dest_host, parts):
+        with self.host_locks[dest_host]:
+            send_parts(self.hosts[dest_host], parts)
+        self.metrics.increment("packets_delivered")
+
+    def deliver_to_host(self, dest_host, text):
+        with self.host_locks[dest_host]:
+            send_frame(self.hosts[dest_host], MSG_DELIVER, text.encode())
+        self.metrics.increment("messages_delivered")
+
+    def deliver_batch(self, dest_host, payload):
+        # Varios hilos entregan al mismo host: un lote grande no debe mezclarse con otra trama
+        with self.host_locks[dest_host]:
+            send_frame(self.hosts[dest_host], MSG_DELIVER_BATCH, payload)
+        self.metrics.increment("batches_delivered")
+
+    def process_host_frame(self, host_name, msg_type, payload):
+        if msg_type == MSG_FORWARD:
+            self.process_forward_message(decode_json(payload))
+        elif msg_type == MSG_DATA:
+            self.process_host_message(host_name, payload)
+        elif msg_type == MSG_DATA_BATCH:
+            self.process_batch(payload)
+        elif msg_type == MSG_PACKET:
+            self.process_packet(payload)
+        else:
+            print(f"Received unexpected message type {msg_type} from {host_name}")
+
+    def process_peer_frame(self, peer_name, msg_type, payload):
+        if msg_type == MSG_FORWARD:
+            self.process_forward_message(decode_json(payload))
+        elif msg_type == MSG_FORWARD_BATCH:
+            self.process_batch(payload)
+        elif msg_type == MSG_PACKET:
+            self.process_packet(payload)
+        elif msg_type == MSG_TUNNEL:
+            self.process_tunnel(payload)
+        elif msg_type == MSG_DISTANCE_VECTOR:
+            self.process_distance_vector(peer_name, payload)
+        else:
+            print(f"Received unexpected message type {msg_type} from router {peer_name}")
 
     def host_handler(self, host_socket, host_address):
         print(f"Host connected from {host_address}")
+        reader = FrameReader(host_socket)
 
         # Receive and register the host name
-        host_name = host_socket.recv(1024).decode()
-    
-        if host_name.startswith("forward:"):
-            print(f"Processing forwarded message: {host_name}")
-            self.process_forward_message(host_name)
-            host_socket.close()
-        else:
+        msg_type, payload = reader.read_frame()
+
+        if msg_type == MSG_PEER:
+            self.peer_handler(host_socket, reader, bytes(payload).decode())
+        elif msg_type == MSG_REGISTER:
+            host_name = bytes(payload).decode()
+            self.host_locks.setdefault(host_name, threading.Lock())
             self.hosts[host_name] = host_socket
             print(f"Host registered with name: {host_name}")
 
             while True:
                 try:
-                    data = host_socket.recv(1024).decode()
-                    if not data:
+                    msg_type, payload = reader.read_frame()
+                    if msg_type is None:
                         print(f"Connection with host {host_name} closed.")
                         del self.hosts[host_name]
                         break
-                    else:
-                        print(f"Received message from {host_name}: {data}")
-                        if data.startswith("forward:"):
-                            self.process_forward_message(data)
-                        else:
-                            try:
-                                message = json.loads(data)
-                                dest_host = message.get("dest_host")
-                                msg_content = message.get("message")
-                                print(f"Message to {dest_host} with content: {msg_content}")
-                                if dest_host in self.hosts:
-                                    print(f"Sending message directly to host {dest_host}.")
-                                    self.hosts[dest_host].send(f"Message from {host_name}: {msg_content}".encode())
-                                else:
-                                    next_router = self.routing_table.get(dest_host)
-                                    print(f"Next router for destination {dest_host}: {next_router}")
-                                    if next_router:
-                                        forward_message = f"forward:{dest_host}:{msg_content}"
-                                        print(f"Forwarding message to router {next_router} for host {dest_host}")
-                                        self.forward_message(next_router, forward_message)
-                                    else:
-                                        print(f"Host {dest_host} not found in routing paths.")
-                            except json.JSONDecodeError as e:
-                                print(f"Failed to decode message from {host_name}: {data}, error: {e}")
-                except ConnectionResetError:
+                    self.process_host_frame(host_name, msg_type, payload)
+                except ConnectionError:
                     print(f"Connection reset by host {host_name}.")
                     del self.hosts[host_name]
                     break
                 except Exception as e:
                     print(f"Error handling data from host {host_name}: {e}")
                     break
+        else:
+            print(f"Unexpected first message type {msg_type} from {host_address}")
+            host_socket.close()
+
+    def peer_handler(self, peer_socket, reader, peer_name):
+        # Enlace persistente de un router vecino: varios mensajes por la misma conexion
+        print(f"Persistent link opened by router {peer_name}")
+        try:
+            while True:
+                msg_type, payload = reader.read_frame()
+                if msg_type is None:
+                    break
+                try:
+                    self.process_peer_frame(peer_name, msg_type, payload)
+                except (ValueError, KeyError, IndexError, struct.error) as e:
+                    # Una trama mal formada se descarta sin cerrar el enlace
+                    self.metrics.increment("peer_frames_dropped")
+                    log.warning("Dropping malformed frame from router %s: %r", peer_name, e)
+        except ConnectionError:
+            pass
+        finally:
+            print(f"Persistent link from router {peer_name} closed.")
+            peer_socket.close()
 
     def start_router_socket(self):
         try:
             router_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            router_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             router_socket.bind(('localhost', self.router_port))
             router_socket.listen(5)
             print(f"Router {self.node_name} listening for hosts on port {self.router_port}...")
@@ -241,6 +566,8 @@ class Router:
     def start(self):
         try:
             print(f"Router port: {self.router_port}")
+            if self.metrics_port is not None:
+                self.metrics.serve(self.metrics_port)
             # Iniciar el servidor del router en un hilo separado
             threading.Thread(target=self.start_router_socket).start()
             self.connect_to_server()
@@ -253,8 +580,11 @@ class Router:
 if __name__ == "__main__":
     node_name = input("Nombre Router: ")
     server_port = 8888
-    router_port = int(input("Puerto Host: "))  # Cambiar el puerto aquí si es necesario
-    router1 = Router("localhost", server_port, router_port)
+    router_port = input("Puerto Host (vacio para usar el de la topologia): ").strip()  # Cambiar el puerto aquí si es necesario
+    router_port = int(router_port) if router_port else None
+    topology = sys.argv[1] if len(sys.argv) > 1 else None
+    setup_logging()
+    router1 = Router("localhost", server_port, router_port, node_name or None, topology)
     router1.start()
 
 
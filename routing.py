@@ -0,0 +1,407 @@
+import multiprocessing
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import networkx as nx
+from snapshot import write_snapshot
+
+NO_ROUTE = -1
+UNREACHABLE = float("inf")
+ALGORITHMS = ("dijkstra", "bellman-ford", "sparse")
+PARALLEL_MIN_SOURCES = 256  # Con menos fuentes no compensa arrancar procesos
+
+
+def single_source_predecessors(graph, source, algorithm_choice):
+    if algorithm_choice == "bellman-ford":
+        pred, dist = nx.bellman_ford_predecessor_and_distance(graph, source)
+    else:
+        pred, dist = nx.dijkstra_predecessor_and_distance(graph, source)
+    return pred, dist
+
+
+def tree_rows(source_id, pred, dist, ids, size):
+    # Filas de predecesores, siguientes saltos y distancias de un arbol de caminos minimos
+    row_dist = array('d', [UNREACHABLE]) * size
+    for node, distance in dist.items():
+        row_dist[ids[node]] = distance
+    row_pred = array('i', [NO_ROUTE]) * size
+    row_next = array('i', [NO_ROUTE]) * size
+    row_pred[source_id] = source_id
+    row_next[source_id] = source_id
+    for node, preds in pred.items():
+        if preds:
+            row_pred[ids[node]] = ids[preds[0]]
+    for node_id in range(size):
+        if row_next[node_id] != NO_ROUTE or row_pred[node_id] == NO_ROUTE:
+            continue
+        # Subir por el arbol hasta un nodo con salto conocido
+        chain = []
+        current = node_id
+        while row_next[current] == NO_ROUTE:
+            chain.append(current)
+            parent = row_pred[current]
+            if parent == source_id:
+                row_next[current] = current
+                chain.pop()
+                break
+            current = parent
+        hop = row_next[current]
+        for chained in chain:
+            row_next[chained] = hop
+    return row_pred, row_next, row_dist
+
+
+# Estado de cada proceso del pool: copia de solo lectura del grafo, recibida una vez al arrancar
+_worker = {}
+
+
+def _init_worker(graph, names, algorithm_choice):
+    _worker["graph"] = graph
+    _worker["names"] = names
+    _worker["ids"] = {name: node_id for node_id, name in enumerate(names)}
+    _worker["algorithm_choice"] = algorithm_choice
+
+
+def _compute_shard(source_ids):
+    # Devuelve las filas como bytes de int32, no diccionarios de caminos
+    graph, names, ids = _worker["graph"], _worker["names"], _worker["ids"]
+    rows = []
+    for source_id in source_ids:
+        pred, dist = single_source_predecessors(graph, names[source_id], _worker["algorithm_choice"])
+        row_pred, row_next, row_dist = tree_rows(source_id, pred, dist, ids, len(names))
+        rows.append((source_id, row_pred.tobytes(), row_next.tobytes(), row_dist.tobytes()))
+    return rows
+
+
+class RouteTable:
+    # Tabla de rutas compacta: para cada nodo origen se guarda un arreglo de
+    # predecesores y otro de siguientes saltos indexados por id entero de nodo.
+    # Un camino completo se reconstruye bajo demanda con path().
+    def __init__(self, names):
+        self.names = list(names)
+        self.ids = {name: node_id for node_id, name in enumerate(self.names)}
+        size = len(self.names)
+        self.pred = [array('i', [NO_ROUTE]) * size for _ in range(size)]
+        self.next_hop = [array('i', [NO_ROUTE]) * size for _ in range(size)]
+        self.dist = [array('d', [UNREACHABLE]) * size for _ in range(size)]  # Para los caminos multiples
+        self.version = 0  # Se incrementa con cada recalculo
+        self.workers = 1  # Procesos para calcular los arboles; 0 o None usa todos los nucleos
+        self.row_versions = [0] * size  # Fuente -> numero de la ultima escritura de sus filas
+        self.row_writes = 0
+
+    @classmethod
+    def from_network(cls, network, algorithm_choice, workers=1):
+        table = cls(network.graph.nodes)
+        table.workers = workers or os.cpu_count()
+        table.compute(network.graph, algorithm_choice)
+        return table
+
+    @classmethod
+    def from_snapshot(cls, snapshot, workers=1):
+        # Las filas son vistas sobre el archivo mapeado: no se copian ni se recalculan
+        if not snapshot.pred or list(snapshot.sources) != list(range(len(snapshot.names))):
+            return None
+        table = cls.__new__(cls)
+        table.names = list(snapshot.names)
+        table.ids = {name: node_id for node_id, name in enumerate(table.names)}
+        table.pred = list(snapshot.pred)
+        table.next_hop = list(snapshot.next_hop)
+        table.dist = list(snapshot.dist) if snapshot.dist else [array('d', [UNREACHABLE]) * len(table.names)
+                                                                for _ in table.names]
+        table.version = snapshot.version
+        table.workers = workers or os.cpu_count()
+        table.row_versions = [0] * len(table.names)
+        table.row_writes = 0
+        return table
+
+    def save_snapshot(self, path, graph, edges=None, publish=None):
+        return write_snapshot(path, self.names, graph, self.version, range(len(self.names)), self.next_hop,
+                              self.pred, self.dist, edges, publish)
+
+    def compute(self, graph, algorithm_choice, sources=None):
+        if sources is None:
+            sources = range(len(self.names))
+        self.version += 1
+        if algorithm_choice == "sparse":
+            self.compute_sparse(graph, sources)
+            return
+        present = []
+        for source_id in sources:
+            if self.names[source_id] in graph:
+                present.append(source_id)
+            else:
+                self.clear_source(source_id)
+        if self.workers > 1 and len(present) >= PARALLEL_MIN_SOURCES:
+            self.compute_parallel(graph, algorithm_choice, present)
+            return
+        for source_id in present:
+            pred, dist = single_source_predecessors(graph, self.names[source_id], algorithm_choice)
+            self.set_tree(source_id, pred, dist)
+
+    def compute_parallel(self, graph, algorithm_choice, sources):
+        # Las fuentes se reparten en bloques entre un pool de procesos. Cada proceso
+        # recibe el grafo una sola vez y devuelve sus filas ya compactas. Se usa
+        # "spawn" porque el controlador tiene hilos y fork podria heredar un bloqueo.
+        shard_count = self.workers * 4  # Bloques pequenos para repartir bien la carga
+        shards = [sources[index::shard_count] for index in range(shard_count)]
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker,
+                                 initargs=(graph, self.names, algorithm_choice)) as executor:
+            for rows in executor.map(_compute_shard, [shard for shard in shards if shard]):
+                for source_id, row_pred, row_next, row_dist in rows:
+                    self.pred[source_id] = array('i', row_pred)
+                    self.next_hop[source_id] = array('i', row_next)
+                    self.dist[source_id] = array('d', row_dist)
+                    self.touch(source_id)
+
+    def compute_sparse(self, graph, sources, chunk_size=256):
+        # Motor vectorizado: el grafo se convierte en una matriz CSR sobre los ids
+        # de la tabla y scipy calcula los arboles de varias fuentes a la vez. Se
+        # procesan por bloques para no guardar la matriz completa de distancias.
+        # scipy solo se importa si se elige este motor.
+        import numpy as np
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import dijkstra
+
+        size = len(self.names)
+        ids = self.ids
+        present = []
+        for source_id in sources:
+            if self.names[source_id] in graph:
+                present.append(source_id)
+            else:
+                self.clear_source(source_id)
+        if not present:
+            return
+        edges = [(ids[u], ids[v], weight) for u, v, weight in graph.edges(data="weight", default=1)]
+        rows, cols, weights = zip(*edges) if edges else ((), (), ())
+        matrix = csr_matrix((weights, (rows, cols)), shape=(size, size))
+        nodes = np.arange(size)
+        for start in range(0, len(present), chunk_size):
+            chunk = np.array(present[start:start + chunk_size])
+            dist, pred = dijkstra(matrix, directed=False, indices=chunk, return_predecessors=True)
+            unreachable = pred < 0  # scipy marca con -9999 la fuente y los nodos sin camino
+            # Siguiente salto por saltos de puntero: cada nodo apunta a su predecesor
+            # y los hijos directos de la fuente a si mismos; se repite hop = hop[hop]
+            # hasta que todos apuntan al hijo de la fuente por el que se llega a ellos
+            hop = np.where(unreachable | (pred == chunk[:, None]), nodes, pred)
+            chunk_rows = np.arange(len(chunk))[:, None]
+            while True:
+                jumped = hop[chunk_rows, hop]
+                if np.array_equal(jumped, hop):
+                    break
+                hop = jumped
+            pred[unreachable] = NO_ROUTE
+            hop[unreachable] = NO_ROUTE
+            pred[chunk_rows[:, 0], chunk] = chunk
+            hop[chunk_rows[:, 0], chunk] = chunk
+            for row, source_id in enumerate(chunk):
+                self.pred[source_id] = array('i', pred[row].astype(np.intc).tobytes())
+                self.next_hop[source_id] = array('i', hop[row].astype(np.intc).tobytes())
+                self.dist[source_id] = array('d', dist[row].astype(np.float64).tobytes())
+                self.touch(source_id)
+
+    def set_tree(self, source_id, pred, dist):
+        self.pred[source_id], self.next_hop[source_id], self.dist[source_id] = \
+            tree_rows(source_id, pred, dist, self.ids, len(self.names))
+        self.touch(source_id)
+
+    def clear_source(self, source_id):
+        size = len(self.names)
+        self.pred[source_id] = array('i', [NO_ROUTE]) * size
+        self.next_hop[source_id] = array('i', [NO_ROUTE]) * size
+        self.dist[source_id] = array('d', [UNREACHABLE]) * size
+        self.touch(source_id)
+
+    def touch(self, source_id):
+        # Cada escritura de las filas de una fuente recibe un numero nuevo: quien
+        # guarda resultados derivados de ellas sabe si siguen valiendo.
+        # remove_node() solo vacia una columna y no cuenta como escritura.
+        self.row_writes += 1
+        self.row_versions[source_id] = self.row_writes
+
+    def affected_sources(self, removed_node=None, removed_links=(), removed_nodes=()):
+        # Fuentes cuyo arbol usaba los nodos o los enlaces eliminados. El resto de
+        # arboles sigue siendo minimo: eliminar elementos nunca acorta una distancia.
+        removed = list(removed_nodes) + ([removed_node] if removed_node is not None else [])
+        removed_ids = {self.ids[name] for name in removed if name in self.ids}
+        links = [(self.ids[u], self.ids[v]) for u, v in removed_links if u in self.ids and v in self.ids]
+        affected = []
+        for source_id, row_pred in enumerate(self.pred):
+            if row_pred[source_id] == NO_ROUTE or source_id in removed_ids:
+                continue
+            if removed_ids and not removed_ids.isdisjoint(row_pred):
+                affected.append(source_id)
+            elif any(row_pred[v] == u or row_pred[u] == v for u, v in links):
+                affected.append(source_id)
+        return affected
+
+    def remove_node(self, name):
+        node_id = self.ids.get(name)
+        if node_id is None:
+            return
+        self.clear_source(node_id)
+        for row_pred, row_next, row_dist in zip(self.pred, self.next_hop, self.dist):
+            row_pred[node_id] = NO_ROUTE
+            row_next[node_id] = NO_ROUTE
+            row_dist[node_id] = UNREACHABLE
+
+    def repair(self, graph, algorithm_choice, removed_node=None, removed_links=(), removed_nodes=()):
+        # Varias bajas a la vez (removed_nodes) se reparan con un solo calculo
+        affected = self.affected_sources(removed_node, removed_links, removed_nodes)
+        for name in list(removed_nodes) + ([removed_node] if removed_node is not None else []):
+            self.remove_node(name)
+        self.compute(graph, algorithm_choice, affected)
+        return affected
+
+    def path(self, source, destination):
+        source_id = self.ids[source]
+        row_pred = self.pred[source_id]
+        current = self.ids[destination]
+        if row_pred[current] == NO_ROUTE:
+            return None
+        path = [current]
+        while current != source_id:
+            current = row_pred[current]
+            path.append(current)
+        return [self.names[node_id] for node_id in reversed(path)]
+
+    def routes_for(self, source):
+        # Tabla que se envia a cada router: destino -> siguiente salto
+        names = self.names
+        return {
+            names[destination_id]: names[hop]
+            for destination_id, hop in enumerate(self.next_hop[self.ids[source]])
+            if hop != NO_ROUTE
+        }
+
+    def multipath_for(self, graph, source, tolerance=0.0):
+        # Siguientes saltos de coste igual (o hasta un factor 1 + tolerance del
+        # minimo) hacia cada destino. Solo se aceptan vecinos mas cercanos al
+        # destino que el propio origen, asi la distancia baja en cada salto y no
+        # hay bucles. Se devuelven solo los destinos con mas de un salto posible,
+        # con el salto principal en primer lugar.
+        ids, names = self.ids, self.names
+        source_id = ids[source]
+        row_dist = self.dist[source_id]
+        row_next = self.next_hop[source_id]
+        neighbors = [(ids[neighbor], data.get("weight", 1)) for neighbor, data in graph[source].items()]
+        multipath = {}
+        for destination_id, distance in enumerate(row_dist):
+            if destination_id == source_id or distance == UNREACHABLE:
+                continue
+            limit = distance * (1 + tolerance) + 1e-12 * distance  # Margen para el redondeo
+            primary = row_next[destination_id]
+            hops = [primary]
+            for neighbor_id, weight in neighbors:
+                if neighbor_id == primary:
+                    continue
+                remaining = self.dist[neighbor_id][destination_id]
+                if remaining < distance and weight + remaining <= limit:
+                    hops.append(neighbor_id)
+            if len(hops) > 1:
+                multipath[names[destination_id]] = [names[hop] for hop in hops]
+        return multipath
+
+    def backups_for(self, graph, source):
+        # Salto alternativo hacia cada destino, para que el router lo use en cuanto
+        # falle el salto principal E sin esperar a las rutas nuevas:
+        #  - Un vecino N sin bucles (LFA, RFC 5286): dist(N, D) < dist(N, S) + dist(S, D),
+        #    es decir, su camino hacia D no vuelve por el origen S. Se devuelve su nombre.
+        #  - Si ningun vecino evita el nodo E, un tunel (LFA remoto, RFC 7490): se
+        #    envia al vecino N encapsulado hasta un nodo P tal que los caminos N -> P
+        #    y P -> D evitan E. Se devuelve [N, P].
+        # Si solo hay un LFA que protege el enlace pero no el nodo E, se usa ese.
+        ids, names = self.ids, self.names
+        source_id = ids[source]
+        row_dist = self.dist[source_id]
+        row_next = self.next_hop[source_id]
+        neighbors = [(ids[neighbor], data.get("weight", 1)) for neighbor, data in graph[source].items()]
+        repair_nodes = {}  # Salto principal -> [(coste, vecino, P)] alcanzables sin pasar por el
+        backups = {}
+        for destination_id, distance in enumerate(row_dist):
+            if destination_id == source_id or distance == UNREACHABLE:
+                continue
+            primary = row_next[destination_id]
+            primary_dist = self.dist[primary]
+            margin = 1e-12 * distance  # Los empates por redondeo no cuentan como libres de bucles
+            best = None
+            for neighbor_id, weight in neighbors:
+                if neighbor_id == primary:
+                    continue
+                neighbor_dist = self.dist[neighbor_id]
+                remaining = neighbor_dist[destination_id]
+                if not remaining + margin < neighbor_dist[source_id] + distance:
+                    continue
+                protects_node = primary == destination_id or \
+                    remaining + margin < neighbor_dist[primary] + primary_dist[destination_id]
+                key = (not protects_node, weight + remaining)
+                if best is None or key < best[0]:
+                    best = (key, neighbor_id)
+            if best is not None and not best[0][0]:
+                backups[names[destination_id]] = names[best[1]]
+                continue
+            tunnel = None
+            if primary != destination_id:
+                if primary not in repair_nodes:
+                    repair_nodes[primary] = self.repair_nodes(source_id, primary, neighbors)
+                for cost, neighbor_id, node_id in repair_nodes[primary]:
+                    remaining = self.dist[node_id][destination_id]
+                    if remaining + margin < self.dist[node_id][primary] + primary_dist[destination_id] and \
+                            (tunnel is None or cost + remaining < tunnel[0]):
+                        tunnel = (cost + remaining, neighbor_id, node_id)
+            if tunnel is not None:
+                backups[names[destination_id]] = [names[tunnel[1]], names[tunnel[2]]]
+            elif best is not None:
+                backups[names[destination_id]] = names[best[1]]
+        return backups
+
+    def repair_nodes(self, source_id, primary, neighbors):
+        # Nodos P a los que algun vecino distinto de primary llega sin pasar por
+        # el: dist(N, P) < dist(N, E) + dist(E, P). Para cada P, el vecino mas barato.
+        primary_dist = self.dist[primary]
+        candidates = []
+        for node_id in range(len(self.names)):
+            if node_id == source_id or node_id == primary:
+                continue
+            best = None
+            for neighbor_id, weight in neighbors:
+                if neighbor_id == primary:
+                    continue
+                neighbor_dist = self.dist[neighbor_id]
+                reach = neighbor_dist[node_id]
+                if reach == UNREACHABLE or not reach + 1e-12 * reach < neighbor_dist[primary] + primary_dist[node_id]:
+                    continue
+                if best is None or weight + reach < best[0]:
+                    best = (weight + reach, neighbor_id)
+            if best is not None:
+                candidates.append((best[0], best[1], node_id))
+        return candidates
+
+    def row_snapshot(self, source):
+        return array('i', self.next_hop[self.ids[source]])
+
+    def diff_row(self, source, old_row):
+        # Compara la fila actual de siguientes saltos con una copia anterior
+        added, changed, withdrawn = {}, {}, []
+        new_row = self.next_hop[self.ids[source]]
+        if old_row == new_row:
+            return added, changed, withdrawn
+        names = self.names
+        for destination_id, (old_hop, new_hop) in enumerate(zip(old_row, new_row)):
+            if old_hop == new_hop:
+                continue
+            if new_hop == NO_ROUTE:
+                withdrawn.append(names[destination_id])
+            elif old_hop == NO_ROUTE:
+                added[names[destination_id]] = names[new_hop]
+            else:
+                changed[names[destination_id]] = names[new_hop]
+        return added, changed, withdrawn
+
+    def has_source(self, name):
+        node_id = self.ids.get(name)
+        return node_id is not None and self.pred[node_id][node_id] != NO_ROUTE
+
+    def sources(self):
+        return [name for node_id, name in enumerate(self.names) if self.pred[node_id][node_id] != NO_ROUTE]
@@ -0,0 +1,636 @@
+import argparse
+import contextlib
+import heapq
+import itertools
+import json
+import os
+import random
+import struct
+import time
+from functools import partial
+from controller import TCPServer
+from router import Router
+from host import Host, delivered_messages
+from link import link_key
+from metrics import Histogram, setup_logging
+from topology import load_topology, host_routers, host_ids, host_name_for, GENERATORS
+from protocol import iter_frames, send_frame, send_json, encode_frame, decode_json
+from protocol import MSG_ASSIGN, MSG_NO, MSG_ROUTES, MSG_CONFIRM, MSG_HELLO, MSG_HEARTBEAT
+from protocol import MSG_DELIVER, MSG_DELIVER_BATCH
+
+# Contenido de los paquetes de prueba: flujo, numero de secuencia e instante de envio
+PROBE = struct.Struct('!IId')
+
+
+class SimSocket:
+    # Extremo de una conexion en memoria con la parte de la interfaz de socket
+    # que usan send_frame y send_json. Lo escrito llega al otro extremo tras la
+    # latencia de la conexion, en el mismo orden en que se escribio.
+    def __init__(self, simulation, latency):
+        self.simulation = simulation
+        self.latency = latency
+        self.peer = None
+        self.on_receive = None  # Se llama con los bytes recibidos
+        self.on_close = None  # Se llama cuando el otro extremo cierra
+        self.closed = False
+
+    def sendall(self, data):
+        if self.closed:
+            raise OSError("Simulated connection is closed")
+        self.simulation.schedule(self.latency, self.peer.receive, bytes(data))
+
+    def receive(self, data):
+        if not self.closed and self.on_receive:
+            self.on_receive(data)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.simulation.schedule(self.latency, self.peer.peer_closed)
+
+    def peer_closed(self):
+        if not self.closed:
+            self.closed = True
+            if self.on_close:
+                self.on_close()
+
+
+class SimLink:
+    # Enlace simulado: latencia fija y ancho de banda en bits/s. Cada sentido
+    # transmite una trama detras de otra, asi que el trafico hace cola.
+    __slots__ = ("latency", "bandwidth", "up", "busy_until")
+
+    def __init__(self, latency, bandwidth):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.up = True
+        self.busy_until = {}  # Router emisor -> instante en que termina su ultima trama
+
+    def transmit(self, source, size, now):
+        # Devuelve el instante en que la trama llega al otro extremo
+        start = max(now, self.busy_until.get(source, 0.0))
+        done = start + size * 8 / self.bandwidth
+        self.busy_until[source] = done
+        return done + self.latency
+
+
+class SimLinkPool:
+    # Misma interfaz que link_pool.LinkPool sobre los enlaces simulados. Un
+    # enlace caido o un vecino caido se comportan como una conexion que falla:
+    # send() devuelve False y el router usa el salto alternativo.
+    def __init__(self, simulation, local_name):
+        self.simulation = simulation
+        self.local_name = local_name
+        self.counters = {}  # Vecino -> [bytes, mensajes] desde el ultimo informe
+
+    def send(self, neighbor_name, frame):
+        if type(frame) is tuple:
+            frame = b"".join(frame)  # Por el enlace simulado viaja la trama entera
+        simulation = self.simulation
+        link = simulation.links.get(link_key(self.local_name, neighbor_name))
+        neighbor = simulation.routers.get(neighbor_name)
+        if link is None or not link.up or neighbor is None or not neighbor.up:
+            return False
+        arrival = link.transmit(self.local_name, len(frame), simulation.now)
+        simulation.at(arrival, simulation.deliver, link, self.local_name, neighbor_name, frame)
+        counters = self.counters.setdefault(neighbor_name, [0, 0])
+        counters[0] += len(frame)
+        counters[1] += 1
+        return True
+
+    def take_counters(self):
+        counters, self.counters = self.counters, {}
+        return counters
+
+    def close_unused(self, active_names):
+        pass
+
+    def close(self):
+        pass
+
+
+class SimulatedRouter(Router):
+    # Router con la logica de Router sobre los transportes de la simulacion.
+    # Como en AsyncRouter solo cambian los enlaces, las entregas y la sesion
+    # con el controlador; los latidos y la telemetria son eventos del reloj virtual.
+    def __init__(self, simulation, node_name, heartbeat_interval=1.0, telemetry_interval=None):
+        self.simulation = simulation
+        super().__init__(None, None, None, node_name, simulation.network, heartbeat_interval, telemetry_interval)
+        self.link_pool = SimLinkPool(simulation, node_name)
+        self.up = True
+        self.confirmed = False  # Tabla inicial recibida y confirmada
+
+    def read_topology(self, topology):
+        # Todos los routers leen la misma red: el primero calcula los nombres y
+        # puertos, y los demas comparten sus tablas en lugar de recalcularlas
+        template = self.simulation.router_template
+        if template is None:
+            super().read_topology(topology)
+            self.simulation.router_template = self
+            return
+        for field in ("graph", "names", "routers", "node_to_router", "host_names", "router_hosts"):
+            setattr(self, field, getattr(template, field))
+
+    def load_routes(self):
+        # Sin instantaneas en disco: cada router simulado arranca sin rutas
+        pass
+
+    def save_routes(self):
+        pass
+
+    def update_routes(self, payload):
+        super().update_routes(payload)
+        self.simulation.route_changed()
+
+    def apply_route_delta(self, payload):
+        applied = super().apply_route_delta(payload)
+        self.simulation.route_changed()
+        return applied
+
+    def deliver_to_host(self, dest_host, text):
+        self.hosts[dest_host].sendall(encode_frame(MSG_DELIVER, text.encode()))
+        self.metrics.increment("messages_delivered")
+
+    def deliver_batch(self, dest_host, payload):
+        self.hosts[dest_host].sendall(encode_frame(MSG_DELIVER_BATCH, payload))
+        self.metrics.increment("batches_delivered")
+
+    def deliver_packet(self, dest_host, parts):
+        self.hosts[dest_host].sendall(b"".join(parts))
+        self.metrics.increment("packets_delivered")
+
+    def connect_to_server(self):
+        self.server_socket = self.simulation.controller.accept(self.simulation.control_latency)
+        self.server_socket.on_receive = self.receive_from_server
+        send_frame(self.server_socket, MSG_HELLO, self.requested_name.encode())
+
+    def receive_from_server(self, data):
+        # Mismos pasos que Router.connect_to_server, una trama cada vez
+        for msg_type, payload in iter_frames(data):
+            if msg_type == MSG_NO:
+                print(f"Server rejected the registration: {bytes(payload).decode()}")
+                self.server_socket.close()
+                return
+            if msg_type == MSG_ASSIGN:
+                self.node_name = decode_json(payload)["name"]
+                self.link_pool.local_name = self.node_name
+            elif not self.confirmed:
+                if msg_type == MSG_ROUTES:
+                    self.update_routes(payload)
+                self.send_to_server(MSG_CONFIRM)
+                self.confirmed = True
+                if self.heartbeat_interval:
+                    self.simulation.schedule(self.heartbeat_interval, self.heartbeat)
+                if self.telemetry_interval:
+                    self.simulation.schedule(self.telemetry_interval, self.report_telemetry)
+            elif not self.process_server_message(msg_type, payload):
+                self.server_socket.close()
+                return
+
+    def heartbeat(self):
+        if self.up and not self.server_socket.closed:
+            self.send_to_server(MSG_HEARTBEAT)
+            self.simulation.schedule(self.heartbeat_interval, self.heartbeat)
+
+    def report_telemetry(self):
+        if self.up and not self.server_socket.closed:
+            self.server_socket.sendall(self.telemetry_report())
+            self.simulation.schedule(self.telemetry_interval, self.report_telemetry)
+
+    def receive_from_host(self, host_name, data):
+        if self.up:
+            for msg_type, payload in iter_frames(data):
+                self.process_host_frame(host_name, msg_type, payload)
+
+    def receive_from_peer(self, peer_name, frame):
+        for msg_type, payload in iter_frames(frame):
+            self.process_peer_frame(peer_name, msg_type, payload)
+
+
+class SimulatedHost(Host):
+    # Host cuyo socket es un extremo en memoria; lo recibido se anota en la simulacion
+    def __init__(self, simulation, host_name):
+        super().__init__(host_name, None, topology=simulation.network)
+        self.simulation = simulation
+        self.host_ids = simulation.host_ids  # Compartidos: no se recalculan por host
+        self.host_names = simulation.host_names
+
+    def receive_frames(self, data):
+        for msg_type, payload in iter_frames(data):
+            for source, message in delivered_messages(msg_type, payload, self.host_names):
+                self.simulation.delivered(self.host_name, source, message)
+
+
+class ControlSession:
+    # Extremo del controlador de la conexion con un router simulado: los mismos
+    # pasos que TCPServer.register_client y handle_client, una trama cada vez
+    def __init__(self, controller, client_socket):
+        self.controller = controller
+        self.client_socket = client_socket
+        self.node_name = None
+        self.confirmed = False
+
+    def receive(self, data):
+        controller = self.controller
+        for msg_type, payload in iter_frames(data):
+            if self.node_name is None:
+                if msg_type != MSG_HELLO:
+                    print(f"Closing connection that did not start with HELLO (message type {msg_type}).")
+                    self.client_socket.close()
+                    return
+                node_name, port = controller.assign_node(bytes(payload).decode(), self.client_socket)
+                if node_name is None:
+                    print(f"Rejected router registration: {port}")
+                    send_frame(self.client_socket, MSG_NO, port.encode())
+                    self.client_socket.close()
+                    return
+                self.node_name = node_name
+                send_json(self.client_socket, MSG_ASSIGN, {"name": node_name, "port": port})
+                send_json(self.client_socket, MSG_ROUTES, controller.full_routes(node_name))
+            elif not self.confirmed:
+                if msg_type != MSG_CONFIRM:
+                    print(f"Router {self.node_name} did not confirm its routes (message type {msg_type}). "
+                          "Dropping session.")
+                    self.drop()
+                    return
+                self.confirmed = True
+                controller.detector.heartbeat(self.node_name)
+            else:
+                controller.process_client_message(self.client_socket, self.node_name, msg_type, payload)
+
+    def closed(self):
+        if not self.confirmed:
+            self.drop()
+        elif self.controller.client_sockets.get(self.node_name) is self.client_socket:
+            print(f"Connection with {self.node_name} closed unexpectedly.")
+            self.controller.handle_node_failure(self.node_name)
+
+    def drop(self):
+        # Sesion sin registro completo: se libera el nodo sin tratarlo como un fallo
+        if self.node_name is not None and self.controller.client_sockets.get(self.node_name) is self.client_socket:
+            del self.controller.client_sockets[self.node_name]
+        self.client_socket.close()
+
+
+class SimulatedController(TCPServer):
+    # TCPServer sin sockets ni hilos: recibe las sesiones de los routers
+    # simulados y comprueba los latidos con el reloj virtual. No dibuja la red
+    # ni guarda instantaneas. Tiene su propia copia de la red, como el
+    # controlador real, porque al eliminar nodos la modifica.
+    def __init__(self, simulation, algorithm_choice, heartbeat_interval=1.0, phi_threshold=8.0,
+                 multipath_tolerance=0.0, reweight_interval=None, fast_reroute=True):
+        self.simulation = simulation
+        super().__init__("localhost", None, algorithm_choice, headless=True, topology=simulation.network.copy(),
+                         heartbeat_interval=heartbeat_interval, phi_threshold=phi_threshold,
+                         multipath_tolerance=multipath_tolerance, reweight_interval=reweight_interval,
+                         fast_reroute=fast_reroute)
+        self.detector.clock = simulation.clock
+
+    def create_network(self):
+        self.render_file = None
+        self.snapshot_file = None
+        super().create_network()
+        self.reweighter.last_reweight = self.simulation.now
+
+    def start(self):
+        if self.heartbeat_interval:
+            self.simulation.schedule(self.heartbeat_interval, self.check_heartbeats)
+        if self.reweight_interval:
+            self.simulation.schedule(self.reweight_interval, self.reweight)
+
+    def accept(self, latency):
+        # Abre una conexion con el controlador y devuelve el extremo del router
+        router_end, controller_end = self.simulation.connection(latency)
+        session = ControlSession(self, controller_end)
+        controller_end.on_receive = session.receive
+        controller_end.on_close = session.closed
+        return router_end
+
+    def check_heartbeats(self):
+        # Como heartbeat_loop; los routers simulados siempre envian latidos, asi que no se sondean
+        now = self.simulation.now
+        for client_name in self.detector.suspects(now):
+            print(f"Node {client_name} suspected, phi {self.detector.phi(client_name, now):.1f}")
+            self.handle_node_failure(client_name)
+        self.simulation.schedule(self.heartbeat_interval, self.check_heartbeats)
+
+    def reweight(self):
+        self.reweight_links(self.simulation.now)
+        self.simulation.schedule(self.reweight_interval, self.reweight)
+
+
+class Flow:
+    __slots__ = ("flow_id", "source", "destination", "interval", "stop", "size", "sent", "delivered")
+
+    def __init__(self, flow_id, source, destination, interval, stop, size):
+        self.flow_id = flow_id
+        self.source = source
+        self.destination = destination
+        self.interval = interval
+        self.stop = stop
+        self.size = size
+        self.sent = 0
+        self.delivered = 0
+
+
+class Simulation:
+    # Controlador, routers y hosts en un solo proceso, sobre conexiones en
+    # memoria y un reloj virtual: cada envio es un evento en una cola ordenada
+    # por tiempo, asi que simular segundos de red no cuesta segundos reales.
+    # Cada enlace tiene la latencia indicada (link_latency por par de nombres,
+    # latency por defecto) y un ancho de banda de bandwidth_unit / peso bits/s,
+    # la misma capacidad que usa telemetry.LinkReweighter.
+    def __init__(self, network, algorithm_choice="sparse", latency=0.001, link_latency=None, bandwidth_unit=1e6,
+                 host_latency=0.0001, control_latency=0.001, heartbeat_interval=1.0, phi_threshold=8.0,
+                 telemetry_interval=None, reweight_interval=None, multipath_tolerance=0.0, fast_reroute=True,
+                 link_report_delay=None):
+        self.network = network
+        self.now = 0.0
+        self.events = []
+        self.sequence = itertools.count()  # Desempata eventos del mismo instante en orden de llegada
+        self.processed = 0
+        self.wall_seconds = 0.0
+        self.host_latency = host_latency
+        self.control_latency = control_latency
+        self.link_report_delay = link_report_delay  # None: el controlador no se entera de los enlaces caidos
+        link_latency = {link_key(u, v): seconds for (u, v), seconds in (link_latency or {}).items()}
+        self.links = {}
+        for link in network.links.values():
+            key = link_key(link.source.name, link.destination.name)
+            self.links[key] = SimLink(link_latency.get(key, latency), bandwidth_unit / link.bandwidth)
+        self.host_ids = host_ids(network)
+        self.host_names = list(self.host_ids)
+        self.host_routers = host_routers(network)
+        self.hosts = {}
+        self.flows = []
+        self.latency = Histogram()
+        self.frames_lost = 0  # Tramas en vuelo por un enlace o hacia un router que cayo
+        self.route_updates = 0
+        self.last_route_change = None
+        self.scripted = []  # (instante, suceso) de los fallos y recuperaciones programados
+        self.retired = []  # Routers sustituidos al recuperarse, para sumar sus contadores
+        self.router_template = None  # Router cuyas tablas de topologia comparten los demas
+        self.controller = SimulatedController(self, algorithm_choice, heartbeat_interval, phi_threshold,
+                                              multipath_tolerance, reweight_interval, fast_reroute)
+        self.router_options = {"heartbeat_interval": heartbeat_interval, "telemetry_interval": telemetry_interval}
+        self.routers = {}
+        for node in network.nodes.values():
+            self.routers[node.name] = SimulatedRouter(self, node.name, **self.router_options)
+        for router in self.routers.values():
+            router.connect_to_server()
+        self.controller.start()
+
+    def clock(self):
+        return self.now
+
+    def at(self, when, callback, *args):
+        heapq.heappush(self.events, (when, next(self.sequence), callback, args))
+
+    def schedule(self, delay, callback, *args):
+        heapq.heappush(self.events, (self.now + delay, next(self.sequence), callback, args))
+
+    def run(self, until):
+        # Procesa los eventos hasta el instante until (en segundos virtuales)
+        start = time.perf_counter()
+        events = self.events
+        while events and events[0][0] <= until:
+            self.now, _, callback, args = heapq.heappop(events)
+            callback(*args)
+            self.processed += 1
+        self.now = max(self.now, until)
+        self.wall_seconds += time.perf_counter() - start
+
+    def connection(self, latency):
+        first, second = SimSocket(self, latency), SimSocket(self, latency)
+        first.peer, second.peer = second, first
+        return first, second
+
+    def deliver(self, link, source, destination, frame):
+        router = self.routers.get(destination)
+        if not link.up or router is None or not router.up:
+            self.frames_lost += 1
+            return
+        router.receive_from_peer(source, frame)
+
+    def route_changed(self):
+        self.route_updates += 1
+        self.last_route_change = self.now
+
+    def host(self, host_name):
+        # Los hosts se crean y conectan a su router la primera vez que se usan
+        host = self.hosts.get(host_name)
+        if host is None:
+            host = self.hosts[host_name] = SimulatedHost(self, host_name)
+            self.attach_host(host)
+        return host
+
+    def attach_host(self, host):
+        router = self.routers[self.host_routers[host.host_name]]
+        host_end, router_end = self.connection(self.host_latency)
+        host.client_socket = host_end
+        host_end.on_receive = host.receive_frames
+        router_end.on_receive = partial(router.receive_from_host, host.host_name)
+        router.hosts[host.host_name] = router_end
+
+    def add_flow(self, source_host, destination_host, rate, start=0.0, stop=None, size=64):
+        # Paquetes binarios de size bytes a rate paquetes por segundo entre start y stop
+        self.host(source_host)
+        self.host(destination_host)
+        flow = Flow(len(self.flows), source_host, destination_host, 1.0 / rate, stop, max(size, PROBE.size))
+        self.flows.append(flow)
+        self.at(start, self.send_flow_packet, flow)
+        return flow
+
+    def send_flow_packet(self, flow):
+        if flow.stop is not None and self.now >= flow.stop:
+            return
+        data = PROBE.pack(flow.flow_id, flow.sent, self.now).ljust(flow.size, b"\0")
+        self.hosts[flow.source].send_packet(flow.destination, data)
+        flow.sent += 1
+        self.schedule(flow.interval, self.send_flow_packet, flow)
+
+    def delivered(self, host_name, source, message):
+        if not isinstance(message, bytes) or len(message) < PROBE.size:
+            return
+        flow_id, _, sent_at = PROBE.unpack_from(message)
+        if flow_id < len(self.flows):
+            self.flows[flow_id].delivered += 1
+            self.latency.observe(self.now - sent_at)
+
+    def fail_router(self, name, at, close_connection=False):
+        # Sin close_connection el router deja de responder y el controlador lo
+        # detecta por los latidos; con el, como un proceso que termina, la
+        # conexion se cierra y el controlador lo ve enseguida
+        self.at(at, self.router_down, name, close_connection)
+
+    def restore_router(self, name, at):
+        self.at(at, self.router_up, name)
+
+    def fail_link(self, source, destination, at):
+        self.at(at, self.link_down, source, destination)
+
+    def restore_link(self, source, destination, at):
+        self.at(at, self.link_up, source, destination)
+
+    def router_down(self, name, close_connection=False):
+        self.scripted.append((self.now, f"router {name} down"))
+        router = self.routers[name]
+        router.up = False
+        if close_connection and router.server_socket:
+            router.server_socket.close()
+
+    def router_up(self, name):
+        # Un proceso nuevo con el mismo nombre: se registra de nuevo y sus hosts se reconectan
+        self.scripted.append((self.now, f"router {name} up"))
+        old = self.routers[name]
+        old.up = False
+        if old.server_socket:
+            old.server_socket.close()
+        self.retired.append(old)
+        router = self.routers[name] = SimulatedRouter(self, name, **self.router_options)
+        router.connect_to_server()
+        for host in self.hosts.values():
+            if self.host_routers[host.host_name] == name:
+                self.attach_host(host)
+
+    def link_down(self, source, destination):
+        self.scripted.append((self.now, f"link {source} - {destination} down"))
+        self.links[link_key(source, destination)].up = False
+        if self.link_report_delay is not None:
+            self.schedule(self.link_report_delay, self.report_link, source, destination, False)
+
+    def link_up(self, source, destination):
+        self.scripted.append((self.now, f"link {source} - {destination} up"))
+        self.links[link_key(source, destination)].up = True
+        if self.link_report_delay is not None:
+            self.schedule(self.link_report_delay, self.report_link, source, destination, True)
+
+    def report_link(self, source, destination, up):
+        # El controlador aplica el cambio del enlace y recalcula las rutas
+        controller = self.controller
+        source_id = controller.node_names_to_ids[source]
+        destination_id = controller.node_names_to_ids[destination]
+        with controller.topology_update() as network:
+            if up:
+                weight = self.network.links[link_key(source_id, destination_id)].bandwidth
+                network.add_link(source_id, destination_id, weight)
+            else:
+                network.remove_link(source_id, destination_id)
+
+    def converged(self):
+        # Cada router activo tiene exactamente la tabla que calculo el controlador
+        route_table = self.controller.route_table
+        for name, router in self.routers.items():
+            if not router.up:
+                continue
+            if not route_table.has_source(name) or router.next_hops != route_table.routes_for(name):
+                return False
+        return True
+
+    def report(self):
+        counters = {}
+        for router in itertools.chain(self.routers.values(), self.retired):
+            for name, value in router.metrics.snapshot()["counters"].items():
+                counters[name] = counters.get(name, 0) + value
+        sent = sum(flow.sent for flow in self.flows)
+        delivered = sum(flow.delivered for flow in self.flows)
+        last_scripted = self.scripted[-1][0] if self.scripted else None
+        convergence = None
+        if last_scripted is not None and self.last_route_change is not None and self.last_route_change >= last_scripted:
+            convergence = self.last_route_change - last_scripted
+        return {
+            "virtual_seconds": self.now,
+            "wall_seconds": self.wall_seconds,
+            "events": self.processed,
+            "routers": len(self.routers),
+            "links": len(self.links),
+            "scripted": [{"time": when, "event": event} for when, event in self.scripted],
+            "route_version": self.controller.route_table.version,
+            "route_updates": self.route_updates,
+            "last_route_change": self.last_route_change,
+            "convergence_seconds": convergence,
+            "converged": self.converged(),
+            "packets_sent": sent,
+            "packets_delivered": delivered,
+            "packets_lost": sent - delivered,
+            "frames_lost_in_transit": self.frames_lost,
+            "latency_p50": self.latency.quantile(0.5),
+            "latency_p99": self.latency.quantile(0.99),
+            "router_counters": counters,
+        }
+
+
+def parse_event(value):
+    # "Node 3@2.5" -> (["Node 3"], 2.5); "Node 1,Node 2@4" -> (["Node 1", "Node 2"], 4.0)
+    names, _, when = value.rpartition("@")
+    return names.split(","), float(when)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate the controller, routers and hosts in one process.")
+    parser.add_argument("--topology", help="topology file; NSFNET by default")
+    parser.add_argument("--generate", choices=sorted(GENERATORS), help="use a synthetic topology instead")
+    parser.add_argument("--size", type=int, default=1000, help="node count, or k for fat-tree")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--algorithm", default="sparse")
+    parser.add_argument("--duration", type=float, default=10.0, help="virtual seconds")
+    parser.add_argument("--latency", type=float, default=0.001, help="link latency in seconds")
+    parser.add_argument("--flows", type=int, default=10, help="random host pairs sending packets")
+    parser.add_argument("--rate", type=float, default=100.0, help="packets per second per flow")
+    parser.add_argument("--packet-size", type=int, default=64)
+    parser.add_argument("--fail-router", action="append", default=[], metavar="NAME@TIME")
+    parser.add_argument("--crash-router", action="append", default=[], metavar="NAME@TIME",
+                        help="fail a router and close its controller connection")
+    parser.add_argument("--restore-router", action="append", default=[], metavar="NAME@TIME")
+    parser.add_argument("--fail-link", action="append", default=[], metavar="A,B@TIME")
+    parser.add_argument("--restore-link", action="append", default=[], metavar="A,B@TIME")
+    parser.add_argument("--link-report-delay", type=float, default=None,
+                        help="seconds until the controller learns about a link change; never by default")
+    parser.add_argument("--no-fast-reroute", action="store_true")
+    parser.add_argument("--no-multipath", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="keep the controller and router output")
+    parser.add_argument("-o", "--output")
+    args = parser.parse_args()
+    setup_logging()
+
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(open(os.devnull, "w")))
+        if args.generate:
+            network = GENERATORS[args.generate](args.size, args.seed)
+        else:
+            network = load_topology(args.topology, headless=True)
+        start = time.perf_counter()
+        simulation = Simulation(network, args.algorithm, latency=args.latency, fast_reroute=not args.no_fast_reroute,
+                                multipath_tolerance=None if args.no_multipath else 0.0,
+                                link_report_delay=args.link_report_delay)
+        setup_seconds = time.perf_counter() - start
+        for value in args.fail_router:
+            (name,), when = parse_event(value)
+            simulation.fail_router(name, when)
+        for value in args.crash_router:
+            (name,), when = parse_event(value)
+            simulation.fail_router(name, when, close_connection=True)
+        for value in args.restore_router:
+            (name,), when = parse_event(value)
+            simulation.restore_router(name, when)
+        for value in args.fail_link:
+            (source, destination), when = parse_event(value)
+            simulation.fail_link(source, destination, when)
+        for value in args.restore_link:
+            (source, destination), when = parse_event(value)
+            simulation.restore_link(source, destination, when)
+        rng = random.Random(args.seed)
+        routers = sorted(simulation.routers)
+        for _ in range(args.flows):
+            source, destination = rng.sample(routers, 2)
+            simulation.add_flow(host_name_for(source), host_name_for(destination), args.rate, start=0.5,
+                                stop=args.duration, size=args.packet_size)
+        # Un segundo mas sin trafico nuevo para que lleguen los paquetes en vuelo
+        simulation.run(args.duration + 1.0)
+        report = simulation.report()
+        report["setup_seconds"] = setup_seconds
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,143 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+# Archivo binario con la topologia y las filas de siguientes saltos. Todo son
+# arreglos de ancho fijo en little-endian, asi que se puede mapear en memoria y
+# usar las filas sin copiarlas ni decodificarlas:
+#   cabecera | nombres (utf-8 separados por "\n", rellenos a 8 bytes)
+#   | pesos float64[m] | distancias float64[k * n] (opcional) | origen int32[m] | destino int32[m]
+#   | fuentes int32[k] | siguientes saltos int32[k * n] | predecesores int32[k * n] (opcional)
+HEADER = struct.Struct('<4sHHQIIII')  # magia, formato, flags, version, n, m, k, bytes de nombres
+MAGIC = b'NSFR'
+FORMAT_VERSION = 2
+HAS_PRED = 1
+HAS_DIST = 2
+LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def to_little(values, typecode):
+    # En maquinas big-endian se escribe una copia con los bytes invertidos
+    if LITTLE_ENDIAN:
+        return values
+    values = array(typecode, values)
+    values.byteswap()
+    return values
+
+
+def from_little(view, typecode):
+    # En little-endian la fila es una vista directa del mapa; si no, una copia invertida
+    if LITTLE_ENDIAN:
+        return view.cast(typecode)
+    values = array(typecode, bytes(view))
+    values.byteswap()
+    return values
+
+
+def topology_arrays(names, graph):
+    # Enlaces del grafo por id, ordenados para poder compararlos con una instantanea
+    ids = {name: node_id for node_id, name in enumerate(names)}
+    edges = sorted(
+        (min(ids[u], ids[v]), max(ids[u], ids[v]), weight)
+        for u, v, weight in graph.edges(data="weight", default=1)
+    )
+    return (array('d', [weight for _, _, weight in edges]),
+            array('i', [u for u, _, _ in edges]),
+            array('i', [v for _, v, _ in edges]))
+
+
+def write_snapshot(path, names, graph, version, sources, next_hop_rows, pred_rows=None, dist_rows=None,
+                   edges=None, publish=None):
+    # Se escribe en un archivo temporal y se sustituye de una vez: quien tenga
+    # mapeada la version anterior la sigue leyendo sin problemas. edges son los
+    # arreglos de topology_arrays ya calculados (entonces graph no se lee). Si
+    # publish() devuelve False al terminar, el archivo no se sustituye.
+    # Devuelve si se sustituyo.
+    names_bytes = "\n".join(names).encode()
+    padding = b'\0' * (-(HEADER.size + len(names_bytes)) % 8)
+    weights, edge_u, edge_v = edges or topology_arrays(names, graph)
+    flags = (HAS_PRED if pred_rows is not None else 0) | (HAS_DIST if dist_rows is not None else 0)
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, flags, version, len(names), len(weights), len(sources),
+                            len(names_bytes)))
+        f.write(names_bytes + padding)
+        f.write(to_little(weights, 'd'))
+        for row in dist_rows or ():
+            f.write(to_little(row, 'd'))
+        for values in (edge_u, edge_v, array('i', sources)):
+            f.write(to_little(values, 'i'))
+        for row in next_hop_rows:
+            f.write(to_little(row, 'i'))
+        for row in pred_rows or ():
+            f.write(to_little(row, 'i'))
+    if publish is not None and not publish():
+        os.remove(temporary)
+        return False
+    os.replace(temporary, path)
+    return True
+
+
+class Snapshot:
+    # Instantanea mapeada en memoria. Las filas son memoryviews de enteros sobre
+    # una copia privada del mapa, asi que se pueden modificar sin tocar el archivo
+    # (en maquinas big-endian son arreglos ya invertidos).
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        view = memoryview(self.map)
+        magic, format_version, flags, self.version, size, edge_count, source_count, names_size = \
+            HEADER.unpack_from(view)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a route snapshot")
+        offset = HEADER.size
+        self.names = bytes(view[offset:offset + names_size]).decode().split("\n") if size else []
+        offset += names_size + (-(HEADER.size + names_size) % 8)
+        self.weights = from_little(view[offset:offset + 8 * edge_count], 'd')
+        offset += 8 * edge_count
+        self.dist = []
+        if flags & HAS_DIST:
+            for _ in range(source_count):
+                self.dist.append(from_little(view[offset:offset + 8 * size], 'd'))
+                offset += 8 * size
+        self.edge_u = from_little(view[offset:offset + 4 * edge_count], 'i')
+        offset += 4 * edge_count
+        self.edge_v = from_little(view[offset:offset + 4 * edge_count], 'i')
+        offset += 4 * edge_count
+        self.sources = from_little(view[offset:offset + 4 * source_count], 'i')
+        offset += 4 * source_count
+        self.next_hop = []
+        for _ in range(source_count):
+            self.next_hop.append(from_little(view[offset:offset + 4 * size], 'i'))
+            offset += 4 * size
+        self.pred = []
+        if flags & HAS_PRED:
+            for _ in range(source_count):
+                self.pred.append(from_little(view[offset:offset + 4 * size], 'i'))
+                offset += 4 * size
+        if offset > len(self.map):
+            raise ValueError(f"{path} is truncated")
+
+    def matches(self, names, graph):
+        # La instantanea solo vale si la topologia actual es exactamente la misma
+        if list(names) != self.names:
+            return False
+        weights, edge_u, edge_v = topology_arrays(names, graph)
+        return self.weights == weights and self.edge_u == edge_u and self.edge_v == edge_v
+
+
+def load_snapshot(path, names, graph):
+    # Devuelve la instantanea si existe y coincide con la topologia; si no, None
+    if not os.path.exists(path):
+        return None
+    try:
+        snapshot = Snapshot(path)
+    except (OSError, ValueError, TypeError, struct.error) as e:
+        print(f"Ignoring route snapshot {path}: {e}")
+        return None
+    if not snapshot.matches(names, graph):
+        print(f"Route snapshot {path} does not match the current topology.")
+        return None
+    return snapshot
@@ -0,0 +1,57 @@
+import threading
+import time
+
+from link import link_key
+
+
+class LinkReweighter:
+    # Recalcula los pesos de los enlaces a partir del trafico que informan los
+    # routers. La utilizacion de cada enlace es la del sentido mas cargado sobre
+    # su capacidad (1 / peso original, en unidades de bandwidth_unit bits/s) y el
+    # peso pasa a ser peso original * (1 + gain * utilizacion). Para que las rutas
+    # no oscilen la utilizacion se suaviza con una media movil exponencial y un
+    # peso solo cambia si difiere del actual mas de un factor threshold.
+    def __init__(self, graph, bandwidth_unit=1e6, gain=4.0, smoothing=0.3, threshold=0.1):
+        self.base_weights = {link_key(u, v): weight for u, v, weight in graph.edges(data="weight", default=1)}
+        self.bandwidth_unit = bandwidth_unit
+        self.gain = gain
+        self.smoothing = smoothing
+        self.threshold = threshold
+        self.utilization = {}  # Enlace -> utilizacion suavizada
+        self.sent_bytes = {}  # (router, vecino) -> bytes desde el ultimo recalculo
+        self.last_reweight = time.monotonic()
+        self.lock = threading.Lock()
+
+    def record(self, router_name, links):
+        # links: vecino -> [bytes, mensajes] enviados desde el informe anterior
+        with self.lock:
+            for neighbor, (sent_bytes, _) in links.items():
+                key = (router_name, neighbor)
+                self.sent_bytes[key] = self.sent_bytes.get(key, 0) + sent_bytes
+
+    def reweight(self, graph, now=None):
+        # Devuelve enlace -> peso nuevo de los que deben cambiar. El grafo no se
+        # toca: quien llama aplica los pesos a la red para que enlaces y grafo
+        # sigan de acuerdo.
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            elapsed = max(now - self.last_reweight, 1e-9)
+            sent_bytes, self.sent_bytes = self.sent_bytes, {}
+            self.last_reweight = now
+        rates = {}
+        for (u, v), count in sent_bytes.items():
+            key = link_key(u, v)
+            rates[key] = max(rates.get(key, 0.0), 8 * count / elapsed)
+        changed = {}
+        for u, v, weight in graph.edges(data="weight", default=1):
+            key = link_key(u, v)
+            base = self.base_weights.get(key, weight)
+            capacity = self.bandwidth_unit / base
+            measured = min(rates.get(key, 0.0) / capacity, 1.0)
+            utilization = self.utilization.get(key, 0.0)
+            utilization += self.smoothing * (measured - utilization)
+            self.utilization[key] = utilization
+            target = base * (1 + self.gain * utilization)
+            if abs(target - weight) > self.threshold * weight:
+                changed[key] = target
+        return changed
@@ -0,0 +1,14 @@
+import os
+import sys
+
+# Los modulos del proyecto estan en la raiz del repositorio, sin paquete
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from topology import load_topology
+
+
+@pytest.fixture
+def network():
+    # Topologia NSFNET por defecto, sin pantalla
+    return load_topology(headless=True)
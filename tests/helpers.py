@@ -0,0 +1,28 @@
+import pytest
+from network import Network
+from routing import NO_ROUTE, UNREACHABLE
+
+
+def ring(size):
+    # Anillo con pesos iguales: ningun vecino es un LFA y hacen falta tuneles
+    network = Network(headless=True)
+    for node_id in range(size):
+        network.add_node(node_id, f"R{node_id}")
+    for node_id in range(size):
+        network.add_link(node_id, (node_id + 1) % size, 1)
+    return network
+
+
+def assert_same_routes(table, expected, graph):
+    # Con empates el siguiente salto puede variar: se comparan las distancias y
+    # que cada salto este en un camino minimo
+    assert table.names == expected.names
+    for source_id, source in enumerate(table.names):
+        assert list(table.dist[source_id]) == pytest.approx(list(expected.dist[source_id]))
+        for destination_id, hop in enumerate(table.next_hop[source_id]):
+            distance = expected.dist[source_id][destination_id]
+            if destination_id == source_id or distance == UNREACHABLE:
+                continue
+            assert hop != NO_ROUTE
+            weight = graph[source][table.names[hop]]["weight"]
+            assert weight + expected.dist[hop][destination_id] == pytest.approx(distance)
@@ -0,0 +1,57 @@
+import pytest
+from network import Network
+from routing import RouteTable
+from topology import load_topology
+from helpers import ring
+
+
+@pytest.mark.parametrize("make_network", [lambda: load_topology(headless=True), lambda: ring(7)],
+                         ids=["nsfnet", "ring"])
+def test_backups_are_loop_free(make_network):
+    network = make_network()
+    table = RouteTable.from_network(network, "dijkstra")
+    tunnels = 0
+    for source in table.names:
+        routes = table.routes_for(source)
+        for destination, backup in table.backups_for(network.graph, source).items():
+            primary = routes[destination]
+            assert backup != primary
+            if isinstance(backup, list):
+                # Tunel: ni el camino hasta su final ni el de ahi al destino pasan por el salto principal
+                neighbor, endpoint = backup
+                assert neighbor in network.graph[source]
+                assert primary not in table.path(neighbor, endpoint)
+                assert primary not in table.path(endpoint, destination)
+                tunnels += 1
+            else:
+                # LFA: el vecino llega al destino sin volver por el origen
+                assert backup in network.graph[source]
+                assert source not in table.path(backup, destination)
+    if network.graph.number_of_nodes() == 7:
+        assert tunnels
+
+
+def test_controller_reuses_alternatives_of_unaffected_routers(tmp_path, monkeypatch):
+    from controller import TCPServer
+    monkeypatch.chdir(tmp_path)  # La instantanea de rutas se escribe en el directorio actual
+    # Dos grupos completos de 6 routers unidos por un enlace: quitar un enlace
+    # del primero solo cambia filas de ese grupo
+    network = Network(headless=True)
+    for node_id in range(12):
+        network.add_node(node_id, f"R{node_id}")
+    for group in (range(6), range(6, 12)):
+        for source_id in group:
+            for destination_id in group:
+                if source_id < destination_id:
+                    network.add_link(source_id, destination_id, 1)
+    network.add_link(0, 6, 1)
+    server = TCPServer("localhost", 0, "dijkstra", headless=True, topology=network)
+    for name in server.route_table.names:
+        server.alternatives_for(name)
+    with server.lock:
+        with server.network.transaction() as change:
+            server.network.remove_link(1, 2)
+        server.recompute_routes(change)
+    for name in server.route_table.names:
+        assert server.alternatives_for(name) == (server.multipath_for(name), server.backups_for(name))
+    assert server.metrics.counters["alternatives_reused"] == 6
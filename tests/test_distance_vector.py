@@ -0,0 +1,68 @@
+import networkx as nx
+import pytest
+from distance_vector import DistanceVector
+
+
+def build_vectors(graph, poison_reverse):
+    infinity = sum(weight for _, _, weight in graph.edges(data="weight", default=1)) * 1.01
+    return {name: DistanceVector(name, {neighbor: data["weight"] for neighbor, data in graph[name].items()},
+                                 infinity, poison_reverse)
+            for name in graph}
+
+
+def exchange(vectors, down=frozenset()):
+    # Rondas sincronas de anuncios hasta que ningun router cambia; devuelve cuantas hicieron falta
+    for rounds in range(1, 100):
+        changed = False
+        for name, vector in vectors.items():
+            for neighbor in vector.link_costs:
+                if frozenset((name, neighbor)) not in down:
+                    changed = vectors[neighbor].update(name, vector.advertisement(neighbor)) or changed
+        if not changed:
+            return rounds
+    raise AssertionError("Distance vectors did not converge")
+
+
+def assert_shortest_routes(vectors, graph):
+    lengths = dict(nx.all_pairs_dijkstra_path_length(graph))
+    for source, vector in vectors.items():
+        assert set(vector.routes) == set(lengths[source]) - {source}
+        for destination, (cost, _) in vector.routes.items():
+            assert cost == pytest.approx(lengths[source][destination])
+            # Siguiendo los saltos se llega al destino sin bucles
+            hop, visited = source, {source}
+            while hop != destination:
+                hop = vectors[hop].next_hops()[destination]
+                assert hop not in visited
+                visited.add(hop)
+
+
+@pytest.mark.parametrize("poison_reverse", [True, False], ids=["poison-reverse", "split-horizon"])
+def test_converges_after_link_failure(network, poison_reverse):
+    graph = network.graph
+    vectors = build_vectors(graph, poison_reverse)
+    exchange(vectors)
+    assert_shortest_routes(vectors, graph)
+
+    source, destination = "Node CA1", "Node UT"
+    down = {frozenset((source, destination))}
+    vectors[source].neighbor_down(destination)
+    vectors[destination].neighbor_down(source)
+    exchange(vectors, down)
+    failed = graph.copy()
+    failed.remove_edge(source, destination)
+    assert_shortest_routes(vectors, failed)
+
+
+def test_partitioned_destinations_are_withdrawn(network):
+    graph = network.graph
+    vectors = build_vectors(graph, poison_reverse=True)
+    exchange(vectors)
+    isolated = "Node WA"
+    down = {frozenset((isolated, neighbor)) for neighbor in graph[isolated]}
+    for neighbor in graph[isolated]:
+        vectors[neighbor].neighbor_down(isolated)
+        vectors[isolated].neighbor_down(neighbor)
+    exchange(vectors, down)
+    assert vectors[isolated].routes == {}
+    assert all(isolated not in vector.routes for name, vector in vectors.items() if name != isolated)
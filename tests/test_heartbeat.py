@@ -0,0 +1,50 @@
+from heartbeat import PhiAccrualDetector
+
+
+def feed(detector, name, intervals, start=0.0):
+    # Latidos con los intervalos dados; devuelve el instante del ultimo
+    now = start
+    detector.heartbeat(name, now)
+    for interval in intervals:
+        now += interval
+        detector.heartbeat(name, now)
+    return now
+
+
+def test_phi_grows_with_silence():
+    detector = PhiAccrualDetector(threshold=8.0)
+    last = feed(detector, "R1", [1.0] * 20)
+    values = [detector.phi("R1", last + elapsed) for elapsed in (0.5, 1.0, 1.5, 2.0, 2.5)]
+    assert values == sorted(values)
+    assert values[1] < 1.0
+    assert detector.suspects(last + 1.5) == []
+    assert detector.suspects(last + 2.5) == ["R1"]
+
+
+def test_irregular_heartbeats_tolerate_longer_silence():
+    detector = PhiAccrualDetector(threshold=8.0)
+    regular = feed(detector, "regular", [1.0] * 20)
+    irregular = feed(detector, "irregular", [0.5, 1.5] * 10)
+    assert regular == irregular
+    assert detector.phi("regular", regular + 2.2) > detector.threshold
+    assert detector.phi("irregular", irregular + 2.2) < detector.threshold
+    assert detector.suspects(regular + 2.2) == ["regular"]
+
+
+def test_threshold_sets_when_a_router_is_suspected():
+    strict = PhiAccrualDetector(threshold=1.0)
+    lenient = PhiAccrualDetector(threshold=16.0)
+    for detector in (strict, lenient):
+        last = feed(detector, "R1", [1.0] * 20)
+    assert strict.suspects(last + 1.7) == ["R1"]
+    assert lenient.suspects(last + 1.7) == []
+
+
+def test_unwatched_and_removed_routers_are_never_suspected():
+    detector = PhiAccrualDetector()
+    assert detector.phi("R1", 100.0) == 0.0
+    last = feed(detector, "R1", [1.0] * 5)
+    assert detector.silence("R1", last + 3.0) == 3.0
+    detector.remove("R1")
+    assert detector.suspects(last + 100.0) == []
+    assert detector.silence("R1", last + 100.0) == 0.0
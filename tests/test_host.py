@@ -0,0 +1,46 @@
+from host import Host, delivered_messages
+from protocol import encode_batch, decode_batch, batch_header, iter_frames, MSG_DATA_BATCH, MSG_DELIVER_BATCH
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.sent = bytearray()
+
+    def sendall(self, data):
+        self.sent += data
+
+
+def test_batch_round_trip():
+    messages = [b"", b"hola", bytes(range(256)), "ñandú".encode()]
+    payload = encode_batch("H1", "H13", messages)
+    assert batch_header(payload)[:3] == ("H1", "H13", len(messages))
+    assert decode_batch(payload) == ("H1", "H13", messages)
+    assert decode_batch(memoryview(payload)) == ("H1", "H13", messages)
+
+
+def test_queued_messages_go_out_in_one_batch_per_destination():
+    host = Host("H1", 0)
+    host.client_socket = RecordingSocket()
+    host.queue_message("H2", "first")
+    host.queue_message("H3", b"\x00\xff")
+    host.queue_message("H2", "second")
+    assert host.client_socket.sent == b""
+    host.flush()
+    frames = [(msg_type, decode_batch(payload)) for msg_type, payload in iter_frames(host.client_socket.sent)]
+    assert frames == [(MSG_DATA_BATCH, ("H1", "H2", [b"first", b"second"])),
+                      (MSG_DATA_BATCH, ("H1", "H3", [b"\x00\xff"]))]
+    assert host.pending == {} and host.pending_bytes == 0
+
+
+def test_full_batch_is_sent_without_flush():
+    host = Host("H1", 0, batch_bytes=10)
+    host.client_socket = RecordingSocket()
+    host.queue_message("H2", "12345")
+    assert host.client_socket.sent == b""
+    host.queue_message("H2", "67890")
+    assert [decode_batch(payload)[2] for _, payload in iter_frames(host.client_socket.sent)] == [[b"12345", b"67890"]]
+
+
+def test_delivered_batch_with_binary_messages():
+    payload = encode_batch("H2", "H1", [b"text", b"\xff\xfe"])
+    assert delivered_messages(MSG_DELIVER_BATCH, payload) == [("H2", "text"), ("H2", "��")]
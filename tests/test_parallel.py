@@ -0,0 +1,26 @@
+from routing import RouteTable
+from helpers import assert_same_routes
+
+
+def test_parallel_matches_dijkstra(network):
+    expected = RouteTable.from_network(network, "dijkstra")
+    parallel = RouteTable(network.graph.nodes)
+    parallel.workers = 2
+    parallel.compute_parallel(network.graph, "dijkstra", list(range(len(parallel.names))))
+    assert_same_routes(parallel, expected, network.graph)
+
+
+def test_parallel_recomputes_only_given_sources(network):
+    table = RouteTable.from_network(network, "dijkstra")
+    before = [list(row) for row in table.next_hop]
+    ids = {node.name: node_id for node_id, node in network.nodes.items()}
+    network.remove_link(ids["Node CA1"], ids["Node UT"])
+    table.workers = 2
+    sources = [table.ids["Node CA1"], table.ids["Node UT"]]
+    table.compute_parallel(network.graph, "dijkstra", sources)
+    expected = RouteTable.from_network(network, "dijkstra")
+    for source_id in range(len(table.names)):
+        if source_id in sources:
+            assert list(table.dist[source_id]) == list(expected.dist[source_id])
+        else:
+            assert list(table.next_hop[source_id]) == before[source_id]
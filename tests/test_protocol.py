@@ -0,0 +1,103 @@
+import pytest
+from protocol import FrameReader, encode_frame, MSG_DATA, MSG_OK
+from protocol import HEADER, PACKET_HEADER, IOV_MAX, MSG_PACKET, packet_parts, packet_frame, frame_length, decode_packet
+from protocol import iter_frames, send_parts
+
+
+class ChunkedSocket:
+    # Entrega los datos en los trozos indicados, como un socket que recibe
+    # las tramas partidas
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def recv_into(self, view):
+        if not self.chunks:
+            return 0
+        chunk = self.chunks.pop(0)
+        size = min(len(chunk), len(view))
+        view[:size] = chunk[:size]
+        if size < len(chunk):
+            self.chunks.insert(0, chunk[size:])
+        return size
+
+
+def test_frames_split_across_reads():
+    data = encode_frame(MSG_DATA, b"hello") + encode_frame(MSG_OK) + encode_frame(MSG_DATA, b"world")
+    reader = FrameReader(ChunkedSocket(data[index:index + 1] for index in range(len(data))))
+    assert [(msg_type, bytes(payload)) for msg_type, payload in iter(reader.read_frame, (None, None))] == \
+        [(MSG_DATA, b"hello"), (MSG_OK, b""), (MSG_DATA, b"world")]
+
+
+def test_frames_wrap_around_a_small_buffer():
+    payloads = [bytes([index]) * 7 for index in range(20)]
+    data = b"".join(encode_frame(MSG_DATA, payload) for payload in payloads)
+    reader = FrameReader(ChunkedSocket([data[:30], data[30:95], data[95:]]), buffer_size=16)
+    for payload in payloads:
+        assert bytes(reader.read_frame()[1]) == payload
+    assert reader.read_frame() == (None, None)
+
+
+def test_frame_larger_than_the_buffer():
+    payload = bytes(range(256)) * 1000
+    data = encode_frame(MSG_OK, b"small") + encode_frame(MSG_DATA, payload) + encode_frame(MSG_OK)
+    reader = FrameReader(ChunkedSocket([data[:4000], data[4000:]]), buffer_size=1024)
+    assert bytes(reader.read_frame()[1]) == b"small"
+    msg_type, received = reader.read_frame()
+    assert msg_type == MSG_DATA and bytes(received) == payload
+    assert reader.read_frame()[0] == MSG_OK
+
+
+@pytest.mark.parametrize("cut", [3, 8])
+def test_connection_closed_inside_a_frame(cut):
+    reader = FrameReader(ChunkedSocket([encode_frame(MSG_DATA, b"hello")[:cut]]))
+    with pytest.raises(ConnectionError):
+        reader.read_frame()
+
+
+def test_packet_round_trip():
+    data = bytes(range(256)) * 3
+    header, body = packet_parts(7, 3, 64, memoryview(data))
+    assert len(header) == HEADER.size + PACKET_HEADER.size
+    assert body.obj is data  # El contenido no se copia
+    frame = packet_frame(7, 3, 64, data)
+    assert frame == header + body
+    assert frame_length((header, body)) == len(frame)
+    [(msg_type, payload)] = iter_frames(frame)
+    dest_id, source_id, ttl, received = decode_packet(payload)
+    assert (msg_type, dest_id, source_id, ttl, bytes(received)) == (MSG_PACKET, 7, 3, 64, data)
+
+
+def test_truncated_packet_is_rejected():
+    frame = packet_frame(1, 2, 64, b"payload")
+    with pytest.raises(ValueError):
+        decode_packet(frame[HEADER.size:-1])
+
+
+class PartialSocket:
+    # sendmsg que escribe como mucho `limit` bytes por llamada
+    def __init__(self, limit):
+        self.limit = limit
+        self.sent = bytearray()
+        self.calls = 0
+
+    def sendmsg(self, buffers):
+        self.calls += 1
+        data = b"".join(buffers)[:self.limit]
+        self.sent += data
+        return len(data)
+
+
+def test_send_parts_resumes_partial_writes():
+    parts = [b"header", b"", memoryview(b"x" * 100), b"tail"]
+    sock = PartialSocket(limit=7)
+    send_parts(sock, parts)
+    assert sock.sent == b"".join(parts)
+    assert sock.calls == -(-len(sock.sent) // 7)
+
+
+def test_send_parts_splits_at_iov_max():
+    parts = [bytes([index % 256]) for index in range(IOV_MAX * 2 + 5)]
+    sock = PartialSocket(limit=len(parts))
+    send_parts(sock, parts)
+    assert sock.sent == b"".join(parts)
+    assert sock.calls == 3
@@ -0,0 +1,31 @@
+import pytest
+from routing import RouteTable
+from helpers import assert_same_routes
+
+
+@pytest.mark.parametrize("algorithm_choice", ["dijkstra", "sparse"])
+def test_repair_after_link_removal_matches_full_compute(network, algorithm_choice):
+    table = RouteTable.from_network(network, algorithm_choice)
+    ids = {node.name: node_id for node_id, node in network.nodes.items()}
+    with network.transaction() as change:
+        network.remove_link(ids["Node CA1"], ids["Node UT"])
+        network.remove_link(ids["Node MI"], ids["Node NJ"])
+    table.repair(network.graph, algorithm_choice, removed_links=change.removed_links)
+    expected = RouteTable(table.names)
+    expected.compute(network.graph, algorithm_choice)
+    assert_same_routes(table, expected, network.graph)
+
+
+@pytest.mark.parametrize("algorithm_choice", ["dijkstra", "sparse"])
+def test_repair_after_node_removal_matches_full_compute(network, algorithm_choice):
+    table = RouteTable.from_network(network, algorithm_choice)
+    ids = {node.name: node_id for node_id, node in network.nodes.items()}
+    with network.transaction() as change:
+        network.remove_node(ids["Node UT"])
+        network.remove_node(ids["Node GA"])
+    table.repair(network.graph, algorithm_choice, removed_nodes=change.removed_nodes)
+    expected = RouteTable(table.names)
+    expected.compute(network.graph, algorithm_choice)
+    for name in change.removed_nodes:
+        assert not table.has_source(name)
+    assert_same_routes(table, expected, network.graph)
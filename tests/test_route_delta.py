@@ -0,0 +1,72 @@
+import json
+
+import pytest
+from controller import TCPServer
+from protocol import FrameReader, MSG_ROUTES, MSG_ROUTES_DELTA, MSG_RESYNC
+from router import Router
+
+
+class RecordingSocket:
+    # Guarda lo que se envia para leerlo despues como tramas
+    def __init__(self):
+        self.sent = bytearray()
+        self.read = 0
+
+    def sendall(self, data):
+        self.sent += data
+
+    def recv_into(self, view):
+        size = min(len(view), len(self.sent) - self.read)
+        view[:size] = self.sent[self.read:self.read + size]
+        self.read += size
+        return size
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    # Controlador y router sin red: las tablas se pasan a mano
+    monkeypatch.chdir(tmp_path)  # Instantaneas del controlador y del router
+    server = TCPServer("localhost", 0, "dijkstra", headless=True)
+    router = Router(None, None, 0, "Node WA", telemetry_interval=None)
+    router.server_socket = RecordingSocket()
+    router.update_routes(json.dumps(server.full_routes("Node WA")).encode())
+    return server, router
+
+
+def fail_link(server, source, destination):
+    ids = server.node_names_to_ids
+    with server.lock:
+        with server.network.transaction() as change:
+            server.network.remove_link(ids[source], ids[destination])
+        server.recompute_routes(change)
+
+
+def test_delta_brings_router_to_the_new_table(session):
+    server, router = session
+    fail_link(server, "Node WA", "Node CA1")
+    msg_type, delta = server.route_update("Node WA")
+    assert msg_type == MSG_ROUTES_DELTA
+    assert router.process_server_message(msg_type, json.dumps(delta).encode())
+    assert router.routes_version == delta["version"] == server.route_table.version
+    assert router.next_hops == server.route_table.routes_for("Node WA")
+    assert router.server_socket.sent == b""
+
+
+def test_version_mismatch_requests_full_table(session):
+    server, router = session
+    fail_link(server, "Node WA", "Node CA1")
+    server.route_update("Node WA")  # Delta que el router no llega a recibir
+    fail_link(server, "Node WA", "Node CA2")
+    msg_type, delta = server.route_update("Node WA")
+    stale_hops = dict(router.next_hops)
+    assert router.process_server_message(msg_type, json.dumps(delta).encode())
+    assert router.next_hops == stale_hops
+    assert FrameReader(router.server_socket).read_frame() == (MSG_RESYNC, b"")
+
+    client_socket = RecordingSocket()
+    server.process_client_message(client_socket, "Node WA", MSG_RESYNC, b"")
+    msg_type, payload = FrameReader(client_socket).read_frame()
+    assert msg_type == MSG_ROUTES
+    assert router.process_server_message(msg_type, payload)
+    assert router.routes_version == server.route_table.version
+    assert router.next_hops == server.route_table.routes_for("Node WA")
@@ -0,0 +1,36 @@
+from simulation import Simulation
+from topology import load_topology
+
+
+def test_converges_after_link_failure():
+    network = load_topology(headless=True)
+    simulation = Simulation(network, "dijkstra", link_report_delay=0.05)
+    simulation.add_flow("Host WA", "Host NJ", 200, start=0.5, stop=4)
+    simulation.run(1)
+    assert simulation.converged()
+    path = simulation.controller.route_table.path("Node WA", "Node NJ")
+    source, destination = path[1], path[2]
+    simulation.fail_link(source, destination, at=2)
+    simulation.run(5)
+    assert simulation.converged()
+    new_path = simulation.controller.route_table.path("Node WA", "Node NJ")
+    hops = set(zip(new_path, new_path[1:]))
+    assert (source, destination) not in hops and (destination, source) not in hops
+    report = simulation.report()
+    # Con los saltos alternativos solo se pierde lo que estaba en el enlace al caer
+    assert report["packets_delivered"] >= report["packets_sent"] - 1
+
+
+def test_converges_after_router_failure_and_recovery():
+    network = load_topology(headless=True)
+    simulation = Simulation(network, "dijkstra")
+    simulation.run(1)
+    victim = simulation.controller.route_table.path("Node WA", "Node NJ")[2]
+    simulation.fail_router(victim, at=2)
+    simulation.run(6)
+    assert simulation.converged()
+    assert not simulation.controller.route_table.has_source(victim)
+    simulation.restore_router(victim, at=7)
+    simulation.run(10)
+    assert simulation.converged()
+    assert simulation.controller.route_table.has_source(victim)
@@ -0,0 +1,34 @@
+from routing import RouteTable
+from snapshot import load_snapshot
+
+
+def test_snapshot_round_trip(network, tmp_path):
+    table = RouteTable.from_network(network, "dijkstra")
+    path = str(tmp_path / "routes.snap")
+    table.save_snapshot(path, network.graph)
+    loaded = RouteTable.from_snapshot(load_snapshot(path, network.graph.nodes, network.graph))
+    assert loaded.version == table.version
+    assert loaded.names == table.names
+    assert [list(row) for row in loaded.next_hop] == [list(row) for row in table.next_hop]
+    assert [list(row) for row in loaded.pred] == [list(row) for row in table.pred]
+    assert [list(row) for row in loaded.dist] == [list(row) for row in table.dist]
+
+
+def test_snapshot_rejects_other_topology(network, tmp_path):
+    table = RouteTable.from_network(network, "dijkstra")
+    path = str(tmp_path / "routes.snap")
+    table.save_snapshot(path, network.graph)
+    ids = {node.name: node_id for node_id, node in network.nodes.items()}
+    network.remove_link(ids["Node CA1"], ids["Node UT"])
+    assert load_snapshot(path, network.graph.nodes, network.graph) is None
+
+
+def test_snapshot_is_kept_when_publish_refuses(network, tmp_path):
+    table = RouteTable.from_network(network, "dijkstra")
+    path = str(tmp_path / "routes.snap")
+    assert table.save_snapshot(path, network.graph)
+    version = table.version
+    table.version += 1
+    assert not table.save_snapshot(path, network.graph, publish=lambda: False)
+    assert load_snapshot(path, network.graph.nodes, network.graph).version == version
+    assert [entry.name for entry in tmp_path.iterdir()] == ["routes.snap"]
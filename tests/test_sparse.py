@@ -0,0 +1,20 @@
+from routing import RouteTable, NO_ROUTE, UNREACHABLE
+from helpers import assert_same_routes
+
+
+def test_sparse_matches_dijkstra(network):
+    expected = RouteTable.from_network(network, "dijkstra")
+    sparse = RouteTable.from_network(network, "sparse")
+    assert_same_routes(sparse, expected, network.graph)
+
+
+def test_sparse_marks_unreachable_destinations(network):
+    ids = {node.name: node_id for node_id, node in network.nodes.items()}
+    for neighbor_id in list(network.nodes[ids["Node WA"]].links):
+        network.remove_link(ids["Node WA"], neighbor_id)
+    table = RouteTable.from_network(network, "sparse")
+    source_id, isolated_id = table.ids["Node CA1"], table.ids["Node WA"]
+    assert table.next_hop[source_id][isolated_id] == NO_ROUTE
+    assert table.dist[source_id][isolated_id] == UNREACHABLE
+    assert table.next_hop[isolated_id][isolated_id] == isolated_id
+    assert_same_routes(table, RouteTable.from_network(network, "dijkstra"), network.graph)
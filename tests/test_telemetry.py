@@ -0,0 +1,59 @@
+import networkx as nx
+import pytest
+from telemetry import LinkReweighter
+
+
+@pytest.fixture
+def graph():
+    # Enlaces de 1 Mbit/s con bandwidth_unit 1e6: peso 1
+    graph = nx.Graph()
+    graph.add_edge("A", "B", weight=1.0)
+    graph.add_edge("B", "C", weight=1.0)
+    return graph
+
+
+def load(reweighter, graph, rates, now):
+    # Trafico de un segundo con las tasas dadas (fraccion de la capacidad) y
+    # aplica los pesos que cambian, como hace el controlador
+    for (router_name, neighbor), rate in rates.items():
+        reweighter.record(router_name, {neighbor: (int(rate * 1e6 / 8), 1)})
+    changed = reweighter.reweight(graph, now)
+    for (u, v), weight in changed.items():
+        graph[u][v]["weight"] = weight
+    return changed
+
+
+def test_busy_direction_sets_the_link_weight(graph):
+    reweighter = LinkReweighter(graph)
+    reweighter.last_reweight = 0.0
+    changed = load(reweighter, graph, {("A", "B"): 1.0, ("B", "A"): 0.1}, now=1.0)
+    # Utilizacion suavizada 0.3 -> peso 1 * (1 + 4 * 0.3)
+    assert changed == {("A", "B"): pytest.approx(2.2)}
+
+
+def test_small_changes_are_ignored(graph):
+    reweighter = LinkReweighter(graph)
+    reweighter.last_reweight = 0.0
+    assert load(reweighter, graph, {("A", "B"): 0.05}, now=1.0) == {}
+    assert graph["A"]["B"]["weight"] == 1.0
+
+
+def test_weights_settle_and_return_after_load_stops(graph):
+    reweighter = LinkReweighter(graph)
+    reweighter.last_reweight = 0.0
+    now = 0.0
+    history = []
+    for _ in range(30):
+        now += 1.0
+        history.append(load(reweighter, graph, {("B", "C"): 0.5}, now))
+    # Con carga constante los pesos dejan de cambiar antes de llegar al objetivo exacto
+    assert any(history) and not any(history[-10:])
+    assert graph["B"]["C"]["weight"] == pytest.approx(3.0, rel=0.1)
+    assert graph["A"]["B"]["weight"] == 1.0
+    # Una variacion pequena de la carga no mueve el peso
+    now += 1.0
+    assert load(reweighter, graph, {("B", "C"): 0.45}, now) == {}
+    for _ in range(30):
+        now += 1.0
+        load(reweighter, graph, {}, now)
+    assert graph["B"]["C"]["weight"] == pytest.approx(1.0, rel=0.1)
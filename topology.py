@@ -0,0 +1,144 @@
+import argparse
+import json
+import math
+import os
+import random
+import networkx as nx
+from network import Network
+
+DEFAULT_TOPOLOGY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "topologies", "nsfnet.json")
+ROUTER_BASE_PORT = 15000
+BANDWIDTHS = [300, 600, 1200, 1500, 2100, 2400, 2700, 3000, 3600, 3900, 4800]
+
+
+def build_network(nodes, links, headless=None):
+    # nodes: [(id, nombre)], links: [(id origen, id destino, ancho de banda)]
+    # El peso de cada enlace es 1/ancho de banda, como en la red NSFNET original
+    network = Network(headless=headless)
+    for node_id, name in nodes:
+        network.add_node(node_id, name)
+    for source_id, destination_id, bandwidth in links:
+        network.add_link(source_id, destination_id, 1 / bandwidth)
+    return network
+
+
+def load_topology(path=None, headless=None):
+    # Admite una lista de aristas en JSON ({"nodes": [...], "links": [...]}) o un archivo GML.
+    # Una Network ya construida (la de la simulacion) se devuelve tal cual.
+    if isinstance(path, Network):
+        return path
+    path = path or DEFAULT_TOPOLOGY
+    if path.endswith(".gml"):
+        graph = nx.read_gml(path)  # Los nodos se nombran por su etiqueta
+        ids = {node: node_id for node_id, node in enumerate(graph.nodes, start=1)}
+        nodes = [(ids[node], str(node)) for node in graph.nodes]
+        links = [(ids[u], ids[v], data.get("bandwidth", 1)) for u, v, data in graph.edges(data=True)]
+    else:
+        with open(path) as f:
+            data = json.load(f)
+        nodes = [(node["id"], node["name"]) for node in data["nodes"]]
+        links = [(link["source"], link["target"], link["bandwidth"]) for link in data["links"]]
+    return build_network(nodes, links, headless)
+
+
+def save_topology(network, path):
+    names_to_ids = {node.name: node_id for node_id, node in network.nodes.items()}
+    data = {
+        "nodes": [{"id": node_id, "name": node.name} for node_id, node in sorted(network.nodes.items())],
+        "links": [
+            {"source": names_to_ids[u], "target": names_to_ids[v], "bandwidth": round(1 / weight)}
+            for u, v, weight in network.graph.edges(data="weight")
+        ],
+    }
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def router_ports(network, base_port=ROUTER_BASE_PORT):
+    # Puerto de cada router: el puerto base mas su posicion por id
+    return {node.name: base_port + index for index, (_, node) in enumerate(sorted(network.nodes.items()))}
+
+
+def host_name_for(router_name):
+    return "Host " + router_name[len("Node "):] if router_name.startswith("Node ") else f"Host of {router_name}"
+
+
+def host_routers(network):
+    # Cada router tiene un host con el mismo sufijo: "Host WA" -> "Node WA"
+    return {host_name_for(node.name): node.name for _, node in sorted(network.nodes.items())}
+
+
+def host_ids(network):
+    # Id entero de cada host para los paquetes binarios: su posicion por id de router
+    return {host_name: host_id for host_id, host_name in enumerate(host_routers(network))}
+
+
+def _connect_components(graph, rng):
+    # Une las componentes sueltas para que todos los nodos sean alcanzables
+    components = [list(component) for component in nx.connected_components(graph)]
+    for previous, component in zip(components, components[1:]):
+        graph.add_edge(rng.choice(previous), rng.choice(component))
+
+
+def _from_graph(graph, rng, headless=None):
+    _connect_components(graph, rng)
+    ids = {node: node_id for node_id, node in enumerate(graph.nodes, start=1)}
+    nodes = [(ids[node], f"Node {ids[node]}") for node in graph.nodes]
+    links = [(ids[u], ids[v], rng.choice(BANDWIDTHS)) for u, v in graph.edges]
+    return build_network(nodes, links, headless)
+
+
+def random_geometric_topology(node_count, radius=None, seed=None, headless=None):
+    rng = random.Random(seed)
+    if radius is None:
+        # Radio con grado medio cercano a 6
+        radius = math.sqrt(6 / (math.pi * node_count))
+    graph = nx.random_geometric_graph(node_count, radius, seed=seed)
+    return _from_graph(graph, rng, headless)
+
+
+def waxman_topology(node_count, beta=0.4, alpha=0.1, seed=None, headless=None):
+    # Probabilidad de enlace beta * exp(-d / (alpha * L)), con la notacion de networkx
+    rng = random.Random(seed)
+    graph = nx.waxman_graph(node_count, beta=beta, alpha=alpha, seed=seed)
+    return _from_graph(graph, rng, headless)
+
+
+def fat_tree_topology(k, seed=None, headless=None):
+    # Fat-tree de k puertos: (k/2)^2 conmutadores de nucleo y k pods con k/2
+    # conmutadores de agregacion y k/2 de acceso cada uno
+    if k % 2:
+        raise ValueError("Fat-tree arity k must be even")
+    rng = random.Random(seed)
+    half = k // 2
+    graph = nx.Graph()
+    core = [("core", i) for i in range(half * half)]
+    graph.add_nodes_from(core)
+    for pod in range(k):
+        aggregation = [("agg", pod, i) for i in range(half)]
+        edge = [("edge", pod, i) for i in range(half)]
+        for index, agg_switch in enumerate(aggregation):
+            for edge_switch in edge:
+                graph.add_edge(agg_switch, edge_switch)
+            for core_index in range(half):
+                graph.add_edge(agg_switch, core[index * half + core_index])
+    return _from_graph(graph, rng, headless)
+
+
+GENERATORS = {
+    "geometric": lambda size, seed: random_geometric_topology(size, seed=seed, headless=True),
+    "waxman": lambda size, seed: waxman_topology(size, seed=seed, headless=True),
+    "fat-tree": lambda size, seed: fat_tree_topology(size, seed=seed, headless=True),
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic topology file.")
+    parser.add_argument("kind", choices=sorted(GENERATORS))
+    parser.add_argument("size", type=int, help="node count, or k for fat-tree")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args()
+    network = GENERATORS[args.kind](args.size, args.seed)
+    save_topology(network, args.output)
+    print(f"Saved {len(network.nodes)} nodes and {network.graph.number_of_edges()} links to {args.output}")